@@ -1,8 +1,21 @@
 __all__ = [
+    "archive",
+    "bench",
+    "cache",
     "cli",
+    "codecs",
+    "compact",
     "container",
     "crypto",
+    "dedupe",
+    "delta",
     "detect",
+    "dicts",
+    "frames",
     "ipfs",
+    "pipeline",
+    "policy",
+    "stages",
+    "tune",
     "utils",
 ]
\ No newline at end of file
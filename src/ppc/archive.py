@@ -0,0 +1,190 @@
+"""Multi-file archives: many files in one framed container.
+
+Members are concatenated into a single framed payload and located through an
+encrypted central directory sealed after the last frame (see frames.py):
+
+    [{"name": "src/a.py", "offset": 0, "size": 120, "mtime": 1700000000, "mode": 420}, ...]
+
+`offset` is the member's position in the concatenated stream. The mode is
+recorded in `comp["archive"]`:
+
+- "solid": members share frames, which compresses small files far better;
+  extracting one member decodes the frames it overlaps, neighbours included.
+- "file": every member starts a new frame, so extracting one never decrypts
+  bytes of another.
+"""
+from __future__ import annotations
+import json, os, posixpath, stat, time
+from dataclasses import asdict
+from typing import BinaryIO, Iterator
+
+from .container import ARCHIVE_MIME, Header, pack_to, open_container, VERSION, VERSION_FRAMED, VERSION_SINGLE
+from .frames import FrameEncoder, decode_frames, read_index, read_range, read_trailer
+from .pipeline import walk_files
+from .stages import run_stages
+from .utils import iter_chunks, now_iso, open_output
+
+ARCHIVE_MODES = ("solid", "file")
+
+
+def is_archive(header: Header) -> bool:
+    return header.mime == ARCHIVE_MIME
+
+
+def _safe_name(name: str) -> str:
+    norm = posixpath.normpath(name)
+    if posixpath.isabs(norm) or norm in (".", "..") or norm.startswith("../") or "\\" in name:
+        raise ValueError(f"Unsafe member path in archive: {name!r}")
+    return norm
+
+
+def _read_members(root: str, rels: list[str], directory: list[dict]) -> Iterator[Iterator[bytes]]:
+    """Chunks of each member in turn, appending its directory entry once it is fully read."""
+    offset = 0
+    for rel in rels:
+        path = os.path.join(root, rel)
+        st = os.stat(path)
+        entry = {"name": rel.replace(os.sep, "/"), "offset": offset, "size": 0,
+                 "mtime": int(st.st_mtime), "mode": stat.S_IMODE(st.st_mode)}
+
+        def chunks(path=path, entry=entry):
+            with open(path, "rb") as f:
+                for chunk in iter_chunks(f):
+                    entry["size"] += len(chunk)
+                    yield chunk
+        yield chunks()
+        offset += entry["size"]
+        directory.append(entry)
+
+
+def pack_archive(root: str, output_path: str, key: bytes, crypt_hdr: dict, comp: dict, mode: str = "solid",
+                 recursive: bool = True, name: str | None = None, version: int = VERSION) -> dict:
+    """Pack every file under `root` into one archive container; returns a summary dict."""
+    if mode not in ARCHIVE_MODES:
+        raise ValueError(f"Unknown archive mode: {mode}")
+    start = time.perf_counter()
+    stats, directory = {}, []
+    rels = walk_files(root, recursive)
+    header = Header(
+        mime=ARCHIVE_MIME,
+        orig_name=name or os.path.basename(os.path.abspath(root)),
+        created=now_iso(),
+        kdf=crypt_hdr["kdf"],
+        cipher=crypt_hdr["cipher"],
+        comp=dict(comp, archive=mode),
+        notes="PPC-2: Archive of framed members with an encrypted directory." if version == VERSION_FRAMED else None,
+        version=version,
+    )
+    enc = FrameEncoder(key, header.cipher, header.comp, stats, header.aad())
+    members = _read_members(root, rels, directory)
+    if mode == "solid":
+        blocks = enc.blocks(chunk for member in members for chunk in member)
+    else:
+        blocks = enc.member_blocks(members)
+    with open_output(output_path) as dst:
+        written = [pack_to(dst, header, [])]
+
+        def write(record: bytes) -> None:
+            dst.write(record)
+            written[0] += len(record)
+
+        stages = run_stages(blocks, [
+            ("compress", lambda item: enc.compress(*item)),
+            ("encrypt", lambda item: enc.seal(*item)),
+            ("write", write),
+        ])
+        write(enc.footer(json.dumps(directory, separators=(",", ":")).encode("utf-8")))
+    return {"input": root, "output": output_path, "members": len(directory),
+            "raw_bytes": sum(e["size"] for e in directory), "comp_bytes": stats["comp"], "frames": stats["frames"],
+            "container_bytes": written[0], "seconds": time.perf_counter() - start,
+            "stages": [asdict(st) for st in stages], "header": header}
+
+
+def _open_archive(f: BinaryIO) -> tuple[Header, int]:
+    header, _ = open_container(f)
+    if header.version == VERSION_SINGLE or not is_archive(header):
+        raise ValueError("Not a PPC archive")
+    return header, f.tell()
+
+
+def read_directory(f: BinaryIO, key: bytes, header: Header, payload_start: int, index=None) -> list[dict]:
+    """Decrypt only the central directory of an archive."""
+    index = index if index is not None else read_index(f, payload_start)
+    raw = read_trailer(f, key, header.cipher, payload_start, index, header.aad())
+    if raw is None:
+        raise ValueError("Archive has no directory")
+    return json.loads(raw.decode("utf-8"))
+
+
+def list_members(path: str, key: bytes) -> tuple[Header, list[dict]]:
+    with open(path, "rb") as f:
+        header, start = _open_archive(f)
+        return header, read_directory(f, key, header, start)
+
+
+def extract_members(path: str, key: bytes, dest: str, names: list[str] | None = None) -> list[dict]:
+    """Extract `names` (default: every member) into `dest`; returns their directory entries.
+
+    Selected members are decoded through the frame index (only the frames they
+    cover); a full extraction streams the payload once.
+    """
+    with open(path, "rb") as f:
+        header, start = _open_archive(f)
+        index = read_index(f, start)
+        directory = read_directory(f, key, header, start, index)
+        if names:
+            by_name = {e["name"]: e for e in directory}
+            missing = [n for n in names if n not in by_name]
+            if missing:
+                raise ValueError(f"Not in archive: {', '.join(missing)}")
+            chosen = [by_name[n] for n in names]
+        else:
+            chosen = directory
+        targets = [os.path.join(dest, *_safe_name(e["name"]).split("/")) for e in chosen]
+
+        if names:
+            for entry, target in zip(chosen, targets):
+                f.seek(start)
+                data = read_range(f, key, header.cipher, entry["offset"], entry["size"], index, header.comp,
+                                  header.aad())
+                _write_member(target, entry, [data])
+            return chosen
+
+        f.seek(start)
+        stream = _Spill(decode_frames(f, key, header.cipher, comp=header.comp, aad=header.aad()))
+        for entry, target in zip(chosen, targets):
+            _write_member(target, entry, stream.take(entry["size"]))
+        stream.finish()
+        return chosen
+
+
+def _write_member(target: str, entry: dict, chunks) -> None:
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    with open_output(target) as dst:
+        for chunk in chunks:
+            dst.write(chunk)
+    os.chmod(target, entry["mode"])
+    os.utime(target, (entry["mtime"], entry["mtime"]))
+
+
+class _Spill:
+    """Hands out consecutive byte counts from a stream of decoded frames."""
+
+    def __init__(self, frames: Iterator[bytes]):
+        self.frames, self.buf = frames, memoryview(b"")
+
+    def take(self, n: int) -> Iterator[bytes]:
+        while n:
+            if not self.buf:
+                frame = next(self.frames, None)
+                if frame is None:
+                    raise ValueError("Archive payload is shorter than its directory")
+                self.buf = memoryview(frame)
+            part, self.buf = self.buf[:n], self.buf[n:]
+            n -= len(part)
+            yield part
+
+    def finish(self) -> None:
+        """Read to the last frame so truncation is still detected; nothing may be left over."""
+        if self.buf or any(self.frames):
+            raise ValueError("Archive payload is longer than its directory")
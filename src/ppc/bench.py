@@ -0,0 +1,97 @@
+"""`ppc bench`: codec / level / thread / cipher sweeps over a sample corpus.
+
+Every configuration goes through `pipeline.compress_file` and
+`pipeline.decompress_file` (stages, framing, AEAD and file I/O included) so
+the numbers match what `ppc compress` and `ppc decompress` will do: the
+codec policy and decoding threads default to the CLI's (see `bench`). The KDF
+is timed separately, once, since it is a per-container constant; the sweep
+itself uses HKDF subkeys of one random master key.
+"""
+from __future__ import annotations
+import itertools, os, tempfile, time
+from os import urandom
+
+from .codecs import get_codec
+from .crypto import new_stream_key, raw_stream_key
+from .frames import comp_params
+from .pipeline import compress_file, decompress_file
+from .policy import DEFAULT_POLICY
+
+DEFAULT_LEVELS = {"zstd": (1, 3, 7, 12, 19), "lz4": (0, 3, 9), "brotli": (1, 5, 9, 11), "xz": (1, 6, 9), "none": (None,)}
+
+
+def configs(codecs: list[str], levels: list[int] | None, threads: list[int], ciphers: list[str]) -> list[dict]:
+    """Every combination to run; thread counts only apply to zstd, levels are kept within each codec's range."""
+    out = []
+    for name in codecs:
+        codec = get_codec(name)
+        if name == "none":
+            lv = [None]
+        elif levels:
+            lv = [lvl for lvl in levels if codec.levels[0] <= lvl <= codec.levels[1]]
+        else:
+            lv = list(DEFAULT_LEVELS[name])
+        th = threads if name == "zstd" else [1]
+        for level, t, cipher in itertools.product(lv, sorted(set(th)), ciphers):
+            out.append({"codec": name, "level": level, "threads": t, "cipher": cipher})
+    return out
+
+
+def time_kdf(passphrase: str, params: dict) -> float:
+    start = time.perf_counter()
+    new_stream_key(passphrase, params)
+    return (time.perf_counter() - start) * 1000
+
+
+def run_config(paths: list[str], cfg: dict, master: bytes, workdir: str, repeat: int = 1,
+               policy: dict | None = DEFAULT_POLICY, decode_threads: int = 1) -> dict:
+    """Best-of-`repeat` compress and decompress times over all `paths` for one configuration."""
+    comp = comp_params(cfg["level"], cfg["threads"], codec=cfg["codec"])
+    raw = packed = 0
+    comp_s = decomp_s = 0.0
+    for i, path in enumerate(paths):
+        box, back = os.path.join(workdir, f"{i}.ppc"), os.path.join(workdir, f"{i}.out")
+        best_c = best_d = float("inf")
+        for _ in range(repeat):
+            key, crypt_hdr = raw_stream_key(master, cfg["cipher"])
+            start = time.perf_counter()
+            info = compress_file(path, box, key, crypt_hdr, comp, policy=policy)
+            best_c = min(best_c, time.perf_counter() - start)
+            start = time.perf_counter()
+            decompress_file(box, back, key=key, threads=decode_threads)
+            best_d = min(best_d, time.perf_counter() - start)
+        raw += info["raw_bytes"]
+        packed += info["container_bytes"]
+        comp_s += best_c
+        decomp_s += best_d
+        os.remove(box)
+        os.remove(back)
+    return dict(cfg, raw_bytes=raw, container_bytes=packed, ratio=raw / packed if packed else 0.0,
+                compress_mbps=raw / comp_s / 1e6 if comp_s else 0.0,
+                decompress_mbps=raw / decomp_s / 1e6 if decomp_s else 0.0)
+
+
+_AXES = ("ratio", "compress_mbps", "decompress_mbps")
+
+
+def mark_pareto(results: list[dict]) -> list[dict]:
+    """Set `pareto` on each result: True unless another is at least as good on
+    ratio, compress and decompress speed and strictly better on one."""
+    for r in results:
+        r["pareto"] = not any(all(o[a] >= r[a] for a in _AXES) and any(o[a] > r[a] for a in _AXES)
+                              for o in results if o is not r)
+    return results
+
+
+def bench(paths: list[str], cfgs: list[dict], kdf_params: dict, repeat: int = 1,
+          policy: dict | None = DEFAULT_POLICY, decode_threads: int | None = None) -> dict:
+    """Run every configuration in `cfgs`. `policy` and `decode_threads` (default
+    one per CPU) are what `ppc compress` and `ppc decompress` use by default."""
+    decode_threads = decode_threads or os.cpu_count() or 1
+    kdf_ms = time_kdf("bench", kdf_params)
+    master = urandom(32)
+    with tempfile.TemporaryDirectory(prefix="ppc-bench-") as workdir:
+        results = [run_config(paths, cfg, master, workdir, repeat, policy, decode_threads) for cfg in cfgs]
+    return {"files": len(paths), "raw_bytes": sum(os.path.getsize(p) for p in paths),
+            "kdf": dict(kdf_params, ms=kdf_ms), "results": mark_pareto(results)}
+
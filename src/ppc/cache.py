@@ -0,0 +1,104 @@
+"""Content-hash cache of finished containers (`--cache-dir`).
+
+Re-running `ppc compress` over a mostly unchanged tree should not pay for
+zstd again. Each container we write is kept as `<root>/<kk>/<key>.ppc`, where
+`key` is a BLAKE2b hash of the input's content plus every parameter that
+shapes the container (codec, level, policy, header format, cipher, KDF
+parameters, raw key ID, original name). A later run with the same content
+and parameters reuses the container instead of compressing again.
+
+Only finished, encrypted containers are cached; no secrets, key material or
+compressed plaintext are written to the cache. On a hit the caller's
+passphrase or raw key must open the cached container's first frame before it
+is reused; anything else counts as a miss and is replaced. The entry names
+still reveal which content hashes were compressed, so the cache directory is
+created private (0700). A reused container keeps its original `created` time
+and is byte-identical to earlier copies of the same content.
+
+Eviction is least recently used by mtime (hits touch their entry), down to
+`max_bytes` of entries. Entries are hard links where the filesystem allows,
+so outputs and cache share storage; `open_output` always replaces files
+rather than rewriting them, so a link never sees a later write.
+"""
+from __future__ import annotations
+import hashlib, json, os, shutil
+from cryptography.exceptions import InvalidTag
+from pyzstd import ZstdError
+
+from .crypto import key_from_header
+from .frames import decode_frames
+from .pipeline import open_payload
+from .utils import CHUNK_SIZE, output_path
+
+CACHE_SIZE = 4 << 30  # default size bound for all entries
+_FORMAT = 1  # bump to orphan every existing entry
+
+
+def file_digest(path: str) -> bytes:
+    h = hashlib.blake2b(digest_size=32, person=b"ppc-content")
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            h.update(chunk)
+    return h.digest()
+
+
+class ContainerCache:
+    def __init__(self, root: str, max_bytes: int = CACHE_SIZE):
+        self.root, self.max_bytes = root, max_bytes
+        os.makedirs(root, mode=0o700, exist_ok=True)
+
+    def key(self, input_path: str, params: dict) -> str:
+        """Cache key for a file's content under `params` (JSON-serialisable, no secrets)."""
+        h = hashlib.blake2b(file_digest(input_path), digest_size=32, person=b"ppc-cache-key")
+        h.update(json.dumps(dict(params, format=_FORMAT), sort_keys=True).encode())
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + ".ppc")
+
+    def lookup(self, key: str, passphrase: str | None = None, raw_key: bytes | None = None) -> str | None:
+        """Path of a cached container the given secret opens, else None (stale entries are dropped)."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open_payload(path) as (header, payload):
+                frame_key = key_from_header(header.kdf, passphrase, raw_key)
+                next(iter(decode_frames(payload, frame_key, header.cipher, comp=header.comp, aad=header.aad())), None)
+        except (InvalidTag, OSError, ValueError, ZstdError):
+            os.remove(path)  # other secret or a damaged entry: recompress and replace it
+            return None
+        os.utime(path)
+        return path
+
+    def restore(self, entry: str, output: str) -> None:
+        with output_path(output) as tmp:
+            _link_or_copy(entry, tmp)
+
+    def store(self, key: str, container_path: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        with output_path(path) as tmp:
+            _link_or_copy(container_path, tmp)
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits `max_bytes`; returns bytes freed."""
+        entries = []
+        for sub in os.scandir(self.root):
+            if sub.is_dir():
+                entries += [(e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(sub.path)
+                            if e.name.endswith(".ppc")]
+        total, freed = sum(size for _, size, _ in entries), 0
+        for _, size, path in sorted(entries):
+            if total - freed <= self.max_bytes:
+                break
+            os.remove(path)
+            freed += size
+        return freed
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
@@ -1,145 +1,972 @@
 from __future__ import annotations
-import os, json
+import glob, os, json, time
+from contextlib import nullcontext
 import click
+from click.core import ParameterSource
 from rich.console import Console
 from rich.table import Table
 from cryptography.exceptions import InvalidTag
 from dotenv import load_dotenv
-from pyzstd import compress as zstd_compress, ZstdDecompressor, ZstdError
+from pyzstd import ZstdError
 
-from .detect import detect_mime
-from .crypto import encrypt, decrypt
-from .container import Header, pack, unpack, MAGIC
+from .policy import load_policy
+from .dicts import DICT_SIZE, dict_dir, load_dict, register as register_dict, registered as registered_dicts, \
+    train as train_dict
+from .crypto import KeySession, calibrate as calibrate_kdf, new_stream_key, key_from_header, \
+    key_id, parse_kdf_params, load_raw_key, raw_stream_key, select_cipher
+from .container import Header, open_container, read_header, ARCHIVE_MIME, HEADER_FORMATS, MAGIC, VERSION_SINGLE
+from .archive import ARCHIVE_MODES, extract_members, list_members, pack_archive
+from .bench import bench as run_bench, configs as bench_configs
+from .cache import CACHE_SIZE, ContainerCache
+from .dedupe import ChunkStore, dedupe_file
+from .delta import container_id, decompress_delta, delta_params, load_base
+from .codecs import CODECS, DEFAULT_CODEC, LONG_WINDOW_LOG, MAX_WINDOW_LOG, available_codecs
+from .frames import comp_params, read_range
+from .pipeline import SUFFIX, compress_file, decompress_file, open_payload, run_pool, walk_files
 from .ipfs import upload_web3, upload_pinata, gateway_url, upload_daemon, download_daemon
-from .utils import now_iso, read_bytes, write_bytes
+from .utils import read_bytes, open_output
 
 console = Console()
+err_console = Console(stderr=True)  # progress output when stdout carries data
 load_dotenv()
 
+def _parse_threads(ctx, param, value):
+    if value == "auto":
+        return os.cpu_count() or 1
+    if not value.isdigit() or int(value) < 1:
+        raise click.BadParameter("must be a positive integer or 'auto'")
+    return int(value)
+
+
+def _parse_level(ctx, param, value):
+    if value is None or value == "auto":
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise click.BadParameter("must be an integer or 'auto'")
+
+
+def _raw_key(key_file: str | None) -> bytes | None:
+    """Raw key from --key-file, else from $PPC_KEY; None means use a passphrase."""
+    material = read_bytes(key_file) if key_file else os.getenv("PPC_KEY")
+    if not material:
+        return None
+    try:
+        return load_raw_key(material)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+
+def _passphrase(passphrase: str | None, stdin_is_data: bool = False) -> str:
+    if passphrase is not None:
+        return passphrase
+    if stdin_is_data:
+        raise click.ClickException("Data is read from stdin; pass the passphrase with -p/PPC_PASSPHRASE "
+                                   "or use --key-file/PPC_KEY")
+    return click.prompt("Passphrase", hide_input=True)
+
+
+def _sealing_secret(passphrase: str | None, key_file: str | None,
+                    stdin_is_data: bool = False) -> tuple[bytes | None, str | None]:
+    """(raw key, passphrase) to seal new containers with; exactly one is set.
+
+    Options beat environment variables: -p wins over PPC_KEY and --key-file
+    over PPC_PASSPHRASE. Both options, or both variables, are a usage error.
+    """
+    explicit = click.get_current_context().get_parameter_source("passphrase") == ParameterSource.COMMANDLINE
+    if passphrase is not None and key_file:
+        if explicit:
+            raise click.UsageError("Pass either -p/--passphrase or --key-file, not both")
+        passphrase = None
+    elif passphrase is not None and os.getenv("PPC_KEY"):
+        if not explicit:
+            raise click.UsageError("Both PPC_KEY and PPC_PASSPHRASE are set; unset one or pass -p/--key-file")
+        return None, passphrase
+    raw_key = _raw_key(key_file)
+    return raw_key, None if raw_key is not None else _passphrase(passphrase, stdin_is_data)
+
+
+def _header_key(header: Header, passphrase: str | None, key_file: str | None,
+                stdin_is_data: bool = False) -> bytes:
+    """Key for a VERSION 2 header, asking for whichever secret it was sealed with."""
+    if header.kdf["name"] == "raw":
+        return key_from_header(header.kdf, raw_key=_raw_key(key_file))
+    return key_from_header(header.kdf, _passphrase(passphrase, stdin_is_data))
+
+
+def _open_base(header: Header, base_path: str | None, passphrase: str | None, key_file: str | None,
+               store_root: str | None = None, stdin_is_data: bool = False) -> str | None:
+    """Register the base container of a delta header (see delta.py); returns the passphrase, if one was asked for."""
+    if not header.comp.get("base"):
+        return passphrase
+    if not base_path:
+        raise ValueError(f"{header.orig_name} is a delta; pass its base container with --base")
+    raw_key = _raw_key(key_file) if header.kdf["name"] == "raw" else None
+    if raw_key is None:
+        passphrase = _passphrase(passphrase, stdin_is_data)
+    load_base(base_path, passphrase, raw_key, store_root, expect=header.comp["base"])
+    return passphrase
+
+
+def _load_policy(ctx, param, value):
+    try:
+        return load_policy(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def _comp(codec: str, level: int | None, threads: int = 1, dict_id: int | None = None,
+          window_log: int | None = None) -> dict:
+    try:
+        return comp_params(level, threads, dict_id, codec, window_log)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--codec/--level")
+
+
+def _cache_params(cipher: str, params: dict, key_mode: str, raw_key: bytes | None, **shape) -> dict:
+    """Everything but the secret that shapes a container, for ContainerCache.key."""
+    kdf = {"raw_key_id": key_id(raw_key)} if raw_key is not None else dict(params, mode=key_mode)
+    return dict(shape, cipher=select_cipher() if cipher == "auto" else cipher, kdf=kdf)
+
+
+def _dict_id(dict_ref: str | None) -> int | None:
+    """--dict: a registered dictionary ID, or a .zdict file to register and use."""
+    if dict_ref is None:
+        return None
+    try:
+        if dict_ref.isdigit():
+            return load_dict(int(dict_ref)).dict_id
+        return register_dict(read_bytes(dict_ref))
+    except (OSError, ValueError) as e:
+        raise click.BadParameter(str(e), param_hint="--dict")
+
+
+def _options(*decorators):
+    """Several click options as one decorator, listed in --help in the given order."""
+    def apply(fn):
+        for decorator in reversed(decorators):
+            fn = decorator(fn)
+        return fn
+    return apply
+
+
+# Options shared by several commands
+_open_secret_options = _options(
+    click.option("-p", "--passphrase", envvar="PPC_PASSPHRASE", help="Passphrase (prompted if needed and missing)"),
+    click.option("--key-file", type=click.Path(exists=True, dir_okay=False),
+                 help="Raw key for containers sealed with one; PPC_KEY may hold the key"))
+_seal_secret_options = _options(
+    click.option("-p", "--passphrase", envvar="PPC_PASSPHRASE", help="Passphrase (prompted if missing)"),
+    click.option("--key-file", type=click.Path(exists=True, dir_okay=False),
+                 help="Use a raw 256-bit key (raw, hex or base64) instead of a passphrase; PPC_KEY may hold the key "
+                      "(-p overrides it)"))
+_codec_option = click.option("--codec", type=click.Choice(list(CODECS)), default=DEFAULT_CODEC, show_default=True,
+                             help="zstd (default), lz4 (fastest), brotli/xz (smallest, for cold archives) or none")
+_LEVEL_HELP = "Codec level (default per codec: zstd 7, lz4 0, brotli 9, xz 6)"
+_level_option = click.option("--level", type=int, default=None, help=_LEVEL_HELP)
+_dict_option = click.option("--dict", "dict_ref", default=None,
+                            help="Zstd dictionary for small files: a .zdict file (registered on use) or a registered ID")
+_threads_option = click.option("--threads", default="1", show_default=True, callback=_parse_threads,
+                               help="Zstd worker threads, or 'auto' for one per CPU")
+_policy_option = click.option("--policy", envvar="PPC_CODEC_POLICY", default="auto", show_default=True,
+                              callback=_load_policy, help="Codec policy: 'auto' (built-in MIME table + entropy "
+                                                          "check), 'off', or a JSON policy file")
+_kdf_options = _options(
+    click.option("--kdf", type=click.Choice(["scrypt", "argon2id"]), default="scrypt", show_default=True,
+                 help="Passphrase KDF"),
+    click.option("--kdf-params", envvar="PPC_KDF_PARAMS", default=None,
+                 help="KDF overrides, e.g. 'n=65536,r=8,p=1' or 't=3,m=65536,p=4' (see `ppc calibrate`)"))
+_cipher_option = click.option("--cipher", type=click.Choice(["aes-256-gcm", "chacha20-poly1305", "auto"]),
+                              default="aes-256-gcm", show_default=True,
+                              help="AEAD for the payload; 'auto' benchmarks both once per host")
+_header_option = click.option("--header", "header_format", type=click.Choice(list(HEADER_FORMATS)), default="json",
+                              show_default=True,
+                              help="Header encoding; 'compact' is a smaller binary header (container VERSION 3)")
+_cache_options = _options(
+    click.option("--cache-dir", "cache_root", envvar="PPC_CONTAINER_CACHE", type=click.Path(file_okay=False),
+                 help="Reuse containers of unchanged files from this content-hash cache (file input and output only)"),
+    click.option("--cache-size", type=click.IntRange(min=0), default=CACHE_SIZE >> 20, show_default=True,
+                 help="Cache size bound in MiB; least recently used containers are evicted"))
+_jobs_option = click.option("--jobs", default="auto", show_default=True, callback=_parse_threads,
+                            help="Worker processes, or 'auto' for one per CPU")
+_base_option = click.option("--base", "base_path", type=click.Path(exists=True, dir_okay=False), default=None,
+                            help="Base container of a delta (see `ppc compress --base`)")
+_store_option = click.option("--store", "store_root", type=click.Path(file_okay=False), default=None,
+                             help="Chunk store (default $PPC_CHUNK_STORE, else <cache dir>/store)")
+
+
 @click.group()
 def cli():
     """Pied Piper Phase 1 CLI (.ppc universal container)"""
 
 
 @cli.command()
-@click.argument("input_path", type=click.Path(exists=True, dir_okay=False))
-@click.option("-o", "--output", type=click.Path(dir_okay=False), help="Output .ppc path")
-@click.option("-p", "--passphrase", prompt=True, hide_input=True, confirmation_prompt=False, envvar="PPC_PASSPHRASE",
-              help="Passphrase for encryption. Uses PPC_PASSPHRASE env var if set.")
-@click.option("--level", default=7, show_default=True, help="Zstd compression level (1-22)")
+@click.argument("input_path", type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option("-o", "--output", type=click.Path(dir_okay=False, allow_dash=True),
+              help="Output .ppc path ('-' for stdout, the default when reading stdin)")
+@_seal_secret_options
+@_codec_option
+@click.option("--level", default=None, callback=_parse_level,
+              help=f"{_LEVEL_HELP}, or 'auto' to pick one for --target-mbps/--target-ratio")
+@click.option("--target-mbps", type=click.FloatRange(min=0, min_open=True), default=None,
+              help="With --level auto: the highest level compressing at least this many MB/s")
+@click.option("--target-ratio", type=click.FloatRange(min=1), default=None,
+              help="With --level auto: the fastest level reaching this compression ratio")
+@_dict_option
+@click.option("--long", "long_mode", is_flag=True,
+              help=f"Zstd long-distance matching for huge inputs (VM images, dumps), window 2^{LONG_WINDOW_LOG} "
+                   f"(128 MiB) unless --long-window. Frames grow to the window; compress needs roughly 8x the "
+                   f"window in memory, decompress at least one window")
+@click.option("--long-window", "window_log", type=click.IntRange(10, MAX_WINDOW_LOG), default=None,
+              help="Window log for --long (implies --long)")
+@_policy_option
+@_threads_option
+@_kdf_options
+@_cipher_option
 @click.option("--upload", type=click.Choice(["none","web3","pinata"], case_sensitive=False), default="none",
               show_default=True, help="Upload container to IPFS via service")
 @click.option("--name", default=None, help="Override original filename in header")
-def compress(input_path, output, passphrase, level, upload, name):
-    """Compress + encrypt INPUT into a .ppc container (optionally upload)."""
-    console.rule("[bold cyan]Pied Piper Compression Pipeline[/bold cyan]")
-
-    # 1. Read Input File
-    raw = read_bytes(input_path)
-    console.print(f"📄 [bold]Read Input File[/]")
-    console.print(f"   → {input_path} ({len(raw)} bytes)")
-
-    # 2. Detect File Type
-    mime, mime_source = detect_mime(input_path)
-    console.print(f"🔍 [bold]Detected File Type[/]")
-    console.print(f"   → {mime} (using {mime_source})")
-
-    # 3. Compress
-    comp = zstd_compress(raw, level_or_option=level)
-    console.print(f"🗜️  [bold]Compressed with Zstandard (Level {level})[/]")
-    console.print(f"   → {len(raw)} bytes → {len(comp)} bytes")
-
-    # 4. Encrypt
-    ciphertext, crypt_hdr = encrypt(comp, passphrase)
-    console.print(f"🔐 [bold]Encrypted with AES-256-GCM[/]")
-    console.print(f"   → Payload: {len(ciphertext)} bytes (ciphertext + auth tag)")
-
-    # 5. Wrap into .ppc container
-    orig_name = name or os.path.basename(input_path)
-    header = Header(
-        mime=mime,
-        orig_name=orig_name,
-        created=now_iso(),
-        kdf=crypt_hdr["kdf"],
-        cipher=crypt_hdr["cipher"],
-        comp={"name": "zstd", "level": level},
-        notes="PPC-1: Universal container ready for AI compression.",
-    )
-    blob = pack(header, ciphertext)
-    out = output or (os.path.splitext(input_path)[0] + ".ppc")
-    write_bytes(out, blob)
-    console.print(f"📦 [bold]Wrapped into .ppc Format[/]")
-    console.print(f"   → Created {os.path.basename(out)} ({len(blob)} bytes)")
+@_header_option
+@click.option("--stage-report", is_flag=True, help="Show busy vs blocked time for each pipeline stage")
+@_cache_options
+@click.option("--dedupe", is_flag=True,
+              help="Store content-defined chunks once in a chunk store; the container only lists them")
+@click.option("--store", "store_root", type=click.Path(file_okay=False), default=None,
+              help="Chunk store for --dedupe (default $PPC_CHUNK_STORE, else <cache dir>/store)")
+@click.option("--base", "base_path", type=click.Path(exists=True, dir_okay=False), default=None,
+              help="Earlier container of this file: store only a binary delta against it")
+def compress(input_path, output, passphrase, key_file, codec, level, target_mbps, target_ratio, dict_ref, long_mode,
+             window_log, policy, threads, kdf, kdf_params, cipher, upload, name, header_format, stage_report,
+             cache_root, cache_size, dedupe, store_root, base_path):
+    """Compress + encrypt INPUT into a .ppc container (optionally upload).
+
+    INPUT may be '-' to read stdin; with '-o -' the container goes to stdout,
+    so `pg_dump | ppc compress - -o - | upload` runs in constant memory.
+    """
+    try:
+        params = parse_kdf_params(kdf, kdf_params)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--kdf-params")
+    targets = None
+    if level == "auto":
+        if target_mbps is None and target_ratio is None:
+            raise click.BadParameter("'auto' needs --target-mbps and/or --target-ratio", param_hint="--level")
+        targets, level = {"mbps": target_mbps, "ratio": target_ratio}, None
+    elif target_mbps is not None or target_ratio is not None:
+        raise click.BadParameter("--target-mbps/--target-ratio need --level auto", param_hint="--level")
+    if long_mode and window_log is None:
+        window_log = LONG_WINDOW_LOG
+    if dedupe and (input_path == "-" or cache_root or targets or dict_ref or window_log or base_path):
+        raise click.BadParameter("needs a file input and does not combine with --cache-dir, --level auto, "
+                                 "--dict, --long or --base", param_hint="--dedupe")
+    if base_path and (targets or dict_ref):
+        raise click.BadParameter("does not combine with --level auto or --dict", param_hint="--base")
+    dict_id = _dict_id(dict_ref)
+    comp = _comp(codec, level, threads, dict_id, window_log)
+    out = output or ("-" if input_path == "-" else os.path.splitext(input_path)[0] + SUFFIX)
+    if out == "-" and upload != "none":
+        raise click.BadParameter("cannot upload a container written to stdout", param_hint="--upload")
+    ui = err_console if out == "-" else console
+    ui.rule("[bold cyan]Pied Piper Compression Pipeline[/bold cyan]")
+
+    # 0. Unchanged input → reuse the cached container (the secret must open it)
+    raw_key, secret = _sealing_secret(passphrase, key_file, input_path == "-")
+    if base_path:
+        # The base is opened with the same secret; the delta is always zstd, so the policy stays out of it
+        try:
+            base_id, base_len = load_base(base_path, secret, raw_key, store_root)
+            comp = delta_params(comp, base_id, base_len)
+        except InvalidTag:
+            raise click.BadParameter("this passphrase or key does not open it", param_hint="--base")
+        except (ValueError, ZstdError) as e:
+            raise click.BadParameter(str(e), param_hint="--base")
+        policy = None
+    cache = hit = None
+    if cache_root and "-" not in (input_path, out):
+        cache = ContainerCache(cache_root, cache_size << 20)
+        cache_key = cache.key(input_path, _cache_params(
+            cipher, params, "file", raw_key, comp=comp, policy=policy, targets=targets,
+            version=HEADER_FORMATS[header_format], name=name or os.path.basename(input_path)))
+        hit = cache.lookup(cache_key, secret, raw_key)
+    if dedupe:
+        # 1. Content-defined chunks → new ones sealed into the store → recipe container
+        store = ChunkStore(store_root, create=True, kdf=params)
+        if raw_key is not None:
+            key, crypt_hdr = raw_stream_key(raw_key, cipher)
+        else:
+            key, crypt_hdr = new_stream_key(secret, params, cipher)
+        try:
+            info = dedupe_file(input_path, out, key, crypt_hdr, comp, store, store.keys(secret, raw_key), name,
+                               HEADER_FORMATS[header_format], threads)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        ui.print(f"🔍 [bold]Detected File Type[/]")
+        ui.print(f"   → {info['mime']} (using {info['mime_source']})")
+        ui.print(f"🧩 [bold]Deduplicated into {info['chunks']} chunk(s)[/] (store {store.root})")
+        ui.print(f"   → {info['new_chunks']} new, {info['new_bytes']} bytes added to the store "
+                 f"for {info['raw_bytes']} input bytes")
+        ui.print(f"📦 [bold]Wrapped the chunk recipe into .ppc Format[/]")
+        ui.print(f"   → Created {'<stdout>' if out == '-' else os.path.basename(out)} "
+                 f"({info['container_bytes']} bytes)")
+    elif hit:
+        cache.restore(hit, out)
+        ui.print(f"♻️  [bold]Reused Cached Container[/] (content and parameters unchanged)")
+        ui.print(f"   → Created {os.path.basename(out)} ({os.path.getsize(out)} bytes) from {hit}")
+    else:
+        # 1. Stream read → detect type → compress → encrypt frames → .ppc container
+        if raw_key is not None:
+            key, crypt_hdr = raw_stream_key(raw_key, cipher)
+        else:
+            key, crypt_hdr = new_stream_key(secret, params, cipher)
+        info = compress_file(input_path, out, key, crypt_hdr, comp, name,
+                             HEADER_FORMATS[header_format], policy, targets)
+        header = info["header"]
+
+        ui.print(f"🔍 [bold]Detected File Type[/]")
+        ui.print(f"   → {info['mime']} (using {info['mime_source']})")
+
+        ui.print(f"📄 [bold]Read Input File[/]")
+        ui.print(f"   → {'<stdin>' if input_path == '-' else input_path} ({info['raw_bytes']} bytes)")
+        ui.print(f"🧭 [bold]Codec Policy[/]")
+        ui.print(f"   → {info['policy']}")
+        if base_path:
+            ui.print(f"🧬 [bold]Delta Against Base[/]")
+            ui.print(f"   → {os.path.basename(base_path)} ({base_len} bytes, container {base_id[:16]}) as zstd prefix")
+        if info["tune"]:
+            ui.print(f"🎯 [bold]Level Auto-Tune[/]")
+            ui.print(f"   → {info['tune']}")
+        if header.comp["name"] == "none":
+            ui.print(f"🗜️  [bold]{CODECS['none'].title}[/]")
+        else:
+            workers = f", {header.comp['threads']} threads" if "threads" in header.comp else ""
+            workers += f", dictionary {header.comp['dict_id']}" if "dict_id" in header.comp else ""
+            workers += f", long window 2^{header.comp['window_log']}" if "window_log" in header.comp else ""
+            ui.print(f"🗜️  [bold]Compressed with {CODECS[header.comp['name']].title} "
+                     f"(Level {header.comp['level']}{workers})[/]")
+        ui.print(f"   → {info['raw_bytes']} bytes → {info['comp_bytes']} bytes in {info['frames']} frame(s)")
+        key_src = f" (raw key {header.kdf['key_id']})" if header.kdf["name"] == "raw" else ""
+        ui.print(f"🔐 [bold]Encrypted with {header.cipher['name'].upper()}{key_src}[/]")
+        ui.print(f"   → Payload: {info['comp_bytes'] + info['frames'] * header.cipher['tag_len']} bytes "
+                      f"(ciphertext + per-frame auth tags)")
+        ui.print(f"📦 [bold]Wrapped into .ppc Format[/]")
+        ui.print(f"   → Created {'<stdout>' if out == '-' else os.path.basename(out)} "
+                 f"({info['container_bytes']} bytes)")
+        if stage_report:
+            _print_stage_report(ui, info["stages"], info["seconds"])
+        if cache:
+            cache.store(cache_key, out)
+            cache.evict()
 
     # 6. Upload to IPFS
     if upload != "none":
-        console.print(f"🌍 [bold]Uploading to IPFS via {upload.capitalize()}[/]")
-        console.print(f"   → Decentralized, censorship-resistant storage")
+        ui.print(f"🌍 [bold]Uploading to IPFS via {upload.capitalize()}[/]")
+        ui.print(f"   → Decentralized, censorship-resistant storage")
         if upload == "web3":
             token = os.getenv("WEB3_STORAGE_TOKEN")
             if not token:
                 raise click.ClickException("WEB3_STORAGE_TOKEN missing in .env")
-            cid = upload_web3(blob, os.path.basename(out), token)
+            with open(out, "rb") as blob:
+                cid = upload_web3(blob, os.path.basename(out), token)
         else:  # pinata
             jwt = os.getenv("PINATA_JWT")
             if not jwt:
                 raise click.ClickException("PINATA_JWT missing in .env")
-            cid = upload_pinata(blob, os.path.basename(out), jwt)
+            with open(out, "rb") as blob:
+                cid = upload_pinata(blob, os.path.basename(out), jwt)
         url = gateway_url(cid, service=upload)
-        console.print(f"   → CID: [bold green]{cid}[/]")
-        console.print(f"🌐 [bold]Generated Public Link[/]")
-        console.print(f"   → {url}")
+        ui.print(f"   → CID: [bold green]{cid}[/]")
+        ui.print(f"🌐 [bold]Generated Public Link[/]")
+        ui.print(f"   → {url}")
     else:
-        console.print(f"\n✅ [bold green]Success![/] Container created locally.")
+        ui.print(f"\n✅ [bold green]Success![/] Container created locally.")
+
+
+def _print_stage_report(ui: Console, stages: list[dict], wall: float) -> None:
+    table = Table(title=f"Pipeline stages (wall {wall:.2f}s)")
+    for col in ("Stage", "Items", "Busy s", "Blocked s", "Busy %"):
+        table.add_column(col)
+    for st in stages:
+        pct = 100 * st["busy"] / wall if wall else 0.0
+        table.add_row(st["name"], str(st["items"]), f"{st['busy']:.3f}", f"{st['blocked']:.3f}", f"{pct:.0f}")
+    ui.print(table)
 
 
 @cli.command()
-@click.argument("container_path", type=click.Path(exists=True, dir_okay=False))
-@click.option("-o", "--output", type=click.Path(dir_okay=False), help="Output original file path")
-@click.option("-p", "--passphrase", prompt=True, hide_input=True, confirmation_prompt=False, envvar="PPC_PASSPHRASE")
-def decompress(container_path, output, passphrase):
-    """Decrypt + decompress a .ppc container back to its original file."""
-    console.rule("[bold cyan]Pied Piper Decompression[/bold cyan]")
-    blob = read_bytes(container_path)
-    try:
-        header, payload = unpack(blob)
-        comp = decrypt(payload, passphrase, header.kdf["salt_b64"], header.cipher["nonce_b64"])
-        raw = ZstdDecompressor().decompress(comp)
+@click.argument("container_path", type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option("-o", "--output", type=click.Path(dir_okay=False, allow_dash=True),
+              help="Output original file path ('-' for stdout)")
+@_open_secret_options
+@click.option("--threads", default="auto", show_default=True, callback=_parse_threads,
+              help="Frames decoded in parallel (framed containers)")
+@_store_option
+@_base_option
+def decompress(container_path, output, passphrase, key_file, threads, store_root, base_path):
+    """Decrypt + decompress a .ppc container back to its original file.
+
+    CONTAINER may be '-' to read stdin and '-o -' writes the file to stdout.
+    """
+    ui = err_console if output == "-" else console
+    ui.rule("[bold cyan]Pied Piper Decompression[/bold cyan]")
+    stdin_is_data = container_path == "-"
+    try:
+        with open_payload(container_path) as (header, reader):
+            key = None
+            if header.version == VERSION_SINGLE:
+                passphrase = _passphrase(passphrase, stdin_is_data)
+            else:
+                passphrase = _open_base(header, base_path, passphrase, key_file, store_root, stdin_is_data)
+                key = _header_key(header, passphrase, key_file, stdin_is_data)
+            out = decompress_file((header, reader), output, key, passphrase, threads=threads,
+                                  store=store_root)["output"]
     except InvalidTag:
         raise click.ClickException("Decryption failed. Invalid passphrase or corrupted data.")
     except (ValueError, ZstdError) as e:
         # Catches container format errors (ValueError) or zstd errors
         raise click.ClickException(f"Decompression failed: {e}")
 
-    out = output or header.orig_name
-    write_bytes(out, raw)
+    ui.print(f"✅ [bold green]Success![/] File decompressed.")
+    ui.print(f"   → [bold]Output[/]: {out}\n   → [bold]MIME[/]:   {header.mime}")
 
-    console.print(f"✅ [bold green]Success![/] File decompressed.")
-    console.print(f"   → [bold]Output[/]: {out}\n   → [bold]MIME[/]:   {header.mime}")
+
+def _batch_report(title: str, results: list[dict], wall: float, as_json: bool) -> None:
+    ok = [r for r in results if "error" not in r]
+    raw = sum(r["raw_bytes"] for r in ok)
+    packed = sum(r["container_bytes"] for r in ok)
+    if as_json:
+        click.echo(json.dumps({"files": results, "ok": len(ok), "failed": len(results) - len(ok),
+                               "raw_bytes": raw, "container_bytes": packed, "seconds": wall}, indent=2))
+        return
+    table = Table(title=title)
+    for col in ("File", "Raw bytes", "Container bytes", "Ratio", "Seconds", "Status"):
+        table.add_column(col)
+    for r in sorted(results, key=lambda r: r["input"]):
+        if "error" in r:
+            table.add_row(r["input"], "", "", "", "", f"[red]{r['error']}[/]")
+        else:
+            ratio = f"{r['raw_bytes'] / r['container_bytes']:.2f}" if r["container_bytes"] else "-"
+            table.add_row(r["input"], str(r["raw_bytes"]), str(r["container_bytes"]), ratio,
+                          f"{r['seconds']:.2f}", "[green]cached[/]" if r.get("cached") else "[green]ok[/]")
+    console.print(table)
+    mbps = raw / wall / 1e6 if wall else 0.0
+    console.print(f"{len(ok)}/{len(results)} files, {raw} → {packed} bytes in {wall:.2f}s "
+                  f"([bold]{mbps:.1f} MB/s[/] aggregate)")
+
+
+def _finish_batch(title: str, results: list[dict], wall: float, as_json: bool) -> None:
+    _batch_report(title, results, wall, as_json)
+    if any("error" in r for r in results):
+        raise click.ClickException(f"{sum('error' in r for r in results)} file(s) failed")
+
+
+@cli.command("compress-dir")
+@click.argument("src_dir", type=click.Path(exists=True, file_okay=False))
+@click.argument("dst_dir", type=click.Path(file_okay=False))
+@_seal_secret_options
+@_codec_option
+@_level_option
+@_dict_option
+@_policy_option
+@_kdf_options
+@_cipher_option
+@_jobs_option
+@click.option("--recursive/--no-recursive", default=True, show_default=True)
+@_header_option
+@click.option("--json", "as_json", is_flag=True, help="Print the per-file summary as JSON")
+@_cache_options
+def compress_dir(src_dir, dst_dir, passphrase, key_file, codec, level, dict_ref, policy, kdf, kdf_params, cipher, jobs,
+                 recursive, header_format, as_json, cache_root, cache_size):
+    """Compress every file under SRC_DIR into a mirrored tree of .ppc containers in DST_DIR.
+
+    The KDF runs once for the whole batch: each file gets an HKDF subkey of a
+    single session master key (or of the raw key).
+    """
+    try:
+        params = parse_kdf_params(kdf, kdf_params)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--kdf-params")
+    dict_id = _dict_id(dict_ref)
+    comp = _comp(codec, level, dict_id=dict_id)
+    raw_key, secret = _sealing_secret(passphrase, key_file)
+    session = None if raw_key is not None else KeySession(secret, kdf=params)
+    if cipher == "auto":
+        cipher = select_cipher()
+    cache = ContainerCache(cache_root, cache_size << 20) if cache_root else None
+
+    start = time.perf_counter()
+    batch, results, cache_keys = [], [], {}
+    with console.status("[bold cyan]Checking the container cache...") if cache else nullcontext():
+        for rel in walk_files(src_dir, recursive):
+            src, dst = os.path.join(src_dir, rel), os.path.join(dst_dir, rel + SUFFIX)
+            if cache:
+                t0 = time.perf_counter()
+                cache_keys[src] = cache.key(src, _cache_params(
+                    cipher, params, "session", raw_key, comp=comp, policy=policy, targets=None,
+                    version=HEADER_FORMATS[header_format], name=os.path.basename(src)))
+                hit = cache.lookup(cache_keys[src], secret, raw_key)
+                if hit:
+                    cache.restore(hit, dst)
+                    results.append({"input": src, "output": dst, "raw_bytes": os.path.getsize(src),
+                                    "container_bytes": os.path.getsize(dst), "seconds": time.perf_counter() - t0,
+                                    "cached": True})
+                    continue
+            key, crypt_hdr = raw_stream_key(raw_key, cipher) if session is None else session.new_stream_key(cipher)
+            batch.append({"input_path": src, "output_path": dst, "key": key, "crypt_hdr": crypt_hdr, "comp": comp,
+                          "version": HEADER_FORMATS[header_format], "policy": policy})
+    with console.status(f"[bold cyan]Compressing {len(batch)} file(s) on {jobs} worker(s)..."):
+        results += run_pool(compress_file, batch, jobs)
+    if cache:
+        for r in results:
+            if "error" not in r and not r.get("cached"):
+                cache.store(cache_keys[r["input"]], r["output"])
+        cache.evict()
+    _finish_batch("Compressed", results, time.perf_counter() - start, as_json)
+
+
+@cli.command("decompress-dir")
+@click.argument("src_dir", type=click.Path(exists=True, file_okay=False))
+@click.argument("dst_dir", type=click.Path(file_okay=False))
+@_open_secret_options
+@_jobs_option
+@click.option("--recursive/--no-recursive", default=True, show_default=True)
+@click.option("--json", "as_json", is_flag=True, help="Print the per-file summary as JSON")
+@click.option("--base", "base_paths", type=click.Path(exists=True, dir_okay=False), multiple=True,
+              help="Base container of delta containers (repeatable; each delta finds its own)")
+def decompress_dir(src_dir, dst_dir, passphrase, key_file, jobs, recursive, as_json, base_paths):
+    """Restore every .ppc container under SRC_DIR into a mirrored tree in DST_DIR.
+
+    Keys for session and raw-key containers are resolved here, where the master
+    key cache is shared, so scrypt runs once per master salt; per-file scrypt
+    containers derive their keys inside the workers.
+    """
+    start = time.perf_counter()
+    batch, results = [], []
+    bases = {container_id(p): p for p in base_paths}
+    for rel in walk_files(src_dir, recursive, SUFFIX):
+        path = os.path.join(src_dir, rel)
+        job = {"container_path": path, "output_path": os.path.join(dst_dir, rel[:-len(SUFFIX)])}
+        try:
+            with open(path, "rb") as f:
+                header, _ = open_container(f)
+            if header.kdf["name"] != "raw":
+                passphrase = _passphrase(passphrase)  # asked once, reused for every later container
+            if header.kdf["name"] == "raw" or header.kdf["name"].endswith("+hkdf"):
+                job["key"] = _header_key(header, passphrase, key_file)
+            else:
+                job["passphrase"] = passphrase
+            if header.comp.get("base"):
+                # the base is opened in the worker, with the secret rather than the container's key
+                if header.comp["base"] not in bases:
+                    raise ValueError(f"Delta against base container {header.comp['base'][:16]}; "
+                                     "pass that container with --base")
+                job["base"] = bases[header.comp["base"]]
+                if header.kdf["name"] == "raw":
+                    job["raw_key"] = _raw_key(key_file)
+                else:
+                    job["passphrase"] = passphrase
+        except ValueError as e:
+            results.append({"input": path, "error": str(e)})
+            continue
+        batch.append(job)
+    with console.status(f"[bold cyan]Decompressing {len(batch)} container(s) on {jobs} worker(s)..."):
+        results += run_pool(decompress_delta, batch, jobs)
+    _finish_batch("Decompressed", results, time.perf_counter() - start, as_json)
 
 
 @cli.command()
 @click.argument("container_path", type=click.Path(exists=True, dir_okay=False))
-def inspect(container_path):
-    """View container header metadata."""
-    blob = read_bytes(container_path)
+@click.option("--offset", type=click.IntRange(min=0), default=0, show_default=True,
+              help="Byte offset into the original file")
+@click.option("--length", type=click.IntRange(min=0), default=None, help="Number of bytes (default: to the end)")
+@click.option("-o", "--output", type=click.Path(dir_okay=False), help="Output path (default: stdout)")
+@_open_secret_options
+@_base_option
+def extract(container_path, offset, length, output, passphrase, key_file, base_path):
+    """Extract a byte range of the original file, decoding only the frames it covers."""
+    try:
+        with open(container_path, "rb") as src:
+            header, reader = open_container(src)
+            if header.version == VERSION_SINGLE:
+                raise ValueError("VERSION 1 containers have no frame index; use decompress")
+            if header.comp.get("store"):
+                raise ValueError("Deduplicated containers hold a chunk recipe, not frames of the file; use decompress")
+            passphrase = _open_base(header, base_path, passphrase, key_file)
+            data = read_range(reader, _header_key(header, passphrase, key_file), header.cipher, offset, length,
+                              comp=header.comp, aad=header.aad())
+    except InvalidTag:
+        raise click.ClickException("Decryption failed. Invalid passphrase or corrupted data.")
+    except (ValueError, ZstdError) as e:
+        raise click.ClickException(f"Extraction failed: {e}")
+
+    if output:
+        with open_output(output) as dst:
+            dst.write(data)
+        console.print(f"✅ [bold green]Extracted[/] {len(data)} bytes at offset {offset} → {output}")
+    else:
+        click.get_binary_stream("stdout").write(data)
+
+
+@cli.command()
+@click.argument("src_dir", type=click.Path(exists=True, file_okay=False))
+@click.option("-o", "--output", type=click.Path(dir_okay=False), help="Output .ppc path (default: SRC_DIR.ppc)")
+@_seal_secret_options
+@_codec_option
+@_level_option
+@_dict_option
+@_threads_option
+@_kdf_options
+@_cipher_option
+@click.option("--mode", type=click.Choice(ARCHIVE_MODES), default="solid", show_default=True,
+              help="'solid' lets small files share frames; 'file' starts a frame per member so extracting one "
+                   "never decrypts another")
+@click.option("--recursive/--no-recursive", default=True, show_default=True)
+@_header_option
+def archive(src_dir, output, passphrase, key_file, codec, level, dict_ref, threads, kdf, kdf_params, cipher, mode, recursive,
+            header_format):
+    """Pack every file under SRC_DIR into one archive container with an encrypted directory."""
     try:
-        header, payload = unpack(blob)
+        params = parse_kdf_params(kdf, kdf_params)
     except ValueError as e:
-        raise click.ClickException(f"Could not inspect file: {e}")
+        raise click.BadParameter(str(e), param_hint="--kdf-params")
+    dict_id = _dict_id(dict_ref)
+    comp = _comp(codec, level, threads, dict_id)
+    out = output or os.path.normpath(src_dir) + SUFFIX
+    console.rule("[bold cyan]Pied Piper Archive[/bold cyan]")
+    raw_key, secret = _sealing_secret(passphrase, key_file)
+    if raw_key is not None:
+        key, crypt_hdr = raw_stream_key(raw_key, cipher)
+    else:
+        key, crypt_hdr = new_stream_key(secret, params, cipher)
+    info = pack_archive(src_dir, out, key, crypt_hdr, comp, mode, recursive,
+                        version=HEADER_FORMATS[header_format])
+    console.print(f"📚 [bold]Packed {info['members']} file(s) ({mode})[/]")
+    console.print(f"   → {info['raw_bytes']} bytes → {info['comp_bytes']} bytes in {info['frames']} frame(s)")
+    console.print(f"📦 [bold]Wrapped into .ppc Archive[/]")
+    console.print(f"   → Created {os.path.basename(out)} ({info['container_bytes']} bytes)")
 
-    table = Table(title="PPC Header")
-    table.add_column("Field")
-    table.add_column("Value")
 
-    for k, v in header.__dict__.items():
-        if isinstance(v, dict):
-            table.add_row(k, json.dumps(v))
+@cli.command("ls")
+@click.argument("archive_path", type=click.Path(exists=True, dir_okay=False))
+@_open_secret_options
+@click.option("--json", "as_json", is_flag=True, help="Print the directory as JSON")
+def ls(archive_path, passphrase, key_file, as_json):
+    """List the members of an archive, decrypting only its directory."""
+    try:
+        header, _ = read_header(archive_path)
+        if header.mime != ARCHIVE_MIME:
+            raise ValueError("Not a PPC archive")
+        _, members = list_members(archive_path, _header_key(header, passphrase, key_file))
+    except InvalidTag:
+        raise click.ClickException("Decryption failed. Invalid passphrase or corrupted data.")
+    except (ValueError, ZstdError) as e:
+        raise click.ClickException(f"Listing failed: {e}")
+    if as_json:
+        click.echo(json.dumps(members, indent=2))
+        return
+    table = Table(title=f"{header.orig_name} ({len(members)} files, {header.comp.get('archive', 'solid')})")
+    table.add_column("Name")
+    table.add_column("Size", justify="right")
+    table.add_column("Modified")
+    for m in members:
+        table.add_row(m["name"], str(m["size"]), time.strftime("%Y-%m-%d %H:%M", time.localtime(m["mtime"])))
+    console.print(table)
+
+
+@cli.command()
+@click.argument("archive_path", type=click.Path(exists=True, dir_okay=False))
+@click.argument("members", nargs=-1)
+@click.option("-C", "--directory", "dest", type=click.Path(file_okay=False), default=".", show_default=True,
+              help="Directory to extract into")
+@_open_secret_options
+def unarchive(archive_path, members, dest, passphrase, key_file):
+    """Extract an archive, or only the named MEMBERS (decoding just the frames they cover)."""
+    try:
+        header, _ = read_header(archive_path)
+        if header.mime != ARCHIVE_MIME:
+            raise ValueError("Not a PPC archive; use decompress")
+        done = extract_members(archive_path, _header_key(header, passphrase, key_file), dest, list(members))
+    except InvalidTag:
+        raise click.ClickException("Decryption failed. Invalid passphrase or corrupted data.")
+    except (ValueError, ZstdError) as e:
+        raise click.ClickException(f"Extraction failed: {e}")
+    console.print(f"✅ [bold green]Extracted[/] {len(done)} file(s) → {dest}")
+
+
+def _expand_paths(patterns: tuple[str, ...]) -> list[str]:
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            paths.extend(m for m in sorted(glob.glob(pattern, recursive=True)) if os.path.isfile(m))
         else:
-            table.add_row(k, str(v))
+            paths.append(pattern)  # a missing file is reported by read_header
+    return paths
+
+
+@cli.command()
+@click.argument("container_paths", nargs=-1, required=True)
+@click.option("--json", "as_json", is_flag=True, help="Print headers as JSON")
+def inspect(container_paths, as_json):
+    """View container header metadata (paths or globs; only headers are read)."""
+    rows = []
+    for path in _expand_paths(container_paths):
+        try:
+            header, payload_bytes = read_header(path)
+        except (OSError, ValueError) as e:
+            rows.append({"path": path, "error": str(e)})
+            continue
+        rows.append(dict(path=path, **header.__dict__, payload_bytes=payload_bytes))
+    if not rows:
+        raise click.ClickException("No containers matched")
+
+    if as_json:
+        click.echo(json.dumps(rows, indent=2))
+    elif len(rows) == 1:
+        row = rows[0]
+        if "error" in row:
+            raise click.ClickException(f"Could not inspect file: {row['error']}")
+        table = Table(title="PPC Header")
+        table.add_column("Field")
+        table.add_column("Value")
+        for k, v in row.items():
+            if k == "path":
+                continue
+            table.add_row(k, json.dumps(v) if isinstance(v, dict) else str(v))
+        console.print(table)
+    else:
+        table = Table(title=f"PPC Headers ({len(rows)} files)")
+        for col in ("Path", "Ver", "Name", "MIME", "Created", "KDF", "Cipher", "Codec", "Payload bytes"):
+            table.add_column(col)
+        for row in rows:
+            if "error" in row:
+                table.add_row(row["path"], "", "", "", "", "", "", "", f"[red]{row['error']}[/]")
+                continue
+            codec = f"{row['comp'].get('name')}/{row['comp'].get('level', '-')}"
+            table.add_row(row["path"], str(row["version"]), row["orig_name"], row["mime"], row["created"],
+                          row["kdf"]["name"], row["cipher"]["name"], codec, str(row["payload_bytes"]))
+        console.print(table)
+    failed = sum("error" in row for row in rows)
+    if failed:
+        raise click.ClickException(f"{failed} file(s) could not be inspected")
+
+
+@cli.group("dict")
+def dict_group():
+    """Train and register zstd dictionaries for small files."""
+
+
+@dict_group.command("train")
+@click.argument("samples", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("-o", "--output", type=click.Path(dir_okay=False), required=True, help="Dictionary file to write")
+@click.option("--size", type=click.IntRange(min=256), default=DICT_SIZE, show_default=True,
+              help="Dictionary size in bytes")
+def dict_train(samples, output, size):
+    """Train a dictionary on SAMPLES (files or directories) and register it."""
+    paths = []
+    for sample in samples:
+        if os.path.isdir(sample):
+            paths += [os.path.join(sample, rel) for rel in walk_files(sample)]
+        else:
+            paths.append(sample)
+    try:
+        zdict = train_dict([read_bytes(p) for p in paths], size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    with open_output(output) as dst:
+        dst.write(zdict.dict_content)
+    register_dict(zdict.dict_content)
+    console.print(f"📖 [bold]Trained dictionary {zdict.dict_id}[/] on {len(paths)} sample(s)")
+    console.print(f"   → {output} ({len(zdict.dict_content)} bytes), registered in {dict_dir()}")
+
+
+@dict_group.command("add")
+@click.argument("dict_path", type=click.Path(exists=True, dir_okay=False))
+def dict_add(dict_path):
+    """Register an existing .zdict so containers that use it can be decompressed."""
+    try:
+        dict_id = register_dict(read_bytes(dict_path))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    console.print(f"✅ [bold green]Registered[/] dictionary {dict_id} → {dict_dir()}")
+
+
+@dict_group.command("list")
+def dict_list():
+    """Show the registered dictionaries."""
+    table = Table(title=f"Dictionaries in {dict_dir()}")
+    table.add_column("ID", justify="right")
+    table.add_column("Bytes", justify="right")
+    for dict_id, size in registered_dicts():
+        table.add_row(str(dict_id), str(size))
+    console.print(table)
+
+
+@cli.group("store")
+def store_group():
+    """Inspect and clean the chunk store behind `ppc compress --dedupe`."""
+
+
+def _open_chunk_store(store_root: str | None) -> ChunkStore:
+    try:
+        return ChunkStore(store_root)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+
+@store_group.command("stats")
+@_store_option
+@click.option("--json", "as_json", is_flag=True, help="Print the numbers as JSON")
+def store_stats(store_root, as_json):
+    """Show chunk counts, stored bytes and the deduplication ratio."""
+    st = _open_chunk_store(store_root).stats()
+    if as_json:
+        click.echo(json.dumps(st, indent=2))
+        return
+    dedup = st["logical_bytes"] / st["unique_bytes"] if st["unique_bytes"] else 0.0
+    ratio = st["logical_bytes"] / st["stored_bytes"] if st["stored_bytes"] else 0.0
+    table = Table(title=f"Chunk store {st['id']} ({st['store']})")
+    table.add_column("")
+    table.add_column("Value", justify="right")
+    for label, value in (("Containers", st["containers"]), ("Chunks", st["chunks"]),
+                         ("Bytes referenced", st["logical_bytes"]), ("Unique bytes", st["unique_bytes"]),
+                         ("Stored bytes", st["stored_bytes"]), ("Dedupe ratio", f"{dedup:.2f}"),
+                         ("Overall ratio", f"{ratio:.2f}"),
+                         ("Unreferenced chunks", f"{st['unreferenced_chunks']} ({st['unreferenced_bytes']} bytes)"),
+                         ("Missing chunks", st["missing_chunks"])):
+        table.add_row(label, str(value))
+    console.print(table)
+
+
+@store_group.command("gc")
+@click.argument("live", nargs=-1, type=click.Path(exists=True))
+@_store_option
+@click.option("--dry-run", is_flag=True, help="Only report what would be deleted")
+def store_gc(live, store_root, dry_run):
+    """Delete chunks that no container references.
 
-    table.add_row("payload_bytes", str(len(payload)))
+    With LIVE containers (files or directories of them), recipes of every other
+    container are forgotten first, so their unshared chunks go too. Do not
+    run it while `ppc compress --dedupe` writes to the same store.
+    """
+    store = _open_chunk_store(store_root)
+    keep = None
+    if live:
+        keep = set()
+        for path in live:
+            for p in ([os.path.join(path, rel) for rel in walk_files(path, suffix=SUFFIX)] if os.path.isdir(path)
+                      else [path]):
+                try:
+                    header, _ = read_header(p)
+                except ValueError as e:
+                    raise click.ClickException(f"{p}: {e}")
+                if header.comp.get("store") == store.id:
+                    keep.add(header.comp["recipe"])
+    result = store.gc(keep, dry_run)
+    verb = "Would delete" if dry_run else "Deleted"
+    console.print(f"🧹 [bold]{verb} {result['chunks_deleted']} chunk(s)[/] ({result['bytes_freed']} bytes), "
+                  f"{result['recipes_dropped']} recipe(s) forgotten")
+
+
+def _csv(kind=str):
+    def parse(ctx, param, value):
+        items = [v.strip() for v in value.split(",") if v.strip()]
+        try:
+            return [kind(v) for v in items]
+        except ValueError:
+            raise click.BadParameter(f"expected a comma-separated list, got {value!r}")
+    return parse
+
+
+@cli.command()
+@click.argument("paths", nargs=-1, required=True)
+@click.option("--codecs", default=",".join(c for c in available_codecs() if c != "none"), show_default=True,
+              callback=_csv(), help="Codecs to sweep")
+@click.option("--levels", default="", callback=_csv(int),
+              help="Levels to try (default: a spread per codec; out-of-range levels are skipped per codec)")
+@click.option("--threads", "thread_counts", default="1", show_default=True,
+              callback=_csv(lambda v: os.cpu_count() or 1 if v == "auto" else int(v)),
+              help="zstd worker-thread counts, e.g. '1,auto'")
+@click.option("--decode-threads", default="auto", show_default=True, callback=_parse_threads,
+              help="Frames decoded in parallel, as `ppc decompress --threads`")
+@click.option("--policy", envvar="PPC_CODEC_POLICY", default="auto", show_default=True, callback=_load_policy,
+              help="Codec policy, as `ppc compress --policy` ('off' benchmarks every codec on every file)")
+@click.option("--ciphers", default="aes-256-gcm", show_default=True, callback=_csv(),
+              help="AEADs to sweep, e.g. 'aes-256-gcm,chacha20-poly1305'")
+@_kdf_options
+@click.option("--repeat", type=click.IntRange(min=1), default=1, show_default=True,
+              help="Runs per configuration (best time is kept)")
+@click.option("--all", "show_all", is_flag=True, help="Show every configuration, not just the Pareto frontier")
+@click.option("--json", "as_json", is_flag=True, help="Print all results as JSON")
+def bench(paths, codecs, levels, thread_counts, decode_threads, policy, ciphers, kdf, kdf_params, repeat, show_all, as_json):
+    """Sweep codecs, levels, zstd threads and ciphers over PATHS (files, directories or globs).
+
+    Runs the same compress/decompress pipeline as `ppc compress`, then reports
+    ratio and MB/s per configuration, the Pareto frontier, and the KDF cost.
+    """
+    files = []
+    for path in _expand_paths(paths):
+        files += [os.path.join(path, rel) for rel in walk_files(path)] if os.path.isdir(path) else [path]
+    missing = [f for f in files if not os.path.isfile(f)]
+    if missing or not files:
+        raise click.BadParameter(f"no such file: {missing[0]}" if missing else "no files to benchmark",
+                                 param_hint="PATHS")
+    try:
+        params = parse_kdf_params(kdf, kdf_params)
+        cfgs = bench_configs(codecs, levels, thread_counts, ciphers)
+        for cipher in set(ciphers):
+            if cipher not in ("aes-256-gcm", "chacha20-poly1305"):
+                raise ValueError(f"Unsupported cipher: {cipher}")
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if not cfgs:
+        raise click.BadParameter("the sweep is empty (check --codecs and --levels)")
+
+    with console.status(f"[bold cyan]Benchmarking {len(cfgs)} configuration(s) on {len(files)} file(s)..."):
+        report = run_bench(files, cfgs, params, repeat, policy, decode_threads)
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+        return
+    rows = sorted(report["results"], key=lambda r: -r["compress_mbps"])
+    table = Table(title=f"{'All configurations' if show_all else 'Pareto frontier'} "
+                        f"({report['files']} file(s), {report['raw_bytes']} bytes)")
+    for col in ("Codec", "Level", "Threads", "Cipher", "Ratio", "Compress MB/s", "Decompress MB/s", ""):
+        table.add_column(col, justify="right" if col not in ("Codec", "Cipher") else "left")
+    for r in rows:
+        if show_all or r["pareto"]:
+            table.add_row(r["codec"], "-" if r["level"] is None else str(r["level"]), str(r["threads"]), r["cipher"],
+                          f"{r['ratio']:.3f}", f"{r['compress_mbps']:.1f}", f"{r['decompress_mbps']:.1f}",
+                          "★" if r["pareto"] else "")
+    console.print(table)
+    kdf_info = ", ".join(f"{k}={v}" for k, v in report["kdf"].items() if k not in ("name", "ms"))
+    console.print(f"🔑 KDF {report['kdf']['name']} ({kdf_info}): [bold]{report['kdf']['ms']:.0f} ms[/] per container "
+                  f"(once per batch with compress-dir)")
+
+
+@cli.command()
+@click.option("--target-ms", type=click.FloatRange(min=1), default=250, show_default=True,
+              help="Target key-derivation time per container")
+@click.option("--kdf", type=click.Choice(["scrypt", "argon2id"]), default="scrypt", show_default=True)
+@click.option("--memory-mib", type=click.IntRange(min=1), default=None,
+              help="argon2id memory size / scrypt memory ceiling")
+@click.option("--parallelism", type=click.IntRange(min=1), default=None, help="scrypt p / argon2id lanes")
+@click.option("--json", "as_json", is_flag=True, help="Print the parameters as JSON")
+def calibrate(target_ms, kdf, memory_mib, parallelism, as_json):
+    """Benchmark this host and pick KDF parameters for a target derivation time."""
+    try:
+        params, ms = calibrate_kdf(target_ms, kdf, memory_mib, parallelism)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    spec = ",".join(f"{k}={v}" for k, v in params.items() if k != "name")
+    if as_json:
+        click.echo(json.dumps({"params": params, "measured_ms": round(ms, 1)}))
+        return
+    table = Table(title=f"{kdf} calibration (target {target_ms:g} ms)")
+    table.add_column("Parameter")
+    table.add_column("Value")
+    for k, v in params.items():
+        table.add_row(k, str(v))
+    table.add_row("measured_ms", f"{ms:.1f}")
     console.print(table)
+    console.print(f"Use: [bold]ppc compress --kdf {kdf} --kdf-params {spec}[/] (or PPC_KDF_PARAMS={spec})")
 
 
 @cli.command()
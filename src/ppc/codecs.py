@@ -0,0 +1,194 @@
+"""Codec registry keyed by `Header.comp["name"]`.
+
+Every codec implements `Codec`: one-shot `compress(data, comp)` and
+`decompress(data, comp)`, called once per frame. (VERSION 1 containers
+predate the registry; they are always zstd and stream through pyzstd
+directly, see pipeline.py.)
+
+zstd is always available; lz4 and brotli are optional extras (`pip install
+ppc-cli[lz4]`, `ppc-cli[brotli]`) and xz comes from the standard library.
+
+zstd long mode (`comp["window_log"]`, `ppc compress --long`) enables
+long-distance matching with a 2**window_log byte window. Decoding a frame then
+needs a window of that size too, so readers refuse anything above
+MAX_WINDOW_LOG rather than allocate whatever a header asks for.
+"""
+from __future__ import annotations
+import lzma
+from abc import ABC, abstractmethod
+from pyzstd import CParameter, DParameter, compress as zstd_compress, compressionLevel_values, \
+    decompress as zstd_decompress
+
+from .dicts import comp_dict
+
+try:
+    import lz4.frame
+    _HAVE_LZ4 = True
+except ImportError:
+    _HAVE_LZ4 = False
+
+try:
+    import brotli
+    _HAVE_BROTLI = True
+except ImportError:
+    _HAVE_BROTLI = False
+
+
+LONG_WINDOW_LOG = 27  # `--long` without --long-window: 128 MiB, as `zstd --long`
+MAX_WINDOW_LOG = 30  # 1 GiB window, the most a reader will allocate per frame
+
+
+def zstd_options(comp: dict) -> dict:
+    option = {CParameter.compressionLevel: comp["level"]}
+    if comp.get("threads", 1) > 1:
+        option[CParameter.nbWorkers] = comp["threads"]
+        option[CParameter.jobSize] = comp["job_size"]
+        option[CParameter.overlapLog] = comp["overlap_log"]
+    if comp.get("window_log"):
+        option[CParameter.enableLongDistanceMatching] = 1
+        option[CParameter.windowLog] = comp["window_log"]
+    return option
+
+
+def check_window_log(window_log: int) -> int:
+    if not 10 <= window_log <= MAX_WINDOW_LOG:
+        raise ValueError(f"zstd window log must be between 10 and {MAX_WINDOW_LOG}, got {window_log}")
+    return window_log
+
+
+def zstd_decode_options(comp: dict) -> dict | None:
+    """Decoder options for long mode: allow exactly the window the header declares."""
+    if not comp.get("window_log"):
+        return None
+    return {DParameter.windowLogMax: check_window_log(comp["window_log"])}
+
+
+class Codec(ABC):
+    name = ""
+    title = ""  # for the CLI
+    levels = (0, 0)  # accepted level range
+    default_level = 0
+    fast_level = 0
+    available = True
+
+    @abstractmethod
+    def compress(self, data: bytes, comp: dict) -> bytes:
+        """One frame's worth of `data` as a self-contained compressed block."""
+
+    @abstractmethod
+    def decompress(self, data: bytes, comp: dict) -> bytes:
+        """Invert `compress`; corrupt or truncated input raises ValueError (or ZstdError)."""
+
+    def check_level(self, level: int) -> int:
+        lo, hi = self.levels
+        if not lo <= level <= hi:
+            raise ValueError(f"{self.name} level must be between {lo} and {hi}")
+        return level
+
+
+class NoneCodec(Codec):
+    """Stored as is (see policy.py)."""
+    name = "none"
+    title = "Stored (no compression)"
+
+    def compress(self, data: bytes, comp: dict) -> bytes:
+        return bytes(data)
+
+    def decompress(self, data: bytes, comp: dict) -> bytes:
+        return bytes(data)
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    title = "Zstandard"
+    levels = (compressionLevel_values.min, compressionLevel_values.max)
+    default_level = 7
+    fast_level = 1
+
+    def compress(self, data: bytes, comp: dict) -> bytes:
+        return zstd_compress(data, level_or_option=zstd_options(comp), zstd_dict=comp_dict(comp))
+
+    def decompress(self, data: bytes, comp: dict) -> bytes:
+        return zstd_decompress(data, comp_dict(comp), zstd_decode_options(comp))
+
+
+class XzCodec(Codec):
+    """xz/LZMA2 for cold archival; the container's AEAD already covers integrity, so no xz check."""
+    name = "xz"
+    title = "XZ (LZMA2)"
+    levels = (0, 9)
+    default_level = 6
+    fast_level = 1
+
+    def compress(self, data: bytes, comp: dict) -> bytes:
+        return lzma.compress(data, format=lzma.FORMAT_XZ, check=lzma.CHECK_NONE, preset=comp["level"])
+
+    def decompress(self, data: bytes, comp: dict) -> bytes:
+        d = lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+        try:
+            out = d.decompress(data)
+        except lzma.LZMAError as e:
+            raise ValueError(f"xz data is corrupt: {e}")
+        if not d.eof:
+            raise ValueError("xz data is truncated")
+        return out
+
+
+class Lz4Codec(Codec):
+    """LZ4 frames for latency-critical paths (levels >= 3 switch to LZ4-HC)."""
+    name = "lz4"
+    title = "LZ4"
+    levels = (0, 16)
+    default_level = 0
+    fast_level = 0
+    available = _HAVE_LZ4
+
+    def compress(self, data: bytes, comp: dict) -> bytes:
+        return lz4.frame.compress(data, compression_level=comp["level"])
+
+    def decompress(self, data: bytes, comp: dict) -> bytes:
+        try:
+            return lz4.frame.decompress(data)
+        except RuntimeError as e:
+            raise ValueError(f"lz4 data is corrupt: {e}")
+
+
+class BrotliCodec(Codec):
+    """Brotli for cold archival of text-heavy data."""
+    name = "brotli"
+    title = "Brotli"
+    levels = (0, 11)
+    default_level = 9
+    fast_level = 1
+    available = _HAVE_BROTLI
+
+    def compress(self, data: bytes, comp: dict) -> bytes:
+        return brotli.compress(bytes(data), quality=comp["level"])
+
+    def decompress(self, data: bytes, comp: dict) -> bytes:
+        try:
+            return brotli.decompress(bytes(data))
+        except brotli.error as e:
+            raise ValueError(f"brotli data is corrupt: {e}")
+
+
+CODECS = {c.name: c for c in (ZstdCodec(), NoneCodec(), Lz4Codec(), BrotliCodec(), XzCodec())}
+DEFAULT_CODEC = "zstd"
+
+
+def get_codec(name: str) -> Codec:
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Unsupported codec: {name}")
+    if not codec.available:
+        raise ValueError(f"Codec {name} needs an optional dependency (pip install ppc-cli[{name}])")
+    return codec
+
+
+def codec_for(comp: dict | None) -> Codec:
+    """The codec a `Header.comp` dict names; zstd when absent (older headers)."""
+    return get_codec((comp or {}).get("name", DEFAULT_CODEC))
+
+
+def available_codecs() -> list[str]:
+    return [name for name, c in CODECS.items() if c.available]
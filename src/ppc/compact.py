@@ -0,0 +1,170 @@
+"""Compact binary header encoding (container VERSION 3).
+
+The JSON header spells out every key and base64-encodes salts and nonces;
+for catalogues of many small containers that is most of the file. Here the
+same fields are written in a fixed order:
+
+    section := <varint present-mask> field*   (one field per set mask bit)
+    header  := top-section kdf-section cipher-section comp-section <varint ext_len> ext
+
+Integers are LEB128 varints (zigzag for signed), strings and byte fields are
+varint length-prefixed, names are one-byte indexes into the tables below and
+`created` is stored as Unix seconds. Any key or value the layout cannot
+represent exactly goes into `ext`, a JSON object merged back over the decoded
+fields, so every header round-trips unchanged.
+
+The schemas and name tables are part of the wire format: only ever append.
+"""
+from __future__ import annotations
+import json
+from calendar import timegm
+from datetime import datetime, timezone
+
+from .utils import ISO, b64d, b64e
+
+KDF_NAMES = ("scrypt", "argon2id", "raw", "scrypt+hkdf", "argon2id+hkdf")
+CIPHER_NAMES = ("aes-256-gcm", "chacha20-poly1305")
+COMP_NAMES = ("zstd", "none", "lz4", "brotli", "xz")
+
+_TOP = (("mime", "s"), ("orig_name", "s"), ("created", "t"), ("notes", "s"))
+_SECTIONS = {
+    "kdf": (("name", KDF_NAMES), ("n", "u"), ("r", "u"), ("p", "u"), ("t", "u"), ("m", "u"),
+            ("salt_b64", "b64"), ("key_id", "hex"), ("hkdf", ("sha256",)), ("subkey_salt_b64", "b64")),
+    "cipher": (("name", CIPHER_NAMES), ("nonce_prefix_b64", "b64"), ("tag_len", "u"), ("stream", ("be32-last",)),
+               ("nonce_b64", "b64")),
+    "comp": (("name", COMP_NAMES), ("level", "i"), ("frame_size", "u"), ("threads", "u"), ("job_size", "u"),
+             ("overlap_log", "u"), ("archive", ("solid", "file")),
+             ("dict_id", "u"), ("window_log", "u"), ("store", "hex"), ("recipe", "hex"), ("base", "hex")),
+}
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while n > 0x7F:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _blob(b: bytes) -> bytes:
+    return _varint(len(b)) + b
+
+
+def _encode_value(kind, v) -> bytes | None:
+    """Wire bytes for `v`, or None if this field cannot hold it exactly."""
+    if isinstance(kind, tuple):
+        return bytes([kind.index(v)]) if v in kind else None
+    if kind in ("u", "i"):
+        if type(v) is not int:
+            return None
+        z = v if kind == "u" else v * 2 if v >= 0 else -v * 2 - 1
+        return _varint(z) if 0 <= z < 1 << 63 else None
+    if not isinstance(v, str):
+        return None
+    if kind == "s":
+        return _blob(v.encode("utf-8"))
+    try:
+        if kind == "t":
+            secs = timegm(datetime.strptime(v, ISO).timetuple())
+            ok = secs >= 0 and datetime.fromtimestamp(secs, timezone.utc).strftime(ISO) == v
+            return _varint(secs) if ok else None
+        raw = b64d(v) if kind == "b64" else bytes.fromhex(v)
+    except ValueError:
+        return None
+    return _blob(raw) if (b64e(raw) if kind == "b64" else raw.hex()) == v else None
+
+
+def _encode_section(schema, obj: dict, ext: dict) -> bytes:
+    """Encode the fields of `obj` that fit `schema`; everything else goes into `ext`."""
+    mask, body, done = 0, bytearray(), set()
+    for bit, (key, kind) in enumerate(schema):
+        enc = _encode_value(kind, obj[key]) if key in obj else None
+        if enc is not None:
+            mask |= 1 << bit
+            body += enc
+            done.add(key)
+    ext.update((k, v) for k, v in obj.items() if k not in done)
+    return _varint(mask) + bytes(body)
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data, self.pos = data, 0
+
+    def take(self, n: int) -> bytes:
+        if self.pos + n > len(self.data):
+            raise ValueError("Compact header is truncated")
+        self.pos += n
+        return self.data[self.pos - n:self.pos]
+
+    def varint(self) -> int:
+        n = shift = 0
+        while True:
+            b = self.take(1)[0]
+            n |= (b & 0x7F) << shift
+            if b < 0x80:
+                return n
+            shift += 7
+            if shift >= 63:
+                raise ValueError("Compact header has an oversized integer")
+
+    def value(self, kind):
+        if isinstance(kind, tuple):
+            i = self.take(1)[0]
+            if i >= len(kind):
+                raise ValueError(f"Compact header has an unknown name id {i}")
+            return kind[i]
+        if kind == "u":
+            return self.varint()
+        if kind == "i":
+            z = self.varint()
+            return -(z >> 1) - 1 if z & 1 else z >> 1
+        if kind == "t":
+            try:
+                return datetime.fromtimestamp(self.varint(), timezone.utc).strftime(ISO)
+            except (OverflowError, OSError):
+                raise ValueError("Compact header has an invalid timestamp")
+        raw = self.take(self.varint())
+        return raw.decode("utf-8") if kind == "s" else b64e(raw) if kind == "b64" else raw.hex()
+
+    def section(self, schema) -> dict:
+        mask = self.varint()
+        if mask >> len(schema):
+            raise ValueError("Compact header has unknown fields")
+        return {key: self.value(kind) for bit, (key, kind) in enumerate(schema) if mask >> bit & 1}
+
+
+def encode(obj: dict) -> bytes:
+    """Encode a header dict (as written by `Header.to_json`) compactly."""
+    ext, out = {}, bytearray()
+    top = {k: v for k, v in obj.items() if k not in _SECTIONS}
+    out += _encode_section(_TOP, {k: v for k, v in top.items() if v is not None}, ext)
+    ext.update((k, None) for k, v in top.items() if v is None and k != "notes")
+    for name, schema in _SECTIONS.items():
+        rest = {}
+        out += _encode_section(schema, obj.get(name, {}), rest)
+        if rest or name not in obj:
+            ext[name] = rest if name in obj else None
+    blob = json.dumps(ext, separators=(",", ":")).encode("utf-8") if ext else b""
+    return bytes(out + _blob(blob))
+
+
+def decode(data: bytes) -> dict:
+    r = _Reader(bytes(data))
+    obj = r.section(_TOP)
+    obj.setdefault("notes", None)
+    for name, schema in _SECTIONS.items():
+        obj[name] = r.section(schema)
+    blob = r.take(r.varint())
+    if r.pos != len(r.data):
+        raise ValueError("Compact header has trailing bytes")
+    ext = json.loads(blob.decode("utf-8")) if blob else {}
+    if not isinstance(ext, dict):
+        raise ValueError("Compact header extension is not an object")
+    for k, v in ext.items():
+        if k in _SECTIONS and isinstance(v, dict):
+            obj[k].update(v)
+        else:
+            obj[k] = v
+    return obj
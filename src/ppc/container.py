@@ -1,9 +1,20 @@
 from __future__ import annotations
-import io, json, struct
-from dataclasses import dataclass
+import io, json, mmap, os, struct
+from dataclasses import MISSING, dataclass, field, fields
+from typing import BinaryIO, Iterable, Union
+
+from . import compact
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
 
 MAGIC = b"PPC1"
-VERSION = 1
+VERSION_SINGLE = 1  # payload is one AES-GCM message over one zstd frame
+VERSION_FRAMED = 2  # payload is a STREAM of independently sealed frames (see frames.py)
+VERSION_COMPACT = 3  # VERSION 2 payload under a binary header (see compact.py)
+VERSION = VERSION_FRAMED
+SUPPORTED_VERSIONS = (VERSION_SINGLE, VERSION_FRAMED, VERSION_COMPACT)
+HEADER_FORMATS = {"json": VERSION_FRAMED, "compact": VERSION_COMPACT}
+ARCHIVE_MIME = "application/x-ppc-archive"  # multi-file archive, see archive.py
 
 @dataclass
 class Header:
@@ -14,38 +25,118 @@ class Header:
     cipher: dict
     comp: dict
     notes: str | None = None
+    # Container version byte; carried alongside the header, not inside its JSON.
+    version: int = field(default=VERSION, repr=False)
 
     def to_json(self) -> bytes:
-        return json.dumps(self.__dict__, separators=(",", ":")).encode("utf-8")
+        obj = {k: v for k, v in self.__dict__.items() if k != "version"}
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    @staticmethod
+    def from_json(data: bytes, version: int = VERSION) -> "Header":
+        return Header.from_fields(json.loads(data.decode("utf-8")), version)
 
     @staticmethod
-    def from_json(data: bytes) -> "Header":
-        obj = json.loads(data.decode("utf-8"))
-        return Header(**obj)
+    def from_fields(obj, version: int = VERSION) -> "Header":
+        """Header from a decoded field dict; unknown or missing fields raise ValueError."""
+        if not isinstance(obj, dict):
+            raise ValueError("Header is not an object")
+        known = {f.name: f for f in fields(Header) if f.name != "version"}
+        unknown = sorted(set(obj) - set(known))
+        if unknown:
+            raise ValueError(f"Header has unknown fields: {', '.join(map(str, unknown))}")
+        missing = [n for n, f in known.items() if f.default is MISSING and n not in obj]
+        if missing:
+            raise ValueError(f"Header is missing fields: {', '.join(missing)}")
+        for name in ("kdf", "cipher", "comp"):
+            if not isinstance(obj[name], dict):
+                raise ValueError(f"Header field {name} is not an object")
+        return Header(**obj, version=version)
+
+    def aad(self) -> bytes:
+        """Associated data for every frame of a framed container: magic, version and header.
+
+        This is the header re-encoded, so any change to what a reader decodes
+        from it (codec, MIME type, output name, ...) fails the frames' tags.
+        """
+        return MAGIC + bytes([self.version]) + self.to_bytes()
+
+    def to_bytes(self) -> bytes:
+        """Header as stored for its container version."""
+        if self.version == VERSION_COMPACT:
+            return compact.encode({k: v for k, v in self.__dict__.items() if k != "version"})
+        return self.to_json()
+
+    @staticmethod
+    def from_bytes(data: bytes, version: int = VERSION) -> "Header":
+        if version == VERSION_COMPACT:
+            return Header.from_fields(compact.decode(data), version)
+        return Header.from_json(data, version)
+
+
+def _read_exact(f: BinaryIO, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) < n:
+        raise ValueError("Container is truncated or header length is corrupt")
+    return data
+
+
+def pack_to(fileobj: BinaryIO, header: Header, payload_iter: Iterable[bytes]) -> int:
+    """Write the header, then stream payload chunks. Returns total bytes written."""
+    head = header.to_bytes()
+    fileobj.write(MAGIC)
+    fileobj.write(struct.pack("<B", header.version))
+    fileobj.write(struct.pack("<I", len(head)))
+    fileobj.write(head)
+    written = len(MAGIC) + 5 + len(head)
+    for chunk in payload_iter:
+        fileobj.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def open_container(fileobj: BinaryIO) -> tuple[Header, BinaryIO]:
+    """Read the header and return it with `fileobj` positioned at the payload."""
+    if fileobj.read(4) != MAGIC:
+        raise ValueError("Not a PPC container")
+    ver = struct.unpack("<B", _read_exact(fileobj, 1))[0]
+    if ver not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Unsupported PPC version: {ver}")
+    hlen = struct.unpack("<I", _read_exact(fileobj, 4))[0]
+    header = Header.from_bytes(_read_exact(fileobj, hlen), ver)
+    return header, fileobj
 
 
 def pack(header: Header, payload: bytes) -> bytes:
-    head_json = header.to_json()
     buf = io.BytesIO()
-    buf.write(MAGIC)
-    buf.write(struct.pack("<B", VERSION))
-    buf.write(struct.pack("<I", len(head_json)))
-    buf.write(head_json)
-    buf.write(payload)
+    pack_to(buf, header, [payload])
     return buf.getvalue()
 
 
-def unpack(blob: bytes) -> tuple[Header, bytes]:
-    buf = io.BytesIO(blob)
-    if buf.read(4) != MAGIC:
+def unpack(blob: Buffer) -> tuple[Header, bytes | memoryview]:
+    """Split a whole container into header and payload.
+
+    `bytes` in gives `bytes` out, as before. Any other buffer (memoryview,
+    mmap, bytearray) gives a zero-copy memoryview slice of the payload.
+    """
+    view = memoryview(blob)
+    if view[:4] != MAGIC:
         raise ValueError("Not a PPC container")
-    ver = struct.unpack("<B", buf.read(1))[0]
-    if ver != VERSION:
+    if len(view) < 9:
+        raise ValueError("Container is truncated or header length is corrupt")
+    ver, hlen = struct.unpack_from("<BI", view, 4)
+    if ver not in SUPPORTED_VERSIONS:
         raise ValueError(f"Unsupported PPC version: {ver}")
-    hlen = struct.unpack("<I", buf.read(4))[0]
-    hjson = buf.read(hlen)
-    if len(hjson) < hlen:
+    if len(view) < 9 + hlen:
         raise ValueError("Container is truncated or header length is corrupt")
-    header = Header.from_json(hjson)
-    payload = buf.read()
-    return header, payload
\ No newline at end of file
+    header = Header.from_bytes(view[9:9 + hlen].tobytes(), ver)
+    payload = view[9 + hlen:]
+    return header, (payload.tobytes() if isinstance(blob, bytes) else payload)
+
+
+def read_header(path: str) -> tuple[Header, int]:
+    """Header of the container at `path` plus its payload size, without reading the payload."""
+    with open(path, "rb") as f:
+        header, _ = open_container(f)
+        start = f.tell()
+    return header, os.path.getsize(path) - start
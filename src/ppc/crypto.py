@@ -1,38 +1,320 @@
 from __future__ import annotations
+import binascii, hashlib, json, os, platform, time
+from functools import lru_cache
+from typing import Iterable, Iterator, Union
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography import __version__ as _CRYPTOGRAPHY_VERSION
 from os import urandom
-from .utils import b64e, b64d
+from .utils import b64e, b64d, cache_dir
+
+try:
+    from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+    _HAVE_ARGON2 = True
+except ImportError:  # cryptography < 44
+    _HAVE_ARGON2 = False
 
 # Scrypt parameters chosen for Windows-friendly defaults (adjustable)
 SCRYPT_N = 2 ** 14
 SCRYPT_R = 8
 SCRYPT_P = 1
+# Argon2id defaults (RFC 9106 "second recommended" option, memory in KiB)
+ARGON2_T = 3
+ARGON2_M = 64 * 1024
+ARGON2_P = 4
+# Refuse headers asking for more KDF memory than this (guards against hostile headers)
+MAX_KDF_MEMORY = 2 << 30
 KEY_LEN = 32  # 256-bit
 NONCE_LEN = 12
+TAG_LEN = 16
+# STREAM construction (Hoang et al.): nonce = prefix || be32 counter || last-flag
+STREAM_PREFIX_LEN = NONCE_LEN - 5
+# Both AEADs take a 256-bit key and a 96-bit nonce and append a 128-bit tag.
+CIPHERS = {"aes-256-gcm": AESGCM, "chacha20-poly1305": ChaCha20Poly1305}
+DEFAULT_CIPHER = "aes-256-gcm"
+AEAD = Union[AESGCM, ChaCha20Poly1305]
+
+
+def kdf_params(name: str = "scrypt", **overrides: int) -> dict:
+    """Full KDF parameter dict: scrypt uses n/r/p, argon2id uses t/m (KiB)/p."""
+    if name == "scrypt":
+        params = {"name": name, "n": SCRYPT_N, "r": SCRYPT_R, "p": SCRYPT_P}
+    elif name == "argon2id":
+        if not _HAVE_ARGON2:
+            raise ValueError("Argon2id needs cryptography >= 44")
+        params = {"name": name, "t": ARGON2_T, "m": ARGON2_M, "p": ARGON2_P}
+    else:
+        raise ValueError(f"Unsupported KDF: {name}")
+    unknown = set(overrides) - set(params)
+    if unknown:
+        raise ValueError(f"Unknown {name} parameter(s): {', '.join(sorted(unknown))}")
+    params.update(overrides)
+    return params
+
+
+def parse_kdf_params(name: str, spec: str | None) -> dict:
+    """Parse "n=65536,r=8,p=1" style overrides into a `kdf_params` dict."""
+    overrides = {}
+    for item in filter(None, (spec or "").split(",")):
+        k, sep, v = item.partition("=")
+        if not sep or not v.strip().isdigit():
+            raise ValueError(f"Bad KDF parameter {item!r}; expected key=integer")
+        overrides[k.strip()] = int(v)
+    return kdf_params(name, **overrides)
+
+
+def _kdf_memory(params: dict) -> int:
+    if params["name"].startswith("argon2id"):
+        return params["m"] * 1024
+    return 128 * params["n"] * params["r"] * params["p"]
 
 
-def derive_key(passphrase: str, salt: bytes) -> bytes:
-    kdf = Scrypt(salt=salt, length=KEY_LEN, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+def derive_key(passphrase: str, salt: bytes, params: dict | None = None) -> bytes:
+    """Derive a key with the given parameters (a `kdf_params` dict or a header kdf dict)."""
+    params = params or kdf_params()
+    if _kdf_memory(params) > MAX_KDF_MEMORY:
+        raise ValueError("KDF parameters exceed the memory limit")
+    if params["name"].split("+")[0] == "argon2id":
+        if not _HAVE_ARGON2:
+            raise ValueError("Argon2id needs cryptography >= 44")
+        kdf = Argon2id(salt=salt, length=KEY_LEN, iterations=params["t"], lanes=params["p"],
+                       memory_cost=params["m"])
+    else:
+        kdf = Scrypt(salt=salt, length=KEY_LEN, n=params["n"], r=params["r"], p=params["p"])
     return kdf.derive(passphrase.encode("utf-8"))
 
 
-def encrypt(plaintext: bytes, passphrase: str) -> tuple[bytes, dict]:
+def _kdf_header(salt: bytes, params: dict | None = None) -> dict:
+    return dict(params or kdf_params(), salt_b64=b64e(salt))
+
+
+def _header_crypto(salt: bytes, nonce: bytes, params: dict | None = None) -> dict:
+    return {
+        "kdf": _kdf_header(salt, params),
+        "cipher": {"name": "aes-256-gcm", "nonce_b64": b64e(nonce), "tag_len": TAG_LEN},
+    }
+
+
+def encrypt(plaintext: bytes, passphrase: str, kdf: dict | None = None) -> tuple[bytes, dict]:
     salt = urandom(16)
-    key = derive_key(passphrase, salt)
+    key = derive_key(passphrase, salt, kdf)
     nonce = urandom(NONCE_LEN)
     aead = AESGCM(key)
     ciphertext = aead.encrypt(nonce, plaintext, associated_data=None)
-    header_crypto = {
-        "kdf": {"name": "scrypt", "salt_b64": b64e(salt), "n": SCRYPT_N, "r": SCRYPT_R, "p": SCRYPT_P},
-        "cipher": {"name": "aes-256-gcm", "nonce_b64": b64e(nonce), "tag_len": 16},
-    }
-    return ciphertext, header_crypto
+    return ciphertext, _header_crypto(salt, nonce, kdf)
 
 
-def decrypt(ciphertext: bytes, passphrase: str, salt_b64: str, nonce_b64: str) -> bytes:
+def decrypt(ciphertext: bytes, passphrase: str, salt_b64: str, nonce_b64: str, kdf: dict | None = None) -> bytes:
+    """`kdf` is the header's kdf dict; it defaults to the scrypt constants for old callers."""
     salt = b64d(salt_b64)
     nonce = b64d(nonce_b64)
-    key = derive_key(passphrase, salt)
+    key = derive_key(passphrase, salt, kdf)
     aead = AESGCM(key)
-    return aead.decrypt(nonce, ciphertext, associated_data=None)
\ No newline at end of file
+    return aead.decrypt(nonce, ciphertext, associated_data=None)
+
+
+def decrypt_stream(chunks: Iterable[bytes], passphrase: str, salt_b64: str, nonce_b64: str,
+                   tag_len: int = TAG_LEN, kdf: dict | None = None) -> Iterator[bytes]:
+    """Streaming decrypt of a VERSION 1 payload (one AES-256-GCM message, tag last).
+    Raises InvalidTag once the stream is exhausted if authentication fails, so callers must discard any output already written."""
+    key = derive_key(passphrase, b64d(salt_b64), kdf)
+    dec = Cipher(algorithms.AES(key), modes.GCM(b64d(nonce_b64))).decryptor()
+    tail = b""
+    for chunk in chunks:
+        buf = tail + chunk
+        tail = buf[-tag_len:]
+        out = dec.update(buf[:-tag_len])
+        if out:
+            yield out
+    if len(tail) < tag_len:
+        raise ValueError("Payload is too short to contain an authentication tag")
+    yield dec.finalize_with_tag(tail)
+
+
+def make_aead(name: str, key: bytes) -> AEAD:
+    try:
+        return CIPHERS[name](key)
+    except KeyError:
+        raise ValueError(f"Unsupported cipher: {name}") from None
+
+
+def _bench_cipher(name: str, size: int = 1 << 20, rounds: int = 8) -> float:
+    aead, data, nonce = CIPHERS[name](urandom(KEY_LEN)), urandom(size), urandom(NONCE_LEN)
+    aead.encrypt(nonce, data, None)  # warm-up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        aead.encrypt(nonce, data, None)
+    return size * rounds / (time.perf_counter() - start) / 1e6
+
+
+@lru_cache(maxsize=1)
+def select_cipher() -> str:
+    """Pick the faster AEAD on this host; the result is cached on disk per host."""
+    host = f"{platform.node()}/{platform.machine()}/cryptography-{_CRYPTOGRAPHY_VERSION}"
+    path = os.path.join(cache_dir(), "cipher.json")
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+    if cached.get("host") == host and cached.get("cipher") in CIPHERS:
+        return cached["cipher"]
+    mbps = {name: _bench_cipher(name) for name in CIPHERS}
+    best = max(mbps, key=mbps.get)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"host": host, "cipher": best, "mbps": mbps}, f)
+    except OSError:
+        pass  # a read-only cache only costs us another benchmark next time
+    return best
+
+
+def _stream_cipher_header(cipher: str = DEFAULT_CIPHER) -> dict:
+    if cipher == "auto":
+        cipher = select_cipher()
+    if cipher not in CIPHERS:
+        raise ValueError(f"Unsupported cipher: {cipher}")
+    return {"name": cipher, "nonce_prefix_b64": b64e(urandom(STREAM_PREFIX_LEN)),
+            "tag_len": TAG_LEN, "stream": "be32-last"}
+
+
+def new_stream_key(passphrase: str, kdf: dict | None = None, cipher: str = DEFAULT_CIPHER) -> tuple[bytes, dict]:
+    """Derive a fresh per-file key for the framed (VERSION 2) format.
+    `cipher` is a CIPHERS name or "auto" (see `select_cipher`)."""
+    salt = urandom(16)
+    key = derive_key(passphrase, salt, kdf)
+    return key, {"kdf": _kdf_header(salt, kdf), "cipher": _stream_cipher_header(cipher)}
+
+
+def _cache_params(kdf: dict) -> tuple:
+    base = kdf["name"].split("+")[0]
+    return tuple((k, kdf[k]) for k in kdf_params(base) if k != "name") + (("name", base),)
+
+
+@lru_cache(maxsize=16)
+def _master_key(passphrase: str, salt: bytes, params: tuple) -> bytes:
+    return derive_key(passphrase, salt, dict(params))
+
+
+def hkdf_subkey(master: bytes, salt: bytes) -> bytes:
+    return HKDF(algorithm=hashes.SHA256(), length=KEY_LEN, salt=salt, info=b"ppc file key").derive(master)
+
+
+class KeySession:
+    """Runs the KDF once and hands out per-file HKDF subkeys.
+
+    Every container produced by a session records the shared master salt plus
+    its own subkey salt (kdf name "<kdf>+hkdf"); readers cache master keys per
+    (passphrase, salt, params), so a batch sharing one session pays for the KDF once.
+    """
+
+    def __init__(self, passphrase: str, salt: bytes | None = None, kdf: dict | None = None):
+        self.salt = salt or urandom(16)
+        self.params = kdf or kdf_params()
+        self._master = _master_key(passphrase, self.salt, _cache_params(self.params))
+
+    def new_stream_key(self, cipher: str = DEFAULT_CIPHER) -> tuple[bytes, dict]:
+        subsalt = urandom(16)
+        kdf = dict(_kdf_header(self.salt, self.params), name=self.params["name"] + "+hkdf", hkdf="sha256",
+                   subkey_salt_b64=b64e(subsalt))
+        return hkdf_subkey(self._master, subsalt), {"kdf": kdf, "cipher": _stream_cipher_header(cipher)}
+
+
+def load_raw_key(material: bytes | str) -> bytes:
+    """Accept a 256-bit key as 32 raw bytes, 64 hex digits or base64 text."""
+    if isinstance(material, bytes) and len(material) == KEY_LEN:
+        return material
+    text = material.decode("ascii", "replace") if isinstance(material, bytes) else material
+    text = text.strip()
+    try:
+        key = bytes.fromhex(text) if len(text) == 2 * KEY_LEN else b64d(text)
+    except (ValueError, binascii.Error):
+        key = b""
+    if len(key) != KEY_LEN:
+        raise ValueError("Raw key must be 32 bytes (raw, hex or base64)")
+    return key
+
+
+def key_id(key: bytes) -> str:
+    return hashlib.blake2b(key, digest_size=8, person=b"ppc-key-id").hexdigest()
+
+
+def raw_stream_key(key: bytes, cipher: str = DEFAULT_CIPHER) -> tuple[bytes, dict]:
+    """Per-file subkey from a caller-held raw key; no KDF, just one HKDF call."""
+    subsalt = urandom(16)
+    kdf = {"name": "raw", "key_id": key_id(key), "hkdf": "sha256", "subkey_salt_b64": b64e(subsalt)}
+    return hkdf_subkey(key, subsalt), {"kdf": kdf, "cipher": _stream_cipher_header(cipher)}
+
+
+def key_from_header(kdf: dict, passphrase: str | None = None, raw_key: bytes | None = None) -> bytes:
+    """Rebuild a file key from a header kdf dict, honouring its stored parameters."""
+    if kdf["name"] == "raw":
+        if raw_key is None:
+            raise ValueError(f"Container needs raw key {kdf['key_id']} (use --key-file or PPC_KEY)")
+        if key_id(raw_key) != kdf["key_id"]:
+            raise ValueError(f"Wrong raw key: container needs key {kdf['key_id']}, got {key_id(raw_key)}")
+        return hkdf_subkey(raw_key, b64d(kdf["subkey_salt_b64"]))
+    if passphrase is None:
+        raise ValueError("Container needs a passphrase")
+    base, _, mode = kdf["name"].partition("+")
+    if base not in ("scrypt", "argon2id") or mode not in ("", "hkdf"):
+        raise ValueError(f"Unsupported KDF: {kdf['name']}")
+    if mode == "hkdf":
+        master = _master_key(passphrase, b64d(kdf["salt_b64"]), _cache_params(kdf))
+        return hkdf_subkey(master, b64d(kdf["subkey_salt_b64"]))
+    return derive_key(passphrase, b64d(kdf["salt_b64"]), kdf)
+
+
+def _time_kdf(params: dict) -> float:
+    start = time.perf_counter()
+    derive_key("calibration", urandom(16), params)
+    return (time.perf_counter() - start) * 1000
+
+
+def calibrate(target_ms: float, name: str = "scrypt", memory_mib: int | None = None,
+              parallelism: int | None = None) -> tuple[dict, float]:
+    """Pick the strongest parameters that derive a key within `target_ms` on this host.
+
+    scrypt doubles N (r=8) and argon2id raises the iteration count at a fixed
+    memory size. Returns (params, measured_ms); never goes below the floor of
+    N=2**12 / t=1 even if that alone exceeds the target.
+    """
+    if name == "scrypt":
+        params = kdf_params(name, n=2 ** 12, p=parallelism or SCRYPT_P)
+        limit = (memory_mib << 20) if memory_mib else MAX_KDF_MEMORY
+        ms = _time_kdf(params)
+        while ms * 2 <= target_ms and _kdf_memory(dict(params, n=params["n"] * 2)) <= limit:
+            params["n"] *= 2
+            ms = _time_kdf(params)
+        return params, ms
+    params = kdf_params(name, t=1, m=(memory_mib or ARGON2_M // 1024) * 1024, p=parallelism or ARGON2_P)
+    ms = _time_kdf(params)
+    per_pass = ms
+    while ms + per_pass <= target_ms:
+        params["t"] += 1
+        ms = _time_kdf(params)
+        per_pass = ms / params["t"]
+    return params, ms
+
+
+def stream_nonce(prefix: bytes, counter: int, last: bool, trailer: bool = False) -> bytes:
+    """STREAM nonce. `trailer` marks a block sealed after the last frame (an
+    archive directory); its flag byte keeps it apart from every frame nonce."""
+    if counter >= 1 << 32:
+        raise ValueError("Too many frames for a single STREAM")
+    return prefix + counter.to_bytes(4, "big") + (b"\x02" if trailer else b"\x01" if last else b"\x00")
+
+
+def seal_frame(aead: AEAD, prefix: bytes, counter: int, last: bool, data: bytes, trailer: bool = False,
+               aad: bytes = b"") -> bytes:
+    """`aad` is the container header (`Header.aad`), so no header field can be changed undetected."""
+    return aead.encrypt(stream_nonce(prefix, counter, last, trailer), data, aad)
+
+
+def open_frame(aead: AEAD, prefix: bytes, counter: int, last: bool, data: bytes, trailer: bool = False,
+               aad: bytes = b"") -> bytes:
+    return aead.decrypt(stream_nonce(prefix, counter, last, trailer), data, aad)
@@ -0,0 +1,331 @@
+"""Deduplicating containers backed by a local content-addressed chunk store.
+
+`ppc compress --dedupe` cuts the input into content-defined chunks, so an
+insertion or deletion only changes the chunks around it. Each unique chunk is
+compressed, sealed and stored once as
+
+    <store>/chunks/<ab>/<chunk id>:  <B codec> <B cipher> nonce sealed(compressed chunk, aad=chunk id)
+
+The container itself is an ordinary framed container whose payload is the
+recipe, one `<I raw_len> <32s chunk id> <32s chunk key>` entry per chunk;
+`comp["store"]` names the store and `comp["recipe"]` the recipe. Since every
+chunk key travels inside the encrypted recipe, reading needs the container's
+secret and the store's chunk files, nothing more.
+
+Chunk IDs and keys are keyed BLAKE2b values under a store secret derived from
+the passphrase (or raw key) and the store's salt in `store.json`, so the
+store reveals neither chunk contents nor plaintext hashes, and callers with
+another secret get a separate namespace in the same directory. Each container
+also leaves `<store>/refs/<recipe>` (its chunk IDs and sizes, no key
+material) behind for `ppc store stats` and `ppc store gc`.
+
+Chunk boundaries: every position gets a hash byte mixing the bytes just
+before it (computed for a whole buffer at once with big-int arithmetic, see
+`_hashes`); a chunk ends at the first position at least MIN_CHUNK bytes in
+where the hash bytes clear CUT_BITS bits (see `_find_cut`), or at MAX_CHUNK.
+"""
+from __future__ import annotations
+import hashlib, json, os, struct, time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+
+from .codecs import get_codec
+from .compact import CIPHER_NAMES, COMP_NAMES
+from .container import Header, pack_to, VERSION, VERSION_FRAMED
+from .crypto import KEY_LEN, NONCE_LEN, derive_key, hkdf_subkey, make_aead
+from .detect import detect_mime
+from .frames import encode_frames
+from .utils import b64d, b64e, cache_dir, imap_ordered, iter_chunks, now_iso, open_output
+
+MIN_CHUNK = 256 << 10
+MAX_CHUNK = 4 << 20
+CUT_BITS = 19  # mean chunk is MIN_CHUNK + 512 KiB; two zero hash bytes plus a byte below 32
+SCAN_SIZE = 16 << 20  # bytes hashed per pass
+_ENTRY = struct.Struct("<I32s32s")
+_REF = struct.Struct("<I32s")
+
+# Fixed forever: changing any of these moves every chunk boundary.
+_WINDOW = 16  # input bytes mixed into each hash byte
+_LEAD = _WINDOW + 16  # bytes a parallel segment re-hashes before its start, so carries settle
+_TABLE = hashlib.shake_256(b"ppc-cdc-table").digest(256)
+_MULT = sum((int.from_bytes(hashlib.blake2b(b"ppc-cdc-%d" % j, digest_size=4).digest(), "little") | 1) << (8 * j)
+            for j in range(_WINDOW))
+
+
+def _hashes(buf: bytes) -> bytes:
+    """One hash byte per position of `buf`.
+
+    The bytes go through a substitution table and, read as one integer, are
+    multiplied by `_MULT`: byte p of the product is the low byte of
+    sum k_j * T[buf[p - j]] over the window plus the carry from below. Every
+    byte of work happens inside a single C multiplication (no per-byte
+    Python), and each hash byte depends on the few dozen bytes before it
+    alone (up to a rare long carry chain).
+    """
+    n = len(buf)
+    return (int.from_bytes(buf.translate(_TABLE), "little") * _MULT).to_bytes(n + _WINDOW + 4, "little")[:n]
+
+
+def _find_cut(h: bytes, lo: int, hi: int) -> int:
+    """End (exclusive) of the first chunk cut in [lo, hi) of hashes `h`, else -1.
+
+    A chunk may end after p when h[p] and h[p - 1] are zero and h[p - 2] < 32.
+    """
+    i = h.find(b"\0\0", lo - 1, hi)
+    while i >= 0:
+        if h[i - 1] < 32:
+            return i + 2
+        i = h.find(b"\0\0", i + 1, hi)
+    return -1
+
+
+def _scan(buf: bytes, pool: ProcessPoolExecutor | None, workers: int) -> bytes:
+    if pool is None or len(buf) < 2 * MAX_CHUNK:
+        return _hashes(buf)
+    step = -(-len(buf) // workers)
+    # each segment brings _LEAD bytes from before it, then drops their hashes
+    starts = range(0, len(buf), step)
+    parts = pool.map(_hashes, [buf[max(0, a - _LEAD):a + step] for a in starts])
+    return b"".join(h if a == 0 else h[_LEAD:] for a, h in zip(starts, parts))
+
+
+def split(blocks: Iterable[bytes], workers: int = 1) -> Iterator[bytes]:
+    """Content-defined chunks of the concatenated `blocks`; hashing runs on `workers` processes."""
+    it, buf, eof = iter(blocks), b"", False
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while True:
+            parts = [buf]
+            size = len(buf)
+            while not eof and size < SCAN_SIZE:
+                block = next(it, None)
+                if block is None:
+                    eof = True
+                else:
+                    parts.append(bytes(block))
+                    size += len(block)
+            buf = b"".join(parts)
+            hashes, pos = _scan(buf, pool, workers), 0
+            # without EOF, only cut where the whole [MIN_CHUNK, MAX_CHUNK) window is buffered
+            while len(buf) - pos > (0 if eof else MAX_CHUNK):
+                cut = _find_cut(hashes, pos + MIN_CHUNK, pos + MAX_CHUNK)
+                end = cut if cut >= 0 else min(pos + MAX_CHUNK, len(buf))
+                yield buf[pos:end]
+                pos = end
+            buf = buf[pos:]
+            if eof:
+                return
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def store_dir() -> str:
+    return os.environ.get("PPC_CHUNK_STORE") or os.path.join(cache_dir(), "store")
+
+
+class ChunkStore:
+    def __init__(self, root: str | None = None, create: bool = False, kdf: dict | None = None):
+        self.root = root or store_dir()
+        path = os.path.join(self.root, "store.json")
+        if not os.path.exists(path):
+            if not create:
+                raise ValueError(f"No chunk store at {self.root}")
+            os.makedirs(self.root, mode=0o700, exist_ok=True)
+            meta = {"id": os.urandom(8).hex(), "salt_b64": b64e(os.urandom(16)), "kdf": kdf}
+            with open_output(path) as f:
+                f.write(json.dumps(meta).encode())
+        with open(path) as f:
+            self.meta = json.load(f)
+        self.id = self.meta["id"]
+
+    def keys(self, passphrase: str | None = None, raw_key: bytes | None = None) -> "ChunkKeys":
+        """The chunk ID/key derivation for a secret (runs the store's KDF once for a passphrase)."""
+        salt = b64d(self.meta["salt_b64"])
+        if raw_key is not None:
+            master = hkdf_subkey(raw_key, salt)
+        elif passphrase is not None:
+            master = derive_key(passphrase, salt, self.meta["kdf"])
+        else:
+            raise ValueError("The chunk store needs a passphrase or raw key")
+        return ChunkKeys(master)
+
+    def _chunk_path(self, chunk_id: bytes) -> str:
+        h = chunk_id.hex()
+        return os.path.join(self.root, "chunks", h[:2], h)
+
+    def has(self, chunk_id: bytes) -> bool:
+        return os.path.exists(self._chunk_path(chunk_id))
+
+    def put(self, chunk_id: bytes, blob: bytes) -> None:
+        path = self._chunk_path(chunk_id)
+        with open_output(path) as f:  # threads storing the same chunk at once each get their own .part
+            f.write(blob)
+
+    def get(self, chunk_id: bytes) -> bytes:
+        try:
+            with open(self._chunk_path(chunk_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise ValueError(f"Chunk {chunk_id.hex()[:16]}… is missing from the store at {self.root}")
+
+    def write_refs(self, recipe_id: str, entries: list[tuple[int, bytes]]) -> None:
+        path = os.path.join(self.root, "refs", recipe_id)
+        with open_output(path) as f:
+            f.write(b"".join(_REF.pack(n, cid) for n, cid in entries))
+
+    def refs(self) -> dict[str, list[tuple[int, bytes]]]:
+        root = os.path.join(self.root, "refs")
+        out = {}
+        for name in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+            if not name.endswith(".part"):
+                with open(os.path.join(root, name), "rb") as f:
+                    out[name] = list(_REF.iter_unpack(f.read()))
+        return out
+
+    def chunks(self) -> dict[bytes, int]:
+        """{chunk id: stored size} of every chunk file."""
+        root = os.path.join(self.root, "chunks")
+        out = {}
+        for sub in os.scandir(root) if os.path.isdir(root) else []:
+            for e in os.scandir(sub.path):
+                if not e.name.endswith(".part"):
+                    out[bytes.fromhex(e.name)] = e.stat().st_size
+        return out
+
+    def stats(self) -> dict:
+        refs, chunks = self.refs(), self.chunks()
+        sizes = {cid: n for entries in refs.values() for n, cid in entries}
+        live = [cid for cid in chunks if cid in sizes]
+        return {
+            "store": self.root,
+            "id": self.id,
+            "containers": len(refs),
+            "chunks": len(chunks),
+            "stored_bytes": sum(chunks.values()),
+            "logical_bytes": sum(n for entries in refs.values() for n, _ in entries),
+            "unique_bytes": sum(sizes[cid] for cid in live),
+            "unreferenced_chunks": len(chunks) - len(live),
+            "unreferenced_bytes": sum(s for cid, s in chunks.items() if cid not in sizes),
+            "missing_chunks": sum(cid not in chunks for cid in sizes),
+        }
+
+    def gc(self, keep: set[str] | None = None, dry_run: bool = False) -> dict:
+        """Delete chunks no recipe references. With `keep`, first drop every recipe not in it."""
+        refs = self.refs()
+        dropped = [r for r in refs if keep is not None and r not in keep]
+        live = {cid for r, entries in refs.items() if r not in dropped for _, cid in entries}
+        dead = {cid: size for cid, size in self.chunks().items() if cid not in live}
+        if not dry_run:
+            for r in dropped:
+                os.remove(os.path.join(self.root, "refs", r))
+            for cid in dead:
+                os.remove(self._chunk_path(cid))
+        return {"recipes_dropped": len(dropped), "chunks_deleted": len(dead), "bytes_freed": sum(dead.values())}
+
+
+class ChunkKeys:
+    def __init__(self, master: bytes):
+        self._id_key = hkdf_subkey(master, b"ppc chunk id")
+        self._key_key = hkdf_subkey(master, b"ppc chunk key")
+
+    def ident(self, chunk: bytes) -> tuple[bytes, bytes]:
+        """(chunk id, chunk key) for a chunk's content."""
+        cid = hashlib.blake2b(chunk, key=self._id_key, digest_size=32).digest()
+        return cid, hashlib.blake2b(cid, key=self._key_key, digest_size=KEY_LEN).digest()
+
+
+def seal_chunk(chunk: bytes, cid: bytes, ckey: bytes, comp: dict, cipher: str) -> bytes:
+    nonce = os.urandom(NONCE_LEN)
+    body = make_aead(cipher, ckey).encrypt(nonce, get_codec(comp["name"]).compress(chunk, comp), cid)
+    return bytes((COMP_NAMES.index(comp["name"]), CIPHER_NAMES.index(cipher))) + nonce + body
+
+
+def open_chunk(blob: bytes, cid: bytes, ckey: bytes, raw_len: int) -> bytes:
+    if len(blob) < 2 + NONCE_LEN or blob[0] >= len(COMP_NAMES) or blob[1] >= len(CIPHER_NAMES):
+        raise ValueError(f"Chunk {cid.hex()[:16]}… is corrupt")
+    name = COMP_NAMES[blob[0]]
+    packed = make_aead(CIPHER_NAMES[blob[1]], ckey).decrypt(blob[2:2 + NONCE_LEN], blob[2 + NONCE_LEN:], cid)
+    data = get_codec(name).decompress(packed, {"name": name})
+    if len(data) != raw_len:
+        raise ValueError(f"Chunk {cid.hex()[:16]}… has the wrong size")
+    return data
+
+
+def dedupe_file(input_path: str, output_path: str, key: bytes, crypt_hdr: dict, comp: dict, store: ChunkStore,
+                chunk_keys: ChunkKeys, name: str | None = None, version: int = VERSION, threads: int = 1) -> dict:
+    """Write `input_path` into `store` as chunks and `output_path` as a recipe container; returns a summary dict.
+
+    Boundaries are hashed on `threads` processes; chunk IDs, compression and
+    sealing of new chunks run on `threads` threads.
+    """
+    if comp.get("dict_id") is not None or comp.get("window_log"):
+        raise ValueError("Dictionaries and long mode do not apply to deduplicated chunks")
+    start = time.perf_counter()
+    cipher = crypt_hdr["cipher"]["name"]
+    chunk_comp = {k: v for k, v in comp.items() if k in ("name", "level")}
+
+    def store_chunk(chunk: bytes) -> tuple[int, bytes, bytes, int]:
+        """Recipe entry for a chunk plus the bytes it added to the store."""
+        cid, ckey = chunk_keys.ident(chunk)
+        if store.has(cid):
+            return len(chunk), cid, ckey, 0
+        blob = seal_chunk(chunk, cid, ckey, chunk_comp, cipher)
+        store.put(cid, blob)
+        return len(chunk), cid, ckey, len(blob)
+
+    with open(input_path, "rb") as src:
+        stored = list(imap_ordered(store_chunk, ((c,) for c in split(iter_chunks(src), threads)), threads))
+    entries = [e[:3] for e in stored]
+    recipe_id = os.urandom(16).hex()
+    mime, mime_source = detect_mime(input_path)
+    header = Header(
+        mime=mime,
+        orig_name=name or os.path.basename(input_path),
+        created=now_iso(),
+        kdf=crypt_hdr["kdf"],
+        cipher=crypt_hdr["cipher"],
+        comp=dict(comp, store=store.id, recipe=recipe_id),
+        notes="PPC-2: Recipe of deduplicated chunks." if version == VERSION_FRAMED else None,
+        version=version,
+    )
+    stats = {}
+    with open_output(output_path) as dst:
+        written = pack_to(dst, header, [])
+        for record in encode_frames([b"".join(_ENTRY.pack(*e) for e in entries)], key, header.cipher,
+                                    header.comp, stats, header.aad()):
+            dst.write(record)
+            written += len(record)
+    store.write_refs(recipe_id, [(n, cid) for n, cid, _ in entries])
+    return {
+        "input": input_path,
+        "output": output_path,
+        "mime": mime,
+        "mime_source": mime_source,
+        "raw_bytes": sum(e[0] for e in entries),
+        "chunks": len(entries),
+        "new_chunks": sum(e[3] > 0 for e in stored),
+        "new_bytes": sum(e[3] for e in stored),
+        "container_bytes": written,
+        "seconds": time.perf_counter() - start,
+        "header": header,
+    }
+
+
+def read_chunks(recipe: bytes, store: ChunkStore, threads: int = 1) -> Iterator[bytes]:
+    """The original data of a recipe, chunk by chunk (opened on `threads` threads)."""
+    if len(recipe) % _ENTRY.size:
+        raise ValueError("Recipe is truncated")
+
+    def load(raw_len: int, cid: bytes, ckey: bytes) -> bytes:
+        return open_chunk(store.get(cid), cid, ckey, raw_len)
+
+    return imap_ordered(load, _ENTRY.iter_unpack(recipe), threads)
+
+
+def open_store(header: Header, root: str | None = None) -> ChunkStore:
+    store = ChunkStore(root)
+    if store.id != header.comp["store"]:
+        raise ValueError(f"{header.orig_name} needs chunk store {header.comp['store']}, "
+                         f"but {store.root} is store {store.id}")
+    return store
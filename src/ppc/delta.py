@@ -0,0 +1,89 @@
+"""Binary deltas against an earlier container (`ppc compress --base`).
+
+A delta container holds a new version of a file compressed by zstd with the
+base version's plaintext as a raw prefix (what `zstd --patch-from` does), so
+everything the versions share shrinks to references into the base. The
+header names the base in `comp["base"]`: a BLAKE2b hash of the base
+container file. It identifies the exact container, say the previous
+release's upload, without revealing anything about its plaintext.
+
+Readers decode the base container with the same secret, check its hash and
+register its plaintext (see dicts.add_base) before decoding any frame; a
+process opens each base once, however many deltas it reads against it.
+
+Every frame is compressed on its own against the whole base, so frames are
+at least as large as the base (fewer reloads of the prefix) and the long
+window covers base plus frame. Both sides hold the base in memory; bases
+above MAX_BASE would need a window beyond MAX_WINDOW_LOG and are refused.
+"""
+from __future__ import annotations
+import hashlib
+
+from .codecs import MAX_WINDOW_LOG, check_window_log
+from .dicts import add_base, base_size
+from .frames import FRAME_SIZE
+from .pipeline import decode_payload, decompress_file, open_payload
+from .utils import CHUNK_SIZE
+
+MAX_BASE = 1 << MAX_WINDOW_LOG - 1  # base plus a base-sized frame must fit the largest window
+
+
+def container_id(path: str) -> str:
+    h = hashlib.blake2b(digest_size=32, person=b"ppc-delta-base")
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_base(path: str, passphrase: str | None = None, raw_key: bytes | None = None, store: str | None = None,
+              expect: str | None = None) -> tuple[str, int]:
+    """Decode the base container at `path` and register its plaintext; returns (base ID, size).
+
+    With `expect` (a delta's `comp["base"]`) any other container is refused before decoding.
+    """
+    ident = container_id(path)
+    if expect is not None and ident != expect:
+        raise ValueError(f"{path} is not the base of this delta (expected container {expect[:16]})")
+    if base_size(ident) is not None:
+        return ident, base_size(ident)
+    with open_payload(path) as (header, payload):
+        if header.comp.get("base"):
+            raise ValueError(f"{path} is itself a delta; take deltas against a full container")
+        data = bytearray()
+        for chunk in decode_payload(header, payload, passphrase=passphrase, raw_key=raw_key, store=store):
+            data += chunk
+            if len(data) > MAX_BASE:
+                raise ValueError(f"Base {path} is larger than {MAX_BASE >> 20} MiB; use --dedupe instead")
+    if not data:
+        raise ValueError(f"Base {path} is empty")
+    add_base(ident, bytes(data))
+    return ident, len(data)
+
+
+def decompress_delta(container_path: str, output_path: str | None = None, base: str | None = None,
+                     key: bytes | None = None, passphrase: str | None = None, raw_key: bytes | None = None,
+                     threads: int = 1, store: str | None = None) -> dict:
+    """`pipeline.decompress_file` that first opens `base` if the container is a delta against it.
+
+    `passphrase`/`raw_key` open the base; `key` (if resolved) only the container.
+    """
+    if base is not None:
+        with open_payload(container_path) as (header, _):
+            expect = header.comp.get("base")
+        if expect:
+            load_base(base, passphrase, raw_key, store, expect)
+    return decompress_file(container_path, output_path, key, passphrase, raw_key, threads, store)
+
+
+def delta_params(comp: dict, base_id: str, base_len: int) -> dict:
+    """`comp` for a delta against a registered base of `base_len` bytes.
+
+    zstd workers are dropped: a frame is one job against the full prefix.
+    """
+    if comp["name"] != "zstd" or comp.get("dict_id") is not None:
+        raise ValueError("Deltas need the zstd codec without a dictionary")
+    frame = max(FRAME_SIZE, 1 << (base_len - 1).bit_length())
+    window_log = check_window_log(max(comp.get("window_log") or 0, (base_len + frame - 1).bit_length()))
+    comp = {k: v for k, v in comp.items() if k not in ("threads", "job_size", "overlap_log")}
+    return dict(comp, frame_size=max(frame, 1 << comp.get("window_log", 0)), window_log=window_log, base=base_id)
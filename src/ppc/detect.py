@@ -26,4 +26,14 @@ def detect_mime(path: str) -> tuple[str, str]:
                 e,
             )
     mime, _ = mimetypes.guess_type(path)
-    return (mime or "application/octet-stream"), "mimetypes"
\ No newline at end of file
+    return (mime or "application/octet-stream"), "mimetypes"
+
+
+def detect_mime_bytes(head: bytes) -> tuple[str, str]:
+    """Like `detect_mime`, for data without a path (e.g. the first chunk of stdin)."""
+    if _HAVE_MAGIC:
+        try:
+            return magic.from_buffer(head, mime=True), "python-magic"
+        except Exception as e:  # Broad exception to be robust against libmagic errors
+            logger.warning("python-magic failed to detect mime type from data: %s", e)
+    return "application/octet-stream", "default"
@@ -0,0 +1,93 @@
+"""Zstd dictionaries for small files.
+
+Containers compressed with a dictionary record its zstd dictionary ID in
+`Header.comp["dict_id"]`; readers find the dictionary in a local registry
+directory ($PPC_DICT_DIR, else <cache dir>/dicts) as `<dict_id>.zdict`. Each
+dictionary is loaded once per process.
+
+Delta containers (see delta.py) use their base's plaintext as a raw zstd
+prefix instead; the base is registered in memory under its ID by `add_base`.
+"""
+from __future__ import annotations
+import os
+from functools import lru_cache
+from pyzstd import ZstdDict, ZstdError, train_dict
+
+from .utils import cache_dir, open_output, read_bytes
+
+DICT_SIZE = 112640  # zstd CLI default (110 KiB)
+MAX_SAMPLE = 1 << 20  # larger samples teach the trainer little and cost memory
+
+_BASES: dict[str, tuple[ZstdDict, int]] = {}  # delta bases opened by this process: ID -> (prefix, size)
+
+
+def dict_dir() -> str:
+    return os.environ.get("PPC_DICT_DIR") or os.path.join(cache_dir(), "dicts")
+
+
+def train(samples: list[bytes], size: int = DICT_SIZE) -> ZstdDict:
+    if len(samples) < 8:
+        raise ValueError("Need at least 8 samples to train a dictionary")
+    try:
+        return train_dict([s[:MAX_SAMPLE] for s in samples], size)
+    except ZstdError as e:
+        raise ValueError(f"Dictionary training failed: {e}")
+
+
+def parse_dict(content: bytes) -> ZstdDict:
+    d = ZstdDict(content)
+    if not d.dict_id:
+        raise ValueError("Not a zstd dictionary (missing dictionary ID)")
+    return d
+
+
+def register(content: bytes) -> int:
+    """Copy a dictionary into the registry; returns its ID."""
+    d = parse_dict(content)
+    path = os.path.join(dict_dir(), f"{d.dict_id}.zdict")
+    if not os.path.exists(path):
+        with open_output(path) as f:
+            f.write(content)
+    elif read_bytes(path) != content:
+        raise ValueError(f"A different dictionary with ID {d.dict_id} is already registered")
+    return d.dict_id
+
+
+def registered() -> list[tuple[int, int]]:
+    """(dict_id, size) of every registered dictionary."""
+    try:
+        names = os.listdir(dict_dir())
+    except FileNotFoundError:
+        return []
+    return sorted((int(n[:-6]), os.path.getsize(os.path.join(dict_dir(), n)))
+                  for n in names if n.endswith(".zdict") and n[:-6].isdigit())
+
+
+@lru_cache(maxsize=None)
+def load_dict(dict_id: int) -> ZstdDict:
+    path = os.path.join(dict_dir(), f"{dict_id}.zdict")
+    if not os.path.exists(path):
+        raise ValueError(f"Dictionary {dict_id} is not registered in {dict_dir()} (see `ppc dict add`)")
+    d = parse_dict(read_bytes(path))
+    if d.dict_id != dict_id:
+        raise ValueError(f"Registry file {path} holds dictionary {d.dict_id}")
+    return d
+
+
+def add_base(base_id: str, content: bytes) -> None:
+    _BASES[base_id] = ZstdDict(content, is_raw=True), len(content)
+
+
+def base_size(base_id: str) -> int | None:
+    """Size of a registered delta base, None if it is not registered."""
+    return _BASES[base_id][1] if base_id in _BASES else None
+
+
+def comp_dict(comp: dict | None) -> ZstdDict | tuple[ZstdDict, int] | None:
+    """The dictionary (or delta base prefix) a `Header.comp` dict was compressed with, if any."""
+    if comp and comp.get("base"):
+        if comp["base"] not in _BASES:
+            raise ValueError(f"This is a delta against base container {comp['base'][:16]}; pass that "
+                             "container with --base")
+        return _BASES[comp["base"]][0].as_prefix
+    return load_dict(comp["dict_id"]) if comp and comp.get("dict_id") is not None else None
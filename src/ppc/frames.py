@@ -0,0 +1,327 @@
+"""Framed payload (container VERSIONs 2 and 3).
+
+The raw input is cut into `frame_size` blocks; each block is compressed on
+its own with the header's codec (see codecs.py) and sealed with the header's
+AEAD (AES-256-GCM or ChaCha20-Poly1305) under a STREAM nonce (prefix,
+counter, last-flag), so
+frames can be opened independently while truncation, reordering and
+splicing are still detected. Every frame carries the container header
+(`Header.aad`) as associated data, so the header cannot be edited either.
+On disk each frame is
+
+    <B flags> <I sealed_len> sealed bytes
+
+where bit 0 of `flags` marks the last frame. The flag is only a hint for
+readers: the nonce is what actually authenticates it.
+
+Archives (archive.py) then add one more record, flagged with bit 1, holding
+their zstd-compressed directory. It is sealed with counter = frame count and
+a trailer nonce flag that no frame nonce can carry, and streaming readers
+never reach it.
+
+Last comes a plaintext index used for random access:
+
+    <I count> count * (<I raw_len> <I sealed_len>) <I index_len> b"PPCI"
+
+Streaming readers stop at the last frame and never look at it. The index is
+not trusted either: every frame it points at is still opened under its own
+counter nonce and its decompressed size is checked against the entry.
+"""
+from __future__ import annotations
+import itertools, struct
+import os
+from typing import BinaryIO, Iterable, Iterator, NamedTuple
+from pyzstd import compress as zstd_compress, decompress as zstd_decompress, zstd_support_multithread
+
+from .codecs import DEFAULT_CODEC, check_window_log, codec_for, get_codec
+from .crypto import AEAD, make_aead, seal_frame, open_frame
+from .utils import b64d, imap_ordered
+
+FRAME_SIZE = 1 << 20  # raw bytes per frame
+MT_JOB_SIZE = 4 << 20  # zstd job size when compressing with worker threads
+MT_MIN_JOB_SIZE = 1 << 20  # smaller jobs cost more in per-job overhead than they gain in parallelism
+MAX_MT_FRAME = 64 << 20  # frame size cap with threads; more workers split a frame into smaller jobs
+DECODE_BUDGET = 256 << 20  # bytes of sealed + decoded frames (and zstd windows) in flight while decoding
+FLAG_LAST = 0x01
+FLAG_TRAILER = 0x02
+_REC = struct.Struct("<BI")
+_ENTRY = struct.Struct("<II")
+INDEX_MAGIC = b"PPCI"
+_TRAILER = struct.Struct("<I4s")
+
+
+class FrameEntry(NamedTuple):
+    raw_offset: int  # offset of the frame's first byte in the original file
+    raw_len: int
+    offset: int  # offset of the frame record relative to the payload start
+    sealed_len: int
+
+
+def _blocks(chunks: Iterable[bytes], size: int) -> Iterator[bytes]:
+    buf = bytearray()
+    for chunk in chunks:
+        buf += chunk
+        while len(buf) >= size:
+            yield bytes(buf[:size])
+            del buf[:size]
+    if buf:
+        yield bytes(buf)
+
+
+def _with_last(blocks: Iterator[bytes]) -> Iterator[tuple[bytes, bool]]:
+    """Yield (block, is_last); an empty input still produces one (empty) last block."""
+    prev = next(blocks, b"")
+    for block in blocks:
+        yield prev, False
+        prev = block
+    yield prev, True
+
+
+def comp_params(level: int | None = None, threads: int = 1, dict_id: int | None = None,
+                codec: str = DEFAULT_CODEC, window_log: int | None = None) -> dict:
+    """Build the `Header.comp` dict for a codec (see codecs.py) and level, plus
+    for zstd a worker-thread count, optional registered dictionary (see dicts.py)
+    and optional long-mode window.
+
+    With threads, each frame is sized to give every worker one job; otherwise
+    a frame would fit inside a single job and the workers would sit idle.
+    Frames stop growing at MAX_MT_FRAME (16 default-sized jobs); beyond that
+    the jobs shrink instead, so readers never face frames scaled by the
+    writer's thread count.
+
+    In long mode frames grow to the window size, since every frame is
+    compressed on its own and no match can reach past its start. Memory then
+    scales with 2**window_log: compressing holds about 2 frames per pipeline
+    stage plus the zstd window (~1 GiB at the default window log of 27), and
+    each decoding worker needs one frame plus the window; `decode_slots` keeps
+    that within DECODE_BUDGET by running fewer workers.
+    """
+    c = get_codec(codec)
+    comp = {"name": codec, "frame_size": FRAME_SIZE}
+    if codec == "none":
+        return comp
+    comp["level"] = c.default_level if level is None else c.check_level(level)
+    if codec != "zstd":
+        if dict_id is not None or window_log is not None:
+            raise ValueError("Dictionaries and long mode are only supported with zstd")
+        return comp
+    if dict_id is not None:
+        comp["dict_id"] = dict_id
+    if threads > 1 and zstd_support_multithread:
+        frame = min(MT_JOB_SIZE * threads, MAX_MT_FRAME)
+        comp.update(threads=threads, job_size=max(MT_MIN_JOB_SIZE, min(MT_JOB_SIZE, frame // threads)),
+                    overlap_log=9 if comp["level"] >= 19 else 6, frame_size=frame)
+    if window_log is not None:
+        comp["window_log"] = check_window_log(window_log)
+        comp["frame_size"] = max(comp["frame_size"], 1 << window_log)
+        if "threads" in comp:
+            comp["overlap_log"] = 9  # each job reloads a full window, so long matches cross job boundaries
+    return comp
+
+
+def relevel(comp: dict, level: int) -> dict:
+    """`comp` at another level, keeping its codec, threads, dictionary, window and frame size."""
+    new = comp_params(level, comp.get("threads", 1), comp.get("dict_id"), comp["name"], comp.get("window_log"))
+    return dict(comp, **{k: new[k] for k in ("level", "overlap_log") if k in new})
+
+
+class FrameEncoder:
+    """The stages of `encode_frames`, split so they can run on separate threads.
+
+    `blocks` → `compress` → `seal` → ... → `footer`. `compress` is stateless;
+    `seal` must see frames in order because it builds the index.
+    """
+
+    def __init__(self, key: bytes, cipher: dict, comp: dict, stats: dict | None = None, aad: bytes = b""):
+        self.comp, self.aad = comp, aad
+        self.codec = codec_for(comp)
+        self.aead = make_aead(cipher["name"], key)
+        self.prefix = b64d(cipher["nonce_prefix_b64"])
+        self.stats = {} if stats is None else stats
+        self.stats.update(frames=0, comp=0)
+        self.index = []
+
+    def blocks(self, chunks: Iterable[bytes]) -> Iterator[tuple[int, bool, bytes]]:
+        return self._numbered(_blocks(chunks, self.comp["frame_size"]))
+
+    def member_blocks(self, members: Iterable[Iterable[bytes]]) -> Iterator[tuple[int, bool, bytes]]:
+        """Like `blocks`, but each member's chunks start a new frame, so no frame spans two members."""
+        size = self.comp["frame_size"]
+        return self._numbered(itertools.chain.from_iterable(_blocks(m, size) for m in members))
+
+    @staticmethod
+    def _numbered(blocks: Iterator[bytes]) -> Iterator[tuple[int, bool, bytes]]:
+        for i, (block, last) in enumerate(_with_last(blocks)):
+            yield i, last, block
+
+    def compress(self, i: int, last: bool, block: bytes) -> tuple[int, bool, int, bytes]:
+        return i, last, len(block), self.codec.compress(block, self.comp)
+
+    def seal(self, i: int, last: bool, raw_len: int, packed: bytes) -> bytes:
+        if i != len(self.index):
+            raise ValueError("Frames must be sealed in order")
+        sealed = seal_frame(self.aead, self.prefix, i, last, packed, aad=self.aad)
+        self.stats["frames"] += 1
+        self.stats["comp"] += len(packed)
+        self.index.append(_ENTRY.pack(raw_len, len(sealed)))
+        return _REC.pack(FLAG_LAST if last else 0, len(sealed)) + sealed
+
+    def footer(self, trailer: bytes | None = None) -> bytes:
+        """Index (preceded by the sealed `trailer` block, if any) to write after the last frame.
+
+        The trailer is always zstd-compressed, whatever codec the frames use.
+        """
+        rec = b""
+        if trailer is not None:
+            sealed = seal_frame(self.aead, self.prefix, len(self.index), False, zstd_compress(trailer, 3),
+                                trailer=True, aad=self.aad)
+            rec = _REC.pack(FLAG_TRAILER, len(sealed)) + sealed
+        body = struct.pack("<I", len(self.index)) + b"".join(self.index)
+        return rec + body + _TRAILER.pack(len(body), INDEX_MAGIC)
+
+
+def encode_frames(chunks: Iterable[bytes], key: bytes, cipher: dict, comp: dict,
+                  stats: dict | None = None, aad: bytes = b"") -> Iterator[bytes]:
+    enc = FrameEncoder(key, cipher, comp, stats, aad)
+    for item in enc.blocks(chunks):
+        yield enc.seal(*enc.compress(*item))
+    yield enc.footer()
+
+
+def _iter_record_views(view: memoryview) -> Iterator[tuple[int, bool, memoryview]]:
+    i, off = 0, 0
+    while True:
+        if len(view) - off < _REC.size:
+            raise ValueError("Container is truncated (missing final frame)")
+        flags, n = _REC.unpack_from(view, off)
+        off += _REC.size
+        if len(view) - off < n:
+            raise ValueError("Container is truncated (short frame)")
+        last = bool(flags & FLAG_LAST)
+        yield i, last, view[off:off + n]
+        if last:
+            return
+        off += n
+        i += 1
+
+
+def iter_records(reader: BinaryIO | memoryview) -> Iterator[tuple[int, bool, bytes | memoryview]]:
+    """Yield (index, is_last, sealed) records, stopping after the last frame.
+
+    A memoryview payload (e.g. from an mmap) yields zero-copy slices.
+    """
+    if isinstance(reader, memoryview):
+        yield from _iter_record_views(reader)
+        return
+    i = 0
+    while True:
+        rec = reader.read(_REC.size)
+        if len(rec) < _REC.size:
+            raise ValueError("Container is truncated (missing final frame)")
+        flags, n = _REC.unpack(rec)
+        sealed = reader.read(n)
+        if len(sealed) < n:
+            raise ValueError("Container is truncated (short frame)")
+        last = bool(flags & FLAG_LAST)
+        yield i, last, sealed
+        if last:
+            return
+        i += 1
+
+
+def decode_frame(aead: AEAD, prefix: bytes, index: int, last: bool, sealed: bytes | memoryview,
+                 comp: dict | None = None, aad: bytes = b"") -> bytes:
+    return codec_for(comp).decompress(open_frame(aead, prefix, index, last, sealed, aad=aad), comp or {})
+
+
+def decode_slots(comp: dict | None, workers: int) -> tuple[int, int]:
+    """(workers, frames in flight) for decoding frames of `comp` within DECODE_BUDGET.
+
+    Each frame in flight holds its sealed and decoded bytes, plus a long-mode
+    window; frames too large for two to fit decode one at a time.
+    """
+    comp = comp or {}
+    per_frame = 2 * comp.get("frame_size", FRAME_SIZE)
+    if comp.get("window_log"):
+        per_frame += 1 << comp["window_log"]
+    window = max(1, min(2 * workers, DECODE_BUDGET // per_frame))
+    return min(workers, window), window
+
+
+def decode_frames(reader: BinaryIO | memoryview, key: bytes, cipher: dict, workers: int = 1,
+                  comp: dict | None = None, aad: bytes = b"") -> Iterator[bytes]:
+    """Yield decoded frames in order. With `workers` > 1 frames are decrypted and
+    decompressed on a thread pool (the AEADs and zstd all release the GIL), as
+    many as `decode_slots` allows for the frame size.
+    `comp` (the header's) picks the codec and zstd dictionary; `aad` is the header's `Header.aad()`."""
+    aead = make_aead(cipher["name"], key)
+    prefix = b64d(cipher["nonce_prefix_b64"])
+    codec_for(comp)  # fail on an unavailable codec before reading any frame
+    records = ((aead, prefix, i, last, sealed, comp, aad) for i, last, sealed in iter_records(reader))
+    return imap_ordered(decode_frame, records, *decode_slots(comp, workers))
+
+
+def read_index(f: BinaryIO, payload_start: int) -> list[FrameEntry]:
+    """Load the frame index from the end of a seekable container."""
+    end = f.seek(0, os.SEEK_END)
+    if end - payload_start < _TRAILER.size:
+        raise ValueError("Container has no frame index")
+    f.seek(end - _TRAILER.size)
+    body_len, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+    if magic != INDEX_MAGIC or body_len > end - payload_start - _TRAILER.size:
+        raise ValueError("Container has no frame index")
+    f.seek(end - _TRAILER.size - body_len)
+    body = f.read(body_len)
+    if len(body) < 4:
+        raise ValueError("truncated index")
+    count = struct.unpack_from("<I", body)[0]
+    if body_len != 4 + count * _ENTRY.size:
+        raise ValueError("Frame index is corrupt")
+    entries, raw_off, off = [], 0, 0
+    for raw_len, sealed_len in _ENTRY.iter_unpack(body[4:]):
+        entries.append(FrameEntry(raw_off, raw_len, off, sealed_len))
+        raw_off += raw_len
+        off += _REC.size + sealed_len
+    return entries
+
+
+def read_trailer(f: BinaryIO, key: bytes, cipher: dict, payload_start: int, index: list[FrameEntry],
+                 aad: bytes = b"") -> bytes | None:
+    """Open the block sealed after the last frame (see `FrameEncoder.footer`); None if there is none."""
+    end = index[-1].offset + _REC.size + index[-1].sealed_len if index else 0
+    f.seek(payload_start + end)
+    rec = f.read(_REC.size)
+    if len(rec) < _REC.size or not _REC.unpack(rec)[0] & FLAG_TRAILER:
+        return None
+    sealed = f.read(_REC.unpack(rec)[1])
+    aead = make_aead(cipher["name"], key)
+    return zstd_decompress(open_frame(aead, b64d(cipher["nonce_prefix_b64"]), len(index), False, sealed,
+                                      trailer=True, aad=aad))
+
+
+def read_range(f: BinaryIO, key: bytes, cipher: dict, offset: int, length: int | None = None,
+               index: list[FrameEntry] | None = None, comp: dict | None = None, aad: bytes = b"") -> bytes:
+    """Return `length` bytes of the original file starting at `offset`.
+
+    `f` must be seekable and positioned at the payload (as left by
+    `container.open_container`), or pass the already-loaded `index`. Only the
+    frames overlapping the range are read, decrypted and decompressed.
+    """
+    payload_start = f.tell()
+    if index is None:
+        index = read_index(f, payload_start)
+    size = index[-1].raw_offset + index[-1].raw_len if index else 0
+    stop = size if length is None else min(size, offset + length)
+    aead = make_aead(cipher["name"], key)
+    prefix = b64d(cipher["nonce_prefix_b64"])
+    out = bytearray()
+    for i, e in enumerate(index):
+        if e.raw_offset + e.raw_len <= offset or e.raw_offset >= stop:
+            continue
+        f.seek(payload_start + e.offset + _REC.size)
+        sealed = f.read(e.sealed_len)
+        raw = decode_frame(aead, prefix, i, i == len(index) - 1, sealed, comp, aad)
+        if len(raw) != e.raw_len:
+            raise ValueError("Frame index does not match frame contents")
+        out += raw[max(offset - e.raw_offset, 0):stop - e.raw_offset]
+    return bytes(out)
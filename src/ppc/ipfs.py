@@ -1,5 +1,6 @@
 from __future__ import annotations
 import os, requests
+from typing import BinaryIO
 
 try:
     import ipfshttpclient
@@ -12,7 +13,7 @@ PINATA_ENDPOINT = "https://api.pinata.cloud/pinning/pinFileToIPFS"
 
 
 
-def upload_web3(data: bytes, filename: str, token: str) -> str:
+def upload_web3(data: bytes | BinaryIO, filename: str, token: str) -> str:
     headers = {"Authorization": f"Bearer {token}"}
     files = {"file": (filename, data)}
     r = requests.post(WEB3_ENDPOINT, headers=headers, files=files, timeout=120)
@@ -25,7 +26,7 @@ def upload_web3(data: bytes, filename: str, token: str) -> str:
     return cid
 
 
-def upload_pinata(data: bytes, filename: str, jwt: str) -> str:
+def upload_pinata(data: bytes | BinaryIO, filename: str, jwt: str) -> str:
     headers = {"Authorization": f"Bearer {jwt}"}
     files = {"file": (filename, data)}
     r = requests.post(PINATA_ENDPOINT, headers=headers, files=files, timeout=120)
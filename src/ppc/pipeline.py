@@ -0,0 +1,234 @@
+from __future__ import annotations
+import itertools, os, time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict
+from typing import BinaryIO, Callable, Iterator
+from cryptography.exceptions import InvalidTag
+from pyzstd import ZstdDecompressor, ZstdError
+
+from .container import ARCHIVE_MIME, Header, pack_to, open_container, unpack, VERSION, VERSION_FRAMED, VERSION_SINGLE
+from .crypto import decrypt_stream, key_from_header
+from .detect import detect_mime, detect_mime_bytes
+from .dedupe import open_store, read_chunks
+from .frames import FrameEncoder, decode_frames
+from .policy import route, sample_buffer, sample_file
+from .stages import run_stages
+from .tune import SAMPLE_SIZE as TUNE_SAMPLE_SIZE, tune_level
+from .utils import CHUNK_SIZE, now_iso, iter_chunks, map_file, open_input, open_output
+
+SUFFIX = ".ppc"
+
+
+def _tally(chunks, counts: dict, key: str):
+    counts[key] = 0
+    for chunk in chunks:
+        counts[key] += len(chunk)
+        yield chunk
+
+
+def _zstd_decompress_stream(chunks):
+    d = ZstdDecompressor()
+    for chunk in chunks:
+        if d.eof:
+            if chunk:
+                raise ValueError("Unexpected data after the compressed stream")
+            continue
+        out = d.decompress(chunk, CHUNK_SIZE)
+        while out:
+            yield out
+            out = b"" if d.needs_input or d.eof else d.decompress(b"", CHUNK_SIZE)
+    if not d.eof:
+        raise ZstdError("Compressed stream is truncated")
+
+
+def _decode_single(reader, header: Header, passphrase: str):
+    """Streaming decode of a VERSION 1 (single AES-GCM message) payload."""
+    comp = decrypt_stream(iter_chunks(reader), passphrase, header.kdf["salt_b64"],
+                          header.cipher["nonce_b64"], header.cipher.get("tag_len", 16), header.kdf)
+    try:
+        yield from _zstd_decompress_stream(comp)
+    except ZstdError:
+        # A wrong key usually trips zstd before the tag is reached; drain the
+        # stream so that case surfaces as InvalidTag instead.
+        for _ in comp:
+            pass
+        raise
+
+
+def compress_file(input_path: str, output_path: str, key: bytes, crypt_hdr: dict, comp: dict,
+                  name: str | None = None, version: int = VERSION, policy: dict | None = None,
+                  targets: dict | None = None) -> dict:
+    """Stream one file into a framed container; returns a summary dict.
+
+    `version` picks the header encoding: VERSION_FRAMED (JSON) or
+    VERSION_COMPACT (binary, see compact.py); the payload is the same.
+    `policy` (see policy.py) may store incompressible input or change the
+    level; the outcome is returned under "policy". `targets` ({"mbps": ...,
+    "ratio": ...}) picks the level by sampling (see tune.py) unless the
+    policy stored the input; the choice is returned under "tune".
+
+    Either path may be "-" for stdin/stdout. Read, compress, encrypt and write
+    run as overlapped stages (see stages.py) whose busy/blocked times are
+    returned under "stages". Memory stays at a few frames per stage queue
+    whatever the input size.
+    """
+    start = time.perf_counter()
+    counts, stats = {}, {}
+    with open_input(input_path) as src, open_output(output_path) as dst:
+        chunks = iter_chunks(src)
+        if input_path == "-":
+            head = next(chunks, b"")
+            mime, mime_source = detect_mime_bytes(head)
+            chunks = itertools.chain([head], chunks)
+            sample = sample_buffer(head) if policy else b""
+            tune_sample = lambda: sample_buffer(head, TUNE_SAMPLE_SIZE)
+        else:
+            mime, mime_source = detect_mime(input_path)
+            sample = sample_file(input_path) if policy else b""
+            tune_sample = lambda: sample_file(input_path, TUNE_SAMPLE_SIZE)
+        comp, decision = route(policy, mime, sample, comp)
+        tuned = None
+        if targets and comp["name"] != "none":
+            comp, tuned = tune_level(comp, mime, tune_sample, targets.get("mbps"), targets.get("ratio"))
+        header = Header(
+            mime=mime,
+            orig_name=name or ("stdin" if input_path == "-" else os.path.basename(input_path)),
+            created=now_iso(),
+            kdf=crypt_hdr["kdf"],
+            cipher=crypt_hdr["cipher"],
+            comp=comp,
+            notes="PPC-2: Framed container with per-frame AEAD." if version == VERSION_FRAMED else None,
+            version=version,
+        )
+        enc = FrameEncoder(key, header.cipher, header.comp, stats, header.aad())
+        written = [pack_to(dst, header, [])]
+
+        def write(record: bytes) -> None:
+            dst.write(record)
+            written[0] += len(record)
+
+        stages = run_stages(enc.blocks(_tally(chunks, counts, "raw")), [
+            ("compress", lambda item: enc.compress(*item)),
+            ("encrypt", lambda item: enc.seal(*item)),
+            ("write", write),
+        ], depth=1 if comp.get("window_log") else 4)  # long-mode frames are window-sized (see comp_params)
+        write(enc.footer())
+    return {"input": input_path, "output": output_path, "mime": mime, "mime_source": mime_source,
+            "policy": decision, "tune": tuned, "raw_bytes": counts["raw"], "comp_bytes": stats["comp"],
+            "frames": stats["frames"], "container_bytes": written[0], "seconds": time.perf_counter() - start,
+            "stages": [asdict(st) for st in stages], "header": header}
+
+
+@contextmanager
+def open_payload(container_path: str):
+    """Yield (header, payload) for a container path.
+
+    Regular files are memory-mapped and the payload is a zero-copy memoryview
+    that frames are decrypted and decompressed from directly; "-" and other
+    unmappable inputs fall back to a streaming reader.
+    """
+    if container_path != "-" and os.path.isfile(container_path):
+        with map_file(container_path) as view:
+            yield unpack(view)
+        return
+    with open_input(container_path) as src:
+        yield open_container(src)
+
+
+def decode_payload(header: Header, reader: BinaryIO | memoryview, key: bytes | None = None, passphrase: str | None = None,
+                   raw_key: bytes | None = None, threads: int = 1, store: str | None = None) -> Iterator[bytes]:
+    """Raw chunks of an opened container. `key` skips key derivation (e.g. resolved by the caller).
+
+    Deduplicated containers (see dedupe.py) are read through their chunk
+    store: `store`, else the default store location.
+    """
+    if header.mime == ARCHIVE_MIME:
+        raise ValueError(f"{header.orig_name} is a multi-file archive; use `ppc unarchive`")
+    if header.version == VERSION_SINGLE:
+        return _decode_single(reader, header, passphrase)
+    key = key or key_from_header(header.kdf, passphrase, raw_key)
+    frames = decode_frames(reader, key, header.cipher, threads, header.comp, header.aad())
+    if header.comp.get("store"):
+        return read_chunks(b"".join(frames), open_store(header, store), threads)
+    return frames
+
+
+def decompress_file(container: str | tuple[Header, BinaryIO | memoryview], output_path: str | None = None,
+                    key: bytes | None = None, passphrase: str | None = None, raw_key: bytes | None = None,
+                    threads: int = 1, store: str | None = None) -> dict:
+    """Restore one container; returns a summary dict.
+
+    `container` is a path ("-" for stdin) or an already opened (header,
+    payload) pair, from `open_payload` or `open_container` on any binary
+    stream, so callers can look at the header before picking a secret.
+    `output_path` may be "-" for stdout.
+    """
+    start = time.perf_counter()
+    if isinstance(container, str):
+        with open_payload(container) as opened:
+            info = decompress_file(opened, output_path, key, passphrase, raw_key, threads, store)
+        container_bytes = None if container == "-" else os.path.getsize(container)
+        return dict(info, input=container, container_bytes=container_bytes, seconds=time.perf_counter() - start)
+    header, reader = container
+    counts = {}
+    out = output_path or header.orig_name
+    raw = decode_payload(header, reader, key, passphrase, raw_key, threads, store)
+    # Plaintext may be released before the stream is fully authenticated;
+    # open_output discards the partial file if anything fails later on.
+    with open_output(out) as dst:
+        for chunk in _tally(raw, counts, "raw"):
+            dst.write(chunk)
+    return {"input": None, "output": out, "mime": header.mime, "raw_bytes": counts["raw"],
+            "container_bytes": None, "seconds": time.perf_counter() - start, "header": header}
+
+
+def walk_files(root: str, recursive: bool = True, suffix: str | None = None) -> list[str]:
+    """Regular files under `root` (sorted, relative to it), optionally filtered by suffix."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for fn in sorted(filenames):
+            if suffix is None or fn.endswith(suffix):
+                found.append(os.path.relpath(os.path.join(dirpath, fn), root))
+        if not recursive:
+            break
+    return found
+
+
+def _job_error(job: dict, error: str) -> dict:
+    return {"input": job.get("input_path") or job.get("container_path"), "error": error}
+
+
+def _run_job(fn: Callable[..., dict], kwargs: dict) -> dict:
+    try:
+        result = fn(**kwargs)
+        result.pop("header", None)  # keep results small and cheap to pickle
+        return result
+    except InvalidTag:
+        error = "Decryption failed. Invalid passphrase or corrupted data."
+    except (OSError, ValueError, ZstdError) as e:
+        error = str(e) or type(e).__name__
+    except Exception as e:  # a bug or an unexpected library error still only fails this file
+        error = f"{type(e).__name__}: {e}"
+    return _job_error(kwargs, error)
+
+
+def run_pool(fn: Callable[..., dict], jobs: list[dict], workers: int) -> Iterator[dict]:
+    """Run `fn(**job)` for every job on a process pool, yielding summaries as they finish.
+
+    Per-file failures are reported as {"input", "error"} rather than raised, so
+    one bad file does not abort a batch.
+    """
+    if workers <= 1:
+        for job in jobs:
+            yield _run_job(fn, job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_run_job, fn, job): job for job in jobs}
+        for fut in as_completed(futures):
+            try:
+                result = fut.result()
+            except Exception as e:  # the worker died or the result did not pickle
+                result = _job_error(futures[fut], f"{type(e).__name__}: {e}")
+            yield result
@@ -0,0 +1,116 @@
+"""Codec policy: skip recompressing data that will not shrink.
+
+A policy maps MIME patterns (fnmatch, first match wins) to an action:
+
+- "none": store the frames uncompressed (`comp: {"name": "none"}`)
+- "fast": the codec's fast level (zstd 1)
+- "default": the codec and level asked for on the command line
+- an int: that level (clamped to the codec's range)
+
+Anything not stored outright is sampled (a few KB from the start, middle and
+end) and stored if the byte entropy is above `entropy_threshold` bits/byte,
+which catches compressed or encrypted data behind a generic MIME type.
+
+A policy file is JSON, e.g. `{"rules": {"image/*": "none"}, "entropy_threshold": 7.8}`;
+its rules are tried before the built-in ones.
+"""
+from __future__ import annotations
+import json, math, os
+from collections import Counter
+from fnmatch import fnmatchcase
+
+from .codecs import get_codec
+from .frames import FRAME_SIZE, relevel
+
+SAMPLE_SIZE = 4096  # bytes per sample window
+ENTROPY_THRESHOLD = 7.9  # bits/byte; uniform random data sits just under 8
+
+_STORED = ("image/jpeg", "image/png", "image/gif", "image/webp", "image/heic", "image/avif", "video/*",
+           "audio/mpeg", "audio/ogg", "audio/flac", "audio/aac", "audio/mp4", "application/zip", "application/gzip",
+           "application/zstd", "application/x-xz", "application/x-bzip2", "application/x-7z-compressed",
+           "application/vnd.rar", "application/x-rar-compressed", "application/java-archive",
+           "application/vnd.android.package-archive")
+DEFAULT_RULES = {**dict.fromkeys(_STORED, "none"),
+                 "application/pdf": "fast", "application/vnd.openxmlformats-officedocument.*": "fast"}
+DEFAULT_POLICY = {"rules": DEFAULT_RULES, "entropy_threshold": ENTROPY_THRESHOLD}
+
+
+def _check_action(pattern: str, action) -> None:
+    if action not in ("none", "fast", "default") and not (type(action) is int and 1 <= action <= 22):
+        raise ValueError(f"Bad policy action for {pattern!r}: {action!r} (none, fast, default or a level 1-22)")
+
+
+def load_policy(spec: str | None) -> dict | None:
+    """"auto" (or None) is the built-in policy, "off" disables routing, anything else is a JSON file."""
+    if spec in (None, "auto"):
+        return DEFAULT_POLICY
+    if spec == "off":
+        return None
+    try:
+        with open(spec, "r", encoding="utf-8") as f:
+            user = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"Cannot read codec policy {spec}: {e}")
+    if not isinstance(user, dict) or not isinstance(user.get("rules", {}), dict):
+        raise ValueError(f"Codec policy {spec} must be an object with a 'rules' object")
+    rules = dict(user.get("rules", {}))
+    for pattern, action in rules.items():
+        _check_action(pattern, action)
+    for pattern, action in DEFAULT_RULES.items():
+        rules.setdefault(pattern, action)
+    return {"rules": rules, "entropy_threshold": float(user.get("entropy_threshold", ENTROPY_THRESHOLD))}
+
+
+def sample_file(path: str, size: int = SAMPLE_SIZE) -> bytes:
+    """Up to three `size` windows: start, middle and end of the file."""
+    total = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if total <= 3 * size:
+            return f.read()
+        out = b""
+        for pos in (0, total // 2 - size // 2, total - size):
+            f.seek(pos)
+            out += f.read(size)
+        return out
+
+
+def sample_buffer(buf: bytes, size: int = SAMPLE_SIZE) -> bytes:
+    if len(buf) <= 3 * size:
+        return bytes(buf)
+    mid = len(buf) // 2 - size // 2
+    return bytes(buf[:size]) + bytes(buf[mid:mid + size]) + bytes(buf[-size:])
+
+
+def entropy(data: bytes) -> float:
+    """Shannon entropy of the byte histogram, in bits per byte."""
+    if not data:
+        return 0.0
+    n = len(data)
+    return -sum(c / n * math.log2(c / n) for c in Counter(data).values())
+
+
+def route(policy: dict | None, mime: str, sample: bytes, comp: dict) -> tuple[dict, str]:
+    """Apply `policy` to the requested `comp`; returns the comp to use and a one-line reason."""
+    if policy is None:
+        return comp, "policy off"
+    if comp["name"] == "none":
+        return comp, "stored (requested)"
+    action, why = "default", mime
+    for pattern, act in policy["rules"].items():
+        if fnmatchcase(mime, pattern):
+            action, why = act, f"{mime} matches {pattern}"
+            break
+    if action != "none" and len(sample) >= 256:
+        bits = entropy(sample)
+        if bits >= policy["entropy_threshold"]:
+            action, why = "none", f"sample entropy {bits:.2f} bits/byte"
+        else:
+            why += f", sample entropy {bits:.2f} bits/byte"
+    if action == "none":
+        return {"name": "none", "frame_size": FRAME_SIZE}, f"stored ({why})"
+    if action == "default":
+        return comp, f"level {comp['level']} ({why})"
+    codec = get_codec(comp["name"])
+    lo, hi = codec.levels
+    level = codec.fast_level if action == "fast" else min(max(action, lo), hi)
+    return relevel(comp, level), f"level {level} ({why})"
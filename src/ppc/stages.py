@@ -0,0 +1,114 @@
+"""Overlapped stage runner: each stage on its own thread, bounded queues between.
+
+With read → compress → encrypt → write running concurrently, wall time tends
+towards the slowest stage instead of the sum of all of them. Every stage
+records how long it was busy versus blocked on its neighbours, which shows
+which stage is the bottleneck (busy ~ wall) and which are starved or
+back-pressured (mostly blocked).
+"""
+from __future__ import annotations
+import queue, threading
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any, Callable, Iterable
+
+_DONE = object()
+_POLL = 0.1  # seconds; how often blocked stages re-check for a failure elsewhere
+
+
+@dataclass
+class StageStats:
+    name: str
+    items: int = 0
+    busy: float = 0.0  # seconds spent doing the stage's own work
+    blocked: float = 0.0  # seconds spent waiting for input or for room downstream
+
+
+def run_stages(source: Iterable[Any], stages: list[tuple[str, Callable[[Any], Any]]],
+               source_name: str = "read", depth: int = 4) -> list[StageStats]:
+    """Pull items from `source` and push them through `stages` in order.
+
+    Each stage is `(name, fn)`; `fn(item)` returns the item for the next stage
+    (the last stage's return value is discarded, so it is normally the sink).
+    At most `depth` items wait between two stages. The first exception raised
+    by any stage stops the others and is re-raised here.
+    """
+    stats = [StageStats(source_name)] + [StageStats(name) for name, _ in stages]
+    queues = [queue.Queue(maxsize=depth) for _ in stages]
+    failed = threading.Event()
+    errors: list[BaseException] = []
+
+    def put(q: queue.Queue, item: Any, st: StageStats) -> None:
+        t = perf_counter()
+        while not failed.is_set():
+            try:
+                q.put(item, timeout=_POLL)
+                break
+            except queue.Full:
+                pass
+        st.blocked += perf_counter() - t
+
+    def get(q: queue.Queue, st: StageStats) -> Any:
+        t = perf_counter()
+        try:
+            while not failed.is_set():
+                try:
+                    return q.get(timeout=_POLL)
+                except queue.Empty:
+                    pass
+            return _DONE
+        finally:
+            st.blocked += perf_counter() - t
+
+    def produce() -> None:
+        st, it = stats[0], iter(source)
+        try:
+            while not failed.is_set():
+                t = perf_counter()
+                item = next(it, _DONE)
+                st.busy += perf_counter() - t
+                if item is _DONE:
+                    break
+                st.items += 1
+                put(queues[0], item, st)
+        except BaseException as e:
+            errors.append(e)
+            failed.set()
+            return
+        put(queues[0], _DONE, st)
+
+    def work(k: int, fn: Callable[[Any], Any]) -> None:
+        st, inq = stats[k + 1], queues[k]
+        outq = queues[k + 1] if k + 1 < len(queues) else None
+        try:
+            while True:
+                item = get(inq, st)
+                if item is _DONE:
+                    break
+                t = perf_counter()
+                out = fn(item)
+                st.busy += perf_counter() - t
+                st.items += 1
+                if outq is not None:
+                    put(outq, out, st)
+        except BaseException as e:
+            errors.append(e)
+            failed.set()
+            return
+        if outq is not None:
+            put(outq, _DONE, st)
+
+    threads = [threading.Thread(target=produce, name=f"ppc-{source_name}", daemon=True)]
+    threads += [threading.Thread(target=work, args=(k, fn), name=f"ppc-{name}", daemon=True)
+                for k, (name, fn) in enumerate(stages)]
+    for th in threads:
+        th.start()
+    try:
+        for th in threads:
+            th.join()
+    except BaseException:
+        failed.set()
+        raise
+    if errors:
+        raise errors[0]
+    return stats
@@ -0,0 +1,104 @@
+"""`--level auto`: pick a codec level from a throughput or size target.
+
+Sample windows of the input (start, middle, end) are compressed at each
+candidate level, using the same codec call as the frame encoder. The
+measurements are cached per host, codec and MIME type in <cache dir>/levels.json,
+so later files of the same type skip the sampling.
+
+- `target_mbps`: the highest level whose single-thread speed, times the zstd
+  worker count, still meets the target.
+- `target_ratio`: the lowest (fastest) level that reaches the ratio, else the
+  strongest level.
+- both: the lowest level meeting the ratio among those meeting the speed.
+"""
+from __future__ import annotations
+import json, os, platform, time
+from typing import Callable
+
+from .codecs import get_codec
+from .frames import relevel
+from .utils import cache_dir, open_output
+
+CANDIDATES = {"zstd": (1, 2, 3, 5, 7, 9, 12, 15, 19), "lz4": (0, 3, 6, 9, 12, 16),
+              "brotli": (0, 2, 4, 6, 9, 11), "xz": (0, 1, 3, 6, 9)}
+SAMPLE_SIZE = 64 << 10  # bytes per sample window
+MIN_TIME = 0.02  # seconds of work per level, so tiny samples still time reliably
+
+
+def _cache_path() -> str:
+    return os.path.join(cache_dir(), "levels.json")
+
+
+def _host() -> str:
+    return f"{platform.node()}/{platform.machine()}"
+
+
+def _load_cache() -> dict:
+    try:
+        with open(_cache_path()) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cached.get("entries", {}) if cached.get("host") == _host() else {}
+
+
+def _save_cache(entries: dict) -> None:
+    path = _cache_path()
+    try:
+        with open_output(path) as f:
+            f.write(json.dumps({"host": _host(), "entries": entries}).encode())
+    except OSError:
+        pass  # a read-only cache only costs us another measurement next time
+
+
+def measure(comp: dict, sample: bytes) -> dict[int, tuple[float, float]]:
+    """{level: (MB/s, ratio)} for every candidate level of the codec in `comp`."""
+    codec = get_codec(comp["name"])
+    base = dict(comp, threads=1) if "threads" in comp else comp
+    out = {}
+    for level in CANDIDATES[comp["name"]]:
+        c = dict(base, level=level)
+        runs, start = 0, time.perf_counter()
+        while True:
+            packed = codec.compress(sample, c)
+            runs += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_TIME:
+                break
+        out[level] = (len(sample) * runs / elapsed / 1e6, len(sample) / max(len(packed), 1))
+    return out
+
+
+def pick(measured: dict[int, tuple[float, float]], threads: int = 1, target_mbps: float | None = None,
+         target_ratio: float | None = None) -> int:
+    levels = sorted(measured)
+    fast = [lvl for lvl in levels if target_mbps is None or measured[lvl][0] * threads >= target_mbps] or levels[:1]
+    if target_ratio is not None:
+        return next((lvl for lvl in fast if measured[lvl][1] >= target_ratio), fast[-1])
+    return fast[-1]
+
+
+def tune_level(comp: dict, mime: str, sample: Callable[[], bytes], target_mbps: float | None = None,
+               target_ratio: float | None = None) -> tuple[dict, str]:
+    """`comp` at the level picked for the targets, plus a one-line reason.
+
+    `sample` is only called (to read the input's sample windows) on a cache miss.
+    """
+    if comp["name"] not in CANDIDATES:
+        return comp, f"no levels to tune for {comp['name']}"
+    key = f"{comp['name']}|{comp.get('dict_id', '')}|{mime}"
+    entries = _load_cache()
+    measured = {int(k): tuple(v) for k, v in entries.get(key, {}).items()}
+    source = "cached"
+    if not measured:
+        data = sample()
+        if data:
+            measured = measure(comp, data)
+            entries[key] = measured
+            _save_cache(entries)
+            source = f"{len(data)} sampled bytes"
+    if not measured:
+        return comp, "nothing to sample"
+    level = pick(measured, comp.get("threads", 1), target_mbps, target_ratio)
+    mbps, ratio = measured[level]
+    return relevel(comp, level), f"level {level}: ~{mbps:.0f} MB/s per thread, ratio {ratio:.2f} ({mime}, {source})"
@@ -1,8 +1,15 @@
 from __future__ import annotations
-import base64, json, os, time
+import base64, json, mmap, os, sys, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from typing import BinaryIO, Callable, Iterable, Iterator, TypeVar
+
+R = TypeVar("R")
 
 ISO = "%Y-%m-%dT%H:%M:%SZ"
+CHUNK_SIZE = 1 << 20  # 1 MiB streaming granularity
 
 
 def now_iso() -> str:
@@ -17,12 +24,119 @@ def b64d(s: str) -> bytes:
     return base64.b64decode(s.encode("ascii"))
 
 
+def cache_dir() -> str:
+    """Per-user cache directory ($PPC_CACHE_DIR, else $XDG_CACHE_HOME/ppc or ~/.cache/ppc)."""
+    if os.getenv("PPC_CACHE_DIR"):
+        return os.environ["PPC_CACHE_DIR"]
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "ppc")
+
+
 def read_bytes(path: str) -> bytes:
     with open(path, "rb") as f:
         return f.read()
 
 
-def write_bytes(path: str, data: bytes) -> None:
+def iter_chunks(f: BinaryIO | memoryview, size: int = CHUNK_SIZE) -> Iterator[bytes | memoryview]:
+    """Fixed-size chunks of a file, or zero-copy slices of a memoryview."""
+    if isinstance(f, memoryview):
+        for i in range(0, len(f), size):
+            yield f[i:i + size]
+        return
+    while True:
+        chunk = f.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+@contextmanager
+def map_file(path: str) -> Iterator[memoryview]:
+    """Read-only memoryview of a whole file via mmap (no copy into process memory).
+
+    Slices must not outlive the block; if some still do, closing the map is
+    left to the garbage collector instead of raising BufferError.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield memoryview(b"")
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        try:
+            yield view
+        finally:
+            view.release()
+            try:
+                mm.close()
+            except BufferError:
+                pass
+
+
+@contextmanager
+def open_input(path: str) -> Iterator[BinaryIO]:
+    """Open `path` for reading; "-" means stdin (left open afterwards)."""
+    if path == "-":
+        yield sys.stdin.buffer
+        return
+    with open(path, "rb") as f:
+        yield f
+
+
+@contextmanager
+def output_path(path: str) -> Iterator[str]:
+    """A temporary sibling of `path` to create; it only replaces `path` on success.
+
+    Each call gets its own `<path>.<random>.part` name, so concurrent writers
+    of the same path never clobber each other's partial file.
+    """
     os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    with open(path, "wb") as f:
-        f.write(data)
\ No newline at end of file
+    tmp = f"{path}.{os.urandom(4).hex()}.part"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+@contextmanager
+def open_output(path: str) -> Iterator[BinaryIO]:
+    """Write to `path` via a temporary sibling (see `output_path`).
+
+    "-" writes straight to stdout; there is nothing to roll back there, so a
+    failing stream simply ends early and the caller must report the error.
+    """
+    if path == "-":
+        yield sys.stdout.buffer
+        sys.stdout.buffer.flush()
+        return
+    with output_path(path) as tmp, open(tmp, "wb") as f:
+        yield f
+
+
+def imap_ordered(fn: Callable[..., R], items: Iterable[tuple], workers: int,
+                 window: int | None = None) -> Iterator[R]:
+    """`fn(*item)` over a thread pool, yielding results in input order.
+
+    At most `window` (default 2 * workers) items are in flight, so memory stays
+    bounded however long `items` is. Only useful when `fn` releases the GIL.
+    """
+    if workers <= 1:
+        for item in items:
+            yield fn(*item)
+        return
+    window = window or 2 * workers
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            for item in items:
+                pending.append(pool.submit(fn, *item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for fut in pending:
+                fut.cancel()
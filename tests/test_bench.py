@@ -0,0 +1,36 @@
+from src.ppc import bench, pipeline
+from src.ppc.crypto import kdf_params
+from src.ppc.policy import DEFAULT_POLICY
+
+
+def test_bench_sweeps_and_marks_pareto(tmp_path):
+    src = tmp_path / "corpus.txt"
+    src.write_text("the quick brown fox jumps over the lazy dog\n" * 2000)
+    cfgs = bench.configs(["zstd", "none"], [1, 19, 30], [1, 2], ["aes-256-gcm"])
+    assert [(c["codec"], c["level"], c["threads"]) for c in cfgs] == \
+        [("zstd", 1, 1), ("zstd", 1, 2), ("zstd", 19, 1), ("zstd", 19, 2), ("none", None, 1)]
+
+    report = bench.bench([str(src)], cfgs[:1] + cfgs[-1:], kdf_params("scrypt", n=1024))
+    zstd, stored = report["results"]
+    assert zstd["ratio"] > 10 > stored["ratio"] and zstd["pareto"]
+    assert report["kdf"]["ms"] > 0 and report["raw_bytes"] == src.stat().st_size
+
+
+def test_bench_uses_cli_defaults(tmp_path, monkeypatch):
+    src = tmp_path / "corpus.txt"
+    src.write_text("bench " * 1000)
+    seen = {}
+
+    def spy_compress(*args, policy=None, **kw):
+        seen["policy"] = policy
+        return pipeline.compress_file(*args, policy=policy, **kw)
+
+    def spy_decompress(*args, threads=1, **kw):
+        seen["threads"] = threads
+        return pipeline.decompress_file(*args, threads=threads, **kw)
+
+    monkeypatch.setattr(bench, "compress_file", spy_compress)
+    monkeypatch.setattr(bench, "decompress_file", spy_decompress)
+    monkeypatch.setattr(bench.os, "cpu_count", lambda: 3)
+    bench.bench([str(src)], bench.configs(["zstd"], [3], [1], ["aes-256-gcm"]), kdf_params("scrypt", n=1024))
+    assert seen == {"policy": DEFAULT_POLICY, "threads": 3}
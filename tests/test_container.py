@@ -0,0 +1,212 @@
+import io, json, struct
+import pytest
+from cryptography.exceptions import InvalidTag
+from pyzstd import ZstdError, compress as zstd_compress
+from click.testing import CliRunner
+
+from src.ppc import compact
+from src.ppc.archive import list_members, pack_archive
+from src.ppc.cli import decompress
+from src.ppc.codecs import CODECS
+from src.ppc.container import Header, pack, pack_to, open_container, VERSION_COMPACT, VERSION_SINGLE, unpack
+from src.ppc.crypto import encrypt, new_stream_key
+from src.ppc.frames import comp_params, encode_frames, decode_frames, iter_records, _REC, read_index, read_range
+from src.ppc.pipeline import compress_file, decompress_file
+from src.ppc.utils import map_file
+
+
+def _framed(data, frame_size=64):
+    key, hdr = new_stream_key("pass")
+    comp = dict(comp_params(3), frame_size=frame_size)
+    payload = b"".join(encode_frames([data], key, hdr["cipher"], comp))
+    return key, hdr["cipher"], payload
+
+
+def test_version1_container_still_decompresses(tmp_path):
+    ciphertext, crypt_hdr = encrypt(zstd_compress(b"legacy payload", level_or_option=7), "pass")
+    header = Header(mime="text/plain", orig_name="legacy.txt", created="now", kdf=crypt_hdr["kdf"],
+                    cipher=crypt_hdr["cipher"], comp={"name": "zstd", "level": 7}, version=VERSION_SINGLE)
+    src = tmp_path / "legacy.ppc"
+    src.write_bytes(pack(header, ciphertext))
+    assert src.read_bytes()[4] == 1
+
+    out = tmp_path / "legacy.txt"
+    r = CliRunner().invoke(decompress, [str(src), "-p", "pass", "-o", str(out)])
+    assert r.exit_code == 0, r.output
+    assert out.read_bytes() == b"legacy payload"
+
+
+def test_frames_roundtrip_and_version_byte():
+    data = bytes(range(256)) * 10
+    key, cipher, payload = _framed(data)
+    assert b"".join(decode_frames(io.BytesIO(payload), key, cipher)) == data
+
+    header = Header(mime="x", orig_name="x", created="now", kdf={}, cipher=cipher, comp={})
+    buf = io.BytesIO()
+    pack_to(buf, header, [payload])
+    buf.seek(0)
+    h2, _ = open_container(buf)
+    assert h2.version == 2
+
+
+def test_frames_detect_truncation():
+    key, cipher, payload = _framed(b"x" * 1000)
+    records = list(iter_records(io.BytesIO(payload)))
+    truncated = b"".join(_REC.pack(0, len(s)) + s for _, _, s in records[:-1])
+    with pytest.raises(ValueError):
+        b"".join(decode_frames(io.BytesIO(truncated), key, cipher))
+
+    # Re-flagging an earlier frame as last must not authenticate either.
+    _, _, first = records[0]
+    with pytest.raises(InvalidTag):
+        b"".join(decode_frames(io.BytesIO(_REC.pack(1, len(first)) + first), key, cipher))
+
+
+def test_frames_detect_reordering():
+    key, cipher, payload = _framed(bytes(range(200)))
+    records = list(iter_records(io.BytesIO(payload)))
+    records[0], records[1] = records[1], records[0]
+    swapped = b"".join(_REC.pack(int(last), len(s)) + s for _, last, s in records)
+    with pytest.raises(InvalidTag):
+        b"".join(decode_frames(io.BytesIO(swapped), key, cipher))
+
+
+def test_read_range_touches_only_covering_frames():
+    data = bytes(range(256)) * 40
+    key, cipher, payload = _framed(data, frame_size=1000)
+    f = io.BytesIO(payload)
+    index = read_index(f, 0)
+    assert [e.raw_len for e in index] == [1000] * 10 + [240]
+    assert sum(e.raw_len for e in index) == len(data)
+
+    for off, n in [(0, 10), (995, 10), (5000, 3000), (10200, 1000), (len(data), 5)]:
+        f.seek(0)
+        assert read_range(f, key, cipher, off, n) == data[off:off + n]
+
+    # Corrupting a frame outside the requested range does not matter.
+    damaged = bytearray(payload)
+    damaged[index[0].offset + 10] ^= 0xFF
+    f = io.BytesIO(bytes(damaged))
+    assert read_range(f, key, cipher, 5000, 100) == data[5000:5100]
+    f.seek(0)
+    with pytest.raises(InvalidTag):
+        read_range(f, key, cipher, 0, 100)
+
+
+@pytest.mark.parametrize("body_len", [0, 3])
+def test_short_index_body_is_truncated(body_len):
+    blob = b"x" * 16 + b"\x01" * body_len + struct.pack("<I4s", body_len, b"PPCI")
+    with pytest.raises(ValueError, match="truncated index"):
+        read_index(io.BytesIO(blob), 0)
+
+
+def test_parallel_decode_matches_serial():
+    data = bytes(range(256)) * 400
+    key, cipher, payload = _framed(data, frame_size=1000)
+    assert b"".join(decode_frames(io.BytesIO(payload), key, cipher, workers=4)) == data
+
+    damaged = bytearray(payload)
+    damaged[len(payload) // 2] ^= 0xFF
+    with pytest.raises(InvalidTag):
+        b"".join(decode_frames(io.BytesIO(bytes(damaged)), key, cipher, workers=4))
+
+
+def test_unpack_mmap_yields_views(tmp_path):
+    data = b"mapped " * 500
+    key, cipher, payload = _framed(data)
+    header = Header(mime="x", orig_name="x", created="now", kdf={}, cipher=cipher, comp={})
+    path = tmp_path / "m.ppc"
+    path.write_bytes(pack(header, payload))
+
+    assert isinstance(unpack(path.read_bytes())[1], bytes)
+    with map_file(str(path)) as view:
+        hdr, body = unpack(view)
+        assert isinstance(body, memoryview) and body.obj is view.obj
+        assert all(isinstance(s, memoryview) for _, _, s in iter_records(body))
+        assert b"".join(decode_frames(body, key, hdr.cipher, workers=2)) == data
+        with pytest.raises(ValueError, match="truncated"):
+            list(iter_records(body[:100]))
+
+
+def test_compact_header_roundtrips_and_falls_back_to_ext():
+    _, hdr = new_stream_key("pass")
+    header = Header(mime="text/plain", orig_name="ü.txt", created="2026-01-02T03:04:05Z", kdf=hdr["kdf"],
+                    cipher=hdr["cipher"], comp=comp_params(-5, threads=4), version=VERSION_COMPACT)
+    assert len(header.to_bytes()) < len(header.to_json()) // 3
+    assert unpack(pack(header, b"payload")) == (header, b"payload")
+
+    odd = dict(header.__dict__, created="yesterday", notes="hi", extra=[1, 2],
+               kdf=dict(header.kdf, name="future-kdf", salt_b64="not base64!"), comp={"name": "zstd", "level": 1.5})
+    del odd["version"]
+    assert compact.decode(compact.encode(odd)) == odd
+    with pytest.raises(ValueError):
+        compact.decode(header.to_bytes()[:-3])
+
+
+@pytest.mark.parametrize("edit,error,versions", [({"extra": 1}, "unknown fields: extra", (2, VERSION_COMPACT)),
+                                                 ({"created": None}, "missing fields", (2, VERSION_COMPACT)),
+                                                 ({"kdf": "scrypt"}, "kdf is not an object", (2,))])
+def test_malformed_header_fields_raise_value_error(edit, error, versions):
+    obj = {"mime": "text/plain", "orig_name": "a", "created": "2024-01-01T00:00:00Z", "kdf": {"name": "raw"},
+           "cipher": {"name": "aes-256-gcm"}, "comp": {"name": "zstd"}, "notes": None, **edit}
+    obj = {k: v for k, v in obj.items() if v is not None or k == "notes"}
+    for version in versions:
+        data = compact.encode(obj) if version == VERSION_COMPACT else json.dumps(obj).encode()
+        blob = b"PPC1" + bytes([version]) + struct.pack("<I", len(data)) + data
+        with pytest.raises(ValueError, match=error):
+            open_container(io.BytesIO(blob))
+
+
+@pytest.mark.parametrize("codec", ["zstd", "none", "xz", "lz4", "brotli"])
+def test_codecs_roundtrip_frames(codec):
+    if not CODECS[codec].available:
+        pytest.skip(f"{codec} is not installed")
+    data = b"pied piper middle-out " * 5000 + bytes(range(256))
+    key, hdr = new_stream_key("pass")
+    comp = dict(comp_params(codec=codec), frame_size=16384)
+    payload = b"".join(encode_frames([data], key, hdr["cipher"], comp))
+    assert b"".join(decode_frames(io.BytesIO(payload), key, hdr["cipher"], comp=comp)) == data
+    if codec != "none":
+        with pytest.raises((ValueError, ZstdError)):
+            CODECS[codec].decompress(CODECS[codec].compress(data, comp)[:-9], comp)
+
+
+@pytest.mark.parametrize("old,new", [(b'"name":"zstd"', b'"name":"none"'),
+                                     (b'"orig_name":"a.txt"', b'"orig_name":"b.txt"'),
+                                     (b'"mime":"text/plain"', b'"mime":"text/plaix"')])
+def test_edited_header_fails_authentication(tmp_path, old, new):
+    src = tmp_path / "a.txt"
+    src.write_bytes(b"hello header " * 1000)
+    key, hdr = new_stream_key("pass")
+    compress_file(str(src), str(tmp_path / "a.ppc"), key, hdr, comp_params(3))
+    blob = (tmp_path / "a.ppc").read_bytes()
+    assert blob.count(old) == 1
+    (tmp_path / "a.ppc").write_bytes(blob.replace(old, new))
+    with pytest.raises(InvalidTag):
+        decompress_file(str(tmp_path / "a.ppc"), str(tmp_path / "out"), passphrase="pass")
+    assert not (tmp_path / "out").exists()
+
+
+def test_flipped_compact_header_byte_fails_archive_directory(tmp_path):
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "m.txt").write_text("member " * 100)
+    key, hdr = new_stream_key("pass")
+    pack_archive(str(tmp_path / "d"), str(tmp_path / "d.ppc"), key, hdr, comp_params(3), version=VERSION_COMPACT)
+    assert list_members(str(tmp_path / "d.ppc"), key)[1][0]["name"] == "m.txt"
+    blob = bytearray((tmp_path / "d.ppc").read_bytes())
+    at = bytes(blob).index(b"application/x-ppc-archive\x01d") + 27
+    blob[at] ^= 0x01  # low bit of `created`, which follows the MIME type and name: still a valid header
+    (tmp_path / "d.ppc").write_bytes(bytes(blob))
+    with pytest.raises(InvalidTag):
+        list_members(str(tmp_path / "d.ppc"), key)
+
+
+def test_decompress_file_from_opened_stream(tmp_path):
+    src = tmp_path / "a.txt"
+    src.write_bytes(b"streamed " * 5000)
+    key, hdr = new_stream_key("pass")
+    compress_file(str(src), str(tmp_path / "a.ppc"), key, hdr, comp_params(3))
+    header, reader = open_container(io.BytesIO((tmp_path / "a.ppc").read_bytes()))
+    info = decompress_file((header, reader), str(tmp_path / "out"), key=key)
+    assert (tmp_path / "out").read_bytes() == src.read_bytes()
+    assert info["raw_bytes"] == src.stat().st_size and info["container_bytes"] is None
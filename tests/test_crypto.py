@@ -0,0 +1,68 @@
+import io
+import pytest
+
+from src.ppc import crypto
+from src.ppc.crypto import CIPHERS, KeySession, calibrate, kdf_params, key_from_header, new_stream_key, \
+    parse_kdf_params, select_cipher
+from src.ppc.frames import comp_params, encode_frames, decode_frames
+
+
+def test_session_subkeys_share_one_scrypt(monkeypatch):
+    crypto._master_key.cache_clear()
+    calls = []
+    real = crypto.derive_key
+    monkeypatch.setattr(crypto, "derive_key", lambda p, s, params=None: calls.append(s) or real(p, s, params))
+
+    session = KeySession("pass")
+    (k1, h1), (k2, h2) = session.new_stream_key(), session.new_stream_key()
+    assert k1 != k2
+    assert h1["kdf"]["name"] == "scrypt+hkdf"
+    assert h1["kdf"]["salt_b64"] == h2["kdf"]["salt_b64"]
+
+    # Readers rebuild both subkeys from the cached master key.
+    assert key_from_header(h1["kdf"], "pass") == k1
+    assert key_from_header(h2["kdf"], "pass") == k2
+    assert len(calls) == 1
+    assert key_from_header(h1["kdf"], "other") != k1
+
+
+def test_key_from_header_honours_stored_params():
+    params = parse_kdf_params("scrypt", "n=1024,r=4")
+    assert params == kdf_params("scrypt", n=1024, r=4)
+    key, hdr = new_stream_key("pass", params)
+    assert (hdr["kdf"]["n"], hdr["kdf"]["r"]) == (1024, 4)
+    assert key_from_header(hdr["kdf"], "pass") == key
+
+
+def test_argon2id_and_calibrate():
+    if not crypto._HAVE_ARGON2:
+        pytest.skip("cryptography without Argon2id")
+    params = kdf_params("argon2id", t=1, m=1024, p=1)
+    key, hdr = new_stream_key("pass", params)
+    assert key_from_header(hdr["kdf"], "pass") == key
+    session = KeySession("pass", kdf=params)
+    key, hdr = session.new_stream_key()
+    assert hdr["kdf"]["name"] == "argon2id+hkdf"
+    assert key_from_header(hdr["kdf"], "pass") == key
+
+    params, ms = calibrate(1, "scrypt")
+    assert params["n"] == 2 ** 12 and ms > 0
+
+
+def test_hostile_kdf_params_rejected():
+    _, hdr = new_stream_key("pass", crypto.kdf_params("scrypt", n=1024))
+    with pytest.raises(ValueError):
+        key_from_header(dict(hdr["kdf"], n=2 ** 30), "pass")
+
+
+def test_chacha_frames_and_auto_selection(tmp_path, monkeypatch):
+    key, hdr = new_stream_key("pass", crypto.kdf_params(n=1024), "chacha20-poly1305")
+    assert hdr["cipher"]["name"] == "chacha20-poly1305"
+    payload = b"".join(encode_frames([b"edge node" * 100], key, hdr["cipher"], comp_params(3)))
+    assert b"".join(decode_frames(io.BytesIO(payload), key, hdr["cipher"])) == b"edge node" * 100
+
+    monkeypatch.setenv("PPC_CACHE_DIR", str(tmp_path))
+    select_cipher.cache_clear()
+    assert select_cipher() in CIPHERS
+    assert (tmp_path / "cipher.json").exists()
+    select_cipher.cache_clear()
@@ -0,0 +1,38 @@
+import os
+
+from src.ppc.crypto import new_stream_key
+from src.ppc.dedupe import ChunkStore, dedupe_file, split, MAX_CHUNK, MIN_CHUNK
+from src.ppc.frames import comp_params
+from src.ppc.pipeline import decompress_file
+
+
+def test_dedupe_store_shares_chunks_and_gc(tmp_path):
+    base = os.urandom(6 << 20)
+    edited = base[:3 << 20] + b"inserted" + base[3 << 20:]
+    a, b = list(split([base])), list(split([edited[i:i + 100_000] for i in range(0, len(edited), 100_000)]))
+    assert b"".join(b) == edited and len(set(a) & set(b)) >= len(a) - 2
+
+    store = ChunkStore(str(tmp_path / "store"), create=True)
+    keys = store.keys("pass")
+    for name, data in (("v1", base), ("v2", edited)):
+        (tmp_path / name).write_bytes(data)
+    key, hdr = new_stream_key("pass")
+    v1 = dedupe_file(str(tmp_path / "v1"), str(tmp_path / "v1.ppc"), key, hdr, comp_params(1), store, keys)
+    v2 = dedupe_file(str(tmp_path / "v2"), str(tmp_path / "v2.ppc"), key, hdr, comp_params(1), store, keys)
+    assert v1["new_chunks"] == v1["chunks"] and v2["new_chunks"] <= 2
+    assert v2["container_bytes"] < 4096 and store.stats()["containers"] == 2
+
+    decompress_file(str(tmp_path / "v2.ppc"), str(tmp_path / "back"), passphrase="pass", store=store.root)
+    assert (tmp_path / "back").read_bytes() == edited
+    assert store.gc()["chunks_deleted"] == 0
+    assert store.gc(keep={v2["header"].comp["recipe"]})["chunks_deleted"] >= 1 and \
+        store.stats()["unreferenced_chunks"] == 0
+
+
+def test_chunk_boundaries_do_not_depend_on_workers():
+    half = os.urandom(5 << 20)
+    data = half + bytes(1 << 20) + half[::-1] + b"\xff" * 300_000 + os.urandom(3 << 20)  # runs span segment edges
+    blocks = [data[i:i + 1_000_000] for i in range(0, len(data), 1_000_000)]
+    serial = [len(c) for c in split(blocks)]
+    assert [len(c) for c in split(blocks, 3)] == serial and sum(serial) == len(data)
+    assert all(MIN_CHUNK <= n <= MAX_CHUNK for n in serial[:-1])
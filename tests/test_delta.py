@@ -0,0 +1,35 @@
+import os
+import pytest
+
+from src.ppc.container import VERSION_COMPACT, read_header
+from src.ppc.crypto import new_stream_key
+from src.ppc.delta import delta_params, load_base
+from src.ppc.dicts import _BASES
+from src.ppc.frames import comp_params
+from src.ppc.pipeline import compress_file, decompress_file
+
+
+def test_delta_against_base_container(tmp_path):
+    v1 = os.urandom(1_500_000)
+    v2 = v1[:700_000] + b"release 2" + v1[700_000:] + v1[:1_000_000] + os.urandom(1000)
+    (tmp_path / "v1").write_bytes(v1)
+    (tmp_path / "v2").write_bytes(v2)
+    key, hdr = new_stream_key("pass")
+    compress_file(str(tmp_path / "v1"), str(tmp_path / "v1.ppc"), key, hdr, comp_params(3))
+    base_id, base_len = load_base(str(tmp_path / "v1.ppc"), "pass")
+    comp = delta_params(comp_params(3, threads=4), base_id, base_len)
+    assert comp["frame_size"] == 2 << 20 and "threads" not in comp and comp["window_log"] == 22
+    info = compress_file(str(tmp_path / "v2"), str(tmp_path / "v2.ppc"), key, hdr, comp, version=VERSION_COMPACT)
+    assert info["frames"] == 2 and info["container_bytes"] < 8192
+    assert read_header(str(tmp_path / "v2.ppc"))[0].comp["base"] == base_id
+
+    _BASES.clear()
+    with pytest.raises(ValueError, match="--base"):
+        decompress_file(str(tmp_path / "v2.ppc"), str(tmp_path / "back"), passphrase="pass")
+    with pytest.raises(ValueError, match="not the base"):
+        load_base(str(tmp_path / "v2.ppc"), "pass", expect=base_id)
+    load_base(str(tmp_path / "v1.ppc"), "pass", expect=base_id)
+    decompress_file(str(tmp_path / "v2.ppc"), str(tmp_path / "back"), passphrase="pass")
+    assert (tmp_path / "back").read_bytes() == v2
+    with pytest.raises(ValueError, match="only supported|zstd codec"):
+        delta_params(comp_params(codec="xz"), base_id, base_len)
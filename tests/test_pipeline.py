@@ -0,0 +1,48 @@
+import os
+import pytest
+
+from src.ppc.codecs import zstd_decode_options
+from src.ppc.container import VERSION_COMPACT, read_header
+from src.ppc.crypto import new_stream_key
+from src.ppc.frames import DECODE_BUDGET, comp_params, decode_slots
+from src.ppc.pipeline import compress_file, decompress_file, run_pool
+
+
+def test_long_mode_matches_across_frames_and_bounds_window(tmp_path):
+    block = os.urandom(3 << 20)
+    src = tmp_path / "image.raw"
+    src.write_bytes(block + block)  # the repeat sits 3 MiB back, past the default window and frame size
+    key, hdr = new_stream_key("pass")
+    plain = compress_file(str(src), str(tmp_path / "plain.ppc"), key, hdr, comp_params(3))
+    comp = comp_params(3, window_log=23)
+    assert comp["frame_size"] == 8 << 20
+    info = compress_file(str(src), str(tmp_path / "long.ppc"), key, hdr, comp, version=VERSION_COMPACT)
+    assert info["comp_bytes"] < 0.6 * plain["comp_bytes"]
+    assert read_header(str(tmp_path / "long.ppc"))[0].comp["window_log"] == 23
+    decompress_file(str(tmp_path / "long.ppc"), str(tmp_path / "back.raw"), passphrase="pass")
+    assert (tmp_path / "back.raw").read_bytes() == src.read_bytes()
+
+    # decode memory is bounded by bytes in flight, not by the worker count
+    assert decode_slots(comp_params(3, window_log=30), 16) == (1, 1)
+    assert decode_slots(comp_params(3, 32), 16) == (2, 2)
+    assert decode_slots(comp_params(3), 16) == (16, 32)
+    workers, window = decode_slots(comp, 64)
+    assert window * (2 * comp["frame_size"] + (1 << 23)) <= DECODE_BUDGET and workers == window
+
+    with pytest.raises(ValueError, match="window log"):
+        zstd_decode_options({"name": "zstd", "window_log": 31})
+    with pytest.raises(ValueError, match="only supported with zstd"):
+        comp_params(codec="xz", window_log=27)
+
+
+def _flaky_job(input_path):
+    if input_path == "bad":
+        raise RuntimeError("unexpected")
+    return {"input": input_path}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_pool_reports_unexpected_errors_per_job(workers):
+    results = sorted(run_pool(_flaky_job, [{"input_path": "ok"}, {"input_path": "bad"}], workers),
+                     key=lambda r: r["input"])
+    assert results == [{"input": "bad", "error": "RuntimeError: unexpected"}, {"input": "ok"}]
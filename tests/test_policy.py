@@ -0,0 +1,24 @@
+import os
+
+from src.ppc.crypto import new_stream_key
+from src.ppc.frames import comp_params
+from src.ppc.pipeline import compress_file, decompress_file
+from src.ppc.policy import DEFAULT_POLICY, route
+
+
+def test_codec_policy_routes_and_stored_roundtrip(tmp_path):
+    comp = comp_params(9)
+    assert route(DEFAULT_POLICY, "image/jpeg", b"", comp)[0]["name"] == "none"
+    assert route(DEFAULT_POLICY, "application/pdf", b"%PDF" * 100, comp)[0]["level"] == 1
+    assert route(DEFAULT_POLICY, "application/octet-stream", os.urandom(12288), comp)[0]["name"] == "none"
+    assert route(DEFAULT_POLICY, "text/plain", b"hello world " * 1000, comp)[0] == comp
+    assert route(None, "image/jpeg", b"", comp) == (comp, "policy off")
+
+    src = tmp_path / "noise.bin"
+    src.write_bytes(os.urandom(100_000))
+    key, hdr = new_stream_key("pass")
+    info = compress_file(str(src), str(tmp_path / "noise.ppc"), key, hdr, comp, policy=DEFAULT_POLICY)
+    assert info["header"].comp == {"name": "none", "frame_size": comp["frame_size"]}
+    assert info["comp_bytes"] == 100_000 and info["policy"].startswith("stored")
+    decompress_file(str(tmp_path / "noise.ppc"), str(tmp_path / "back.bin"), passphrase="pass")
+    assert (tmp_path / "back.bin").read_bytes() == src.read_bytes()
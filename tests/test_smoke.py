@@ -1,7 +1,12 @@
-import os
-from src.ppc.cli import compress, decompress
+import io, json, os
 from click.testing import CliRunner
 
+from src.ppc.cli import archive, compress, compress_dir, decompress, decompress_dir, dict_group, extract, inspect, ls, \
+    unarchive
+from src.ppc.container import Header, pack, pack_to, open_container, read_header
+from src.ppc.dicts import _BASES, load_dict
+from src.ppc.frames import MAX_MT_FRAME, comp_params
+
 
 def test_roundtrip(tmp_path):
     p = tmp_path / "hello.txt"
@@ -16,4 +21,320 @@ def test_roundtrip(tmp_path):
     out_txt = tmp_path / "restored.txt"
     r2 = runner.invoke(decompress, [str(out_ppc), "-p", "pass", "-o", str(out_txt)])
     assert r2.exit_code == 0
-    assert out_txt.read_text() == "hello pied piper"
\ No newline at end of file
+    assert out_txt.read_text() == "hello pied piper"
+
+
+def test_wrong_passphrase_leaves_no_output(tmp_path):
+    p = tmp_path / "hello.txt"
+    p.write_text("hello pied piper" * 1000)
+
+    runner = CliRunner()
+    out_ppc = tmp_path / "hello.ppc"
+    assert runner.invoke(compress, [str(p), "-p", "pass", "-o", str(out_ppc)]).exit_code == 0
+
+    out_txt = tmp_path / "restored.txt"
+    r = runner.invoke(decompress, [str(out_ppc), "-p", "wrong", "-o", str(out_txt)])
+    assert r.exit_code != 0
+    assert "Decryption failed" in r.output
+    assert not out_txt.exists()
+    assert sorted(tmp_path.iterdir()) == sorted([p, out_ppc])
+
+
+def test_stream_pack_matches_in_memory(tmp_path):
+    header = Header(mime="text/plain", orig_name="a.txt", created="now", kdf={}, cipher={}, comp={})
+    buf = io.BytesIO()
+    pack_to(buf, header, [b"abc", b"def"])
+    assert buf.getvalue() == pack(header, b"abcdef")
+
+    buf.seek(0)
+    h2, reader = open_container(buf)
+    assert h2 == header
+    assert reader.read() == b"abcdef"
+
+
+def test_extract_range(tmp_path):
+    p = tmp_path / "log.txt"
+    data = b"".join(b"line %06d\n" % i for i in range(200000))
+    p.write_bytes(data)
+
+    runner = CliRunner()
+    out_ppc = tmp_path / "log.ppc"
+    assert runner.invoke(compress, [str(p), "-p", "pass", "-o", str(out_ppc)]).exit_code == 0
+
+    part = tmp_path / "part.bin"
+    r = runner.invoke(extract, [str(out_ppc), "-p", "pass", "--offset", "1048570", "--length", "20", "-o", str(part)])
+    assert r.exit_code == 0, r.output
+    assert part.read_bytes() == data[1048570:1048590]
+
+
+def test_threaded_roundtrip(tmp_path):
+    p = tmp_path / "data.bin"
+    data = os.urandom(1 << 16) * 200  # ~13 MiB, spans several zstd jobs
+    p.write_bytes(data)
+
+    runner = CliRunner()
+    out_ppc = tmp_path / "data.ppc"
+    # High-entropy samples would be stored as is; force zstd for this test.
+    r1 = runner.invoke(compress, [str(p), "-p", "pass", "-o", str(out_ppc), "--threads", "2", "--level", "3",
+                                  "--policy", "off"])
+    assert r1.exit_code == 0, r1.output
+    with open(out_ppc, "rb") as f:
+        header, _ = open_container(f)
+    assert header.comp["threads"] == 2
+    assert header.comp["frame_size"] == 2 * header.comp["job_size"]
+    wide = comp_params(3, 32)  # frames stop growing with the thread count; jobs shrink instead
+    assert wide["frame_size"] == MAX_MT_FRAME and wide["job_size"] == MAX_MT_FRAME // 32
+
+    out = tmp_path / "restored.bin"
+    r2 = runner.invoke(decompress, [str(out_ppc), "-p", "pass", "-o", str(out)])
+    assert r2.exit_code == 0, r2.output
+    assert out.read_bytes() == data
+
+
+def test_raw_key_roundtrip(tmp_path):
+    p = tmp_path / "job.json"
+    p.write_text('{"rows": 1}')
+    key_file = tmp_path / "ppc.key"
+    key_file.write_text(os.urandom(32).hex() + "\n")
+
+    runner = CliRunner()
+    out_ppc = tmp_path / "job.ppc"
+    r1 = runner.invoke(compress, [str(p), "--key-file", str(key_file), "-o", str(out_ppc)])
+    assert r1.exit_code == 0, r1.output
+
+    out = tmp_path / "restored.json"
+    r2 = runner.invoke(decompress, [str(out_ppc), "-o", str(out)], env={"PPC_KEY": key_file.read_text()})
+    assert r2.exit_code == 0, r2.output
+    assert out.read_text() == '{"rows": 1}'
+
+    r3 = runner.invoke(decompress, [str(out_ppc), "-o", str(out)], env={"PPC_KEY": os.urandom(32).hex()})
+    assert r3.exit_code != 0
+    assert "Wrong raw key" in r3.output
+
+
+def test_explicit_secret_beats_environment(tmp_path):
+    p = tmp_path / "job.json"
+    p.write_text('{"rows": 1}')
+    key_file = tmp_path / "ppc.key"
+    key_file.write_text(os.urandom(32).hex())
+    out = str(tmp_path / "job.ppc")
+    runner = CliRunner()
+
+    r = runner.invoke(compress, [str(p), "-p", "x", "-o", out], env={"PPC_KEY": os.urandom(32).hex()})
+    assert r.exit_code == 0, r.output
+    assert read_header(out)[0].kdf["name"] == "scrypt"
+    r = runner.invoke(compress, [str(p), "--key-file", str(key_file), "-o", out], env={"PPC_PASSPHRASE": "x"})
+    assert r.exit_code == 0, r.output
+    assert read_header(out)[0].kdf["name"] == "raw"
+    r = runner.invoke(compress, [str(p), "-p", "x", "--key-file", str(key_file), "-o", out])
+    assert r.exit_code == 2 and "not both" in r.output
+    r = runner.invoke(compress, [str(p), "-o", out], env={"PPC_PASSPHRASE": "x", "PPC_KEY": os.urandom(32).hex()})
+    assert r.exit_code == 2 and "Both PPC_KEY and PPC_PASSPHRASE" in r.output
+
+
+def test_compress_dir_roundtrip(tmp_path):
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    (src / "a.txt").write_text("alpha" * 100)
+    (src / "sub" / "b.bin").write_bytes(os.urandom(5000))
+
+    runner = CliRunner()
+    packed = tmp_path / "packed"
+    r1 = runner.invoke(compress_dir, [str(src), str(packed), "-p", "pass", "--jobs", "2", "--json"])
+    assert r1.exit_code == 0, r1.output
+    assert (packed / "a.txt.ppc").exists() and (packed / "sub" / "b.bin.ppc").exists()
+
+    restored = tmp_path / "restored"
+    r2 = runner.invoke(decompress_dir, [str(packed), str(restored), "-p", "pass", "--jobs", "2"])
+    assert r2.exit_code == 0, r2.output
+    assert (restored / "a.txt").read_text() == "alpha" * 100
+    assert (restored / "sub" / "b.bin").read_bytes() == (src / "sub" / "b.bin").read_bytes()
+
+    (src / "c.txt").write_text("gamma" * 100)
+    assert runner.invoke(compress_dir, [str(src), str(packed), "-p", "pass"]).exit_code == 0
+    r = runner.invoke(decompress_dir, [str(packed), str(tmp_path / "prompted"), "--jobs", "1"], input="pass\n")
+    assert r.exit_code == 0, r.output
+    assert r.output.count("Passphrase") == 1 and (tmp_path / "prompted" / "c.txt").read_text() == "gamma" * 100
+
+    r3 = runner.invoke(decompress_dir, [str(packed), str(tmp_path / "bad"), "-p", "wrong", "--jobs", "1"])
+    assert r3.exit_code != 0
+    assert "3 file(s) failed" in r3.output
+
+
+def test_stdin_stdout_pipe():
+    data = b"pg_dump output\n" * 5000
+    runner = CliRunner()
+    r1 = runner.invoke(compress, ["-", "-o", "-", "-p", "pass"], input=data)
+    assert r1.exit_code == 0, r1.output
+    assert r1.stdout_bytes[:4] == b"PPC1"
+
+    r2 = runner.invoke(decompress, ["-", "-o", "-", "-p", "pass"], input=r1.stdout_bytes)
+    assert r2.exit_code == 0, r2.output
+    assert r2.stdout_bytes == data
+
+    r3 = runner.invoke(compress, ["-", "-o", "-"], input=data)
+    assert r3.exit_code != 0
+
+
+def test_inspect_many_reads_headers_only(tmp_path):
+    runner = CliRunner()
+    for n in ("a", "b"):
+        p = tmp_path / f"{n}.txt"
+        p.write_text(n * 1000)
+        assert runner.invoke(compress, [str(p), "-p", "pass", "-o", str(tmp_path / f"{n}.ppc")]).exit_code == 0
+
+    r = runner.invoke(inspect, [str(tmp_path / "*.ppc"), "--json"])
+    assert r.exit_code == 0, r.output
+    rows = json.loads(r.output)
+    assert [row["orig_name"] for row in rows] == ["a.txt", "b.txt"]
+    assert all(row["version"] == 2 and row["payload_bytes"] > 0 for row in rows)
+
+    # The payload is never touched: a container with a mangled body still inspects.
+    blob = (tmp_path / "a.ppc").read_bytes()
+    header, payload_bytes = read_header(str(tmp_path / "a.ppc"))
+    (tmp_path / "a.ppc").write_bytes(blob[:len(blob) - payload_bytes] + b"\0" * 10)
+    assert read_header(str(tmp_path / "a.ppc")) == (header, 10)
+
+
+def test_archive_roundtrip_and_member_extraction(tmp_path):
+    src = tmp_path / "tree"
+    (src / "sub").mkdir(parents=True)
+    (src / "big.bin").write_bytes(os.urandom(3 << 20))
+    (src / "sub" / "a.txt").write_text("alpha" * 100)
+    (src / "empty").write_bytes(b"")
+
+    runner = CliRunner()
+    for mode in ("solid", "file"):
+        ppc = tmp_path / f"{mode}.ppc"
+        r = runner.invoke(archive, [str(src), "-o", str(ppc), "-p", "pass", "--mode", mode])
+        assert r.exit_code == 0, r.output
+        r = runner.invoke(ls, [str(ppc), "-p", "pass", "--json"])
+        assert [m["name"] for m in json.loads(r.output)] == ["big.bin", "empty", "sub/a.txt"]
+        out = tmp_path / f"out-{mode}"
+        assert runner.invoke(unarchive, [str(ppc), "-C", str(out), "-p", "pass"]).exit_code == 0
+        for rel in ("big.bin", "empty", "sub/a.txt"):
+            assert (out / rel).read_bytes() == (src / rel).read_bytes()
+
+    # Per-file frames: a damaged member does not stop another from being extracted.
+    ppc = tmp_path / "file.ppc"
+    blob = bytearray(ppc.read_bytes())
+    blob[len(blob) // 3] ^= 1
+    ppc.write_bytes(bytes(blob))
+    r = runner.invoke(unarchive, [str(ppc), "sub/a.txt", "-C", str(tmp_path / "one"), "-p", "pass"])
+    assert r.exit_code == 0, r.output
+    assert (tmp_path / "one" / "sub" / "a.txt").read_text() == "alpha" * 100
+    r = runner.invoke(unarchive, [str(ppc), "-C", str(tmp_path / "all"), "-p", "pass"])
+    assert r.exit_code != 0 and "Decryption failed" in r.output
+
+
+def test_dictionary_compress_and_registry(tmp_path, monkeypatch):
+    monkeypatch.setenv("PPC_DICT_DIR", str(tmp_path / "registry"))
+    samples = tmp_path / "samples"
+    samples.mkdir()
+    for i in range(200):
+        (samples / f"{i}.json").write_text(json.dumps({"id": i, "user": f"user{i}", "email": f"u{i}@example.com",
+                                                       "roles": ["reader", "writer"][: i % 3], "active": i % 2 == 0}))
+    runner = CliRunner()
+    zdict = tmp_path / "d.zdict"
+    r = runner.invoke(dict_group, ["train", str(samples), "-o", str(zdict), "--size", "2048"])
+    assert r.exit_code == 0, r.output
+
+    src = samples / "7.json"
+    with_dict, plain = tmp_path / "with.ppc", tmp_path / "plain.ppc"
+    assert runner.invoke(compress, [str(src), "-p", "pass", "-o", str(with_dict), "--dict", str(zdict)]).exit_code == 0
+    assert runner.invoke(compress, [str(src), "-p", "pass", "-o", str(plain)]).exit_code == 0
+    header, size = read_header(str(with_dict))
+    assert "dict_id" in header.comp and size < read_header(str(plain))[1]
+
+    out = tmp_path / "out.json"
+    assert runner.invoke(decompress, [str(with_dict), "-p", "pass", "-o", str(out)]).exit_code == 0
+    assert out.read_bytes() == src.read_bytes()
+
+    monkeypatch.setenv("PPC_DICT_DIR", str(tmp_path / "empty"))
+    load_dict.cache_clear()
+    r = runner.invoke(decompress, [str(with_dict), "-p", "pass", "-o", str(tmp_path / "x")])
+    assert r.exit_code != 0 and "not registered" in r.output
+
+
+def test_container_cache_reuses_unchanged_files(tmp_path):
+    p = tmp_path / "notes.txt"
+    p.write_text("nightly backup " * 5000)
+    cache = tmp_path / "cache"
+    runner = CliRunner()
+    args = [str(p), "-p", "pass", "--kdf-params", "n=1024", "--cache-dir", str(cache), "-o"]
+    r1 = runner.invoke(compress, args + [str(tmp_path / "a.ppc")])
+    assert r1.exit_code == 0, r1.output
+    r2 = runner.invoke(compress, args + [str(tmp_path / "b.ppc")])
+    assert r2.exit_code == 0 and "Reused Cached Container" in r2.output
+    assert (tmp_path / "a.ppc").read_bytes() == (tmp_path / "b.ppc").read_bytes()
+
+    # a different passphrase never gets the old container back, and replaces the entry
+    r3 = runner.invoke(compress, [str(p), "-p", "other", "--kdf-params", "n=1024", "--cache-dir", str(cache),
+                                  "-o", str(tmp_path / "c.ppc")])
+    assert r3.exit_code == 0 and "Reused" not in r3.output
+    r4 = runner.invoke(decompress, [str(tmp_path / "c.ppc"), "-p", "other", "-o", str(tmp_path / "back.txt")])
+    assert r4.exit_code == 0 and (tmp_path / "back.txt").read_text() == p.read_text()
+
+    src = tmp_path / "tree"
+    src.mkdir()
+    (src / "x.txt").write_text("x" * 1000)
+    (src / "y.txt").write_text("y" * 1000)
+    dir_args = [str(src), str(tmp_path / "out"), "-p", "pass", "--kdf-params", "n=1024", "--jobs", "1",
+                "--cache-dir", str(cache), "--json"]
+    assert runner.invoke(compress_dir, dir_args).exit_code == 0
+    (src / "y.txt").write_text("changed")
+    r5 = runner.invoke(compress_dir, dir_args)
+    assert r5.exit_code == 0, r5.output
+    cached = {os.path.basename(f["input"]): f.get("cached", False) for f in json.loads(r5.output)["files"]}
+    assert cached == {"x.txt": True, "y.txt": False}
+
+    r6 = runner.invoke(compress, args + [str(tmp_path / "d.ppc"), "--cache-size", "0"])
+    assert r6.exit_code == 0 and not any(cache.rglob("*.ppc"))
+
+
+def test_long_flag_takes_no_value(tmp_path):
+    p = tmp_path / "big.img"
+    p.write_bytes(os.urandom(1 << 16) * 4)
+    runner = CliRunner()
+    r = runner.invoke(compress, ["--long", str(p), "-p", "pass", "-o", str(tmp_path / "a.ppc"), "--policy", "off"])
+    assert r.exit_code == 0, r.output
+    assert read_header(str(tmp_path / "a.ppc"))[0].comp["window_log"] == 27
+    r = runner.invoke(compress, [str(p), "--long-window", "20", "-p", "pass", "-o", str(tmp_path / "b.ppc"),
+                                 "--policy", "off"])
+    assert r.exit_code == 0, r.output
+    assert read_header(str(tmp_path / "b.ppc"))[0].comp["window_log"] == 20
+    r = runner.invoke(decompress, [str(tmp_path / "a.ppc"), "-p", "pass", "-o", str(tmp_path / "back.img")])
+    assert r.exit_code == 0, r.output
+    assert (tmp_path / "back.img").read_bytes() == p.read_bytes()
+
+
+def test_delta_extract_and_decompress_dir_take_base(tmp_path):
+    v1 = os.urandom(300_000)
+    v2 = v1[:100_000] + b"release 2" + v1[100_000:]
+    (tmp_path / "v1.bin").write_bytes(v1)
+    (tmp_path / "v2.bin").write_bytes(v2)
+    deltas = tmp_path / "deltas"
+    deltas.mkdir()
+    base = tmp_path / "v1.ppc"
+    runner = CliRunner()
+    assert runner.invoke(compress, [str(tmp_path / "v1.bin"), "-p", "pass", "-o", str(base)]).exit_code == 0
+    r = runner.invoke(compress, [str(tmp_path / "v2.bin"), "-p", "pass", "-o", str(deltas / "v2.bin.ppc"),
+                                 "--base", str(base)])
+    assert r.exit_code == 0, r.output
+
+    _BASES.clear()  # as in a fresh process
+    part = tmp_path / "part.bin"
+    args = [str(deltas / "v2.bin.ppc"), "-p", "pass", "--offset", "99995", "--length", "20", "-o", str(part)]
+    r = runner.invoke(extract, args)
+    assert r.exit_code != 0 and "--base" in r.output
+    r = runner.invoke(extract, args + ["--base", str(base)])
+    assert r.exit_code == 0, r.output
+    assert part.read_bytes() == v2[99995:100015]
+
+    _BASES.clear()
+    r = runner.invoke(decompress_dir, [str(deltas), str(tmp_path / "bad"), "-p", "pass", "--jobs", "1"])
+    assert r.exit_code != 0 and "--base" in r.output
+    r = runner.invoke(decompress_dir, [str(deltas), str(tmp_path / "out"), "-p", "pass", "--jobs", "2",
+                                       "--base", str(base)])
+    assert r.exit_code == 0, r.output
+    assert (tmp_path / "out" / "v2.bin").read_bytes() == v2
@@ -0,0 +1,21 @@
+import pytest
+
+from src.ppc.stages import run_stages
+
+
+def test_run_stages_keeps_order_and_reports():
+    out = []
+    stats = run_stages(range(50), [("double", lambda x: 2 * x), ("sink", out.append)], depth=2)
+    assert out == [2 * x for x in range(50)]
+    assert [s.name for s in stats] == ["read", "double", "sink"]
+    assert all(s.items == 50 for s in stats)
+
+
+def test_run_stages_propagates_errors():
+    def boom(x):
+        if x == 7:
+            raise ValueError("bad frame")
+        return x
+
+    with pytest.raises(ValueError, match="bad frame"):
+        run_stages(iter(range(10 ** 6)), [("check", boom), ("sink", lambda x: None)], depth=2)
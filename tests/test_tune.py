@@ -0,0 +1,23 @@
+from src.ppc import tune
+from src.ppc.crypto import new_stream_key
+from src.ppc.frames import comp_params
+from src.ppc.pipeline import compress_file
+
+
+def test_level_auto_picks_by_target_and_caches(tmp_path, monkeypatch):
+    measured = {1: (500.0, 3.0), 3: (300.0, 3.5), 9: (80.0, 4.0), 19: (5.0, 4.6)}
+    assert tune.pick(measured, target_mbps=200) == 3
+    assert tune.pick(measured, threads=4, target_mbps=200) == 9
+    assert tune.pick(measured, target_mbps=1000) == 1
+    assert tune.pick(measured, target_ratio=3.9) == 9
+    assert tune.pick(measured, target_ratio=9.0) == 19
+    assert tune.pick(measured, target_mbps=200, target_ratio=3.2) == 3
+
+    monkeypatch.setenv("PPC_CACHE_DIR", str(tmp_path / "cache"))
+    src = tmp_path / "log.txt"
+    src.write_text("GET /index.html 200 1043 Mozilla/5.0\n" * 20000)
+    key, hdr = new_stream_key("pass")
+    info = compress_file(str(src), str(tmp_path / "a.ppc"), key, hdr, comp_params(), targets={"ratio": 1.5})
+    assert info["header"].comp["level"] == 1 and "sampled bytes" in info["tune"]
+    info = compress_file(str(src), str(tmp_path / "b.ppc"), key, hdr, comp_params(), targets={"mbps": 1e-3})
+    assert info["header"].comp["level"] == 19 and info["tune"].endswith("cached)")